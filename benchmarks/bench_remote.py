@@ -0,0 +1,147 @@
+'''
+Benchmarks of condorpy's remote code paths, run against the local SSH scheduler in tests/ssh_harness.py.
+
+Measures per-submit latency, status-poll latency, transfer throughput and the connections, sessions and commands
+each costs the scheduler. Needs no network and no HTCondor:
+
+    $ python benchmarks/bench_remote.py --jobs 50 --size-mb 64 --latency 0.02
+
+--latency adds a delay before every remote command, to stand in for a distant scheduler. Jobs share pooled
+connections, so only the first benchmark to reach the scheduler opens one. Requests answered by the remote helper
+(--helper) are not commands to the scheduler's sshd, so they are not counted.
+'''
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from condorpy import Job  # noqa: E402
+from condorpy.remote_utils import RemoteClient, client_pool  # noqa: E402
+from tests.ssh_harness import SSHScheduler  # noqa: E402
+
+
+class Benchmark(object):
+
+    def __init__(self, scheduler, local, args):
+        self.scheduler = scheduler
+        self.local = local
+        self.args = args
+        self.rows = []
+
+    def report(self, name, timings=None, unit='ms', value=None):
+        stats = dict(self.scheduler.stats)
+        if timings:
+            timings = sorted(timings)
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            summary = '%8.1f %8.1f %s' % (statistics.median(timings) * 1000, p95 * 1000, unit)
+        else:
+            summary = '%17.1f %s' % (value, unit)
+        self.rows.append((name, summary, stats['connections'], stats['sessions'], stats['commands']))
+        print('%-34s %-24s %5d %8d %8d' % self.rows[-1])
+        self.scheduler.reset_stats()
+
+    def job(self, name):
+        job = Job(name, executable='run.sh', working_directory=self.local, remote_input_files=['in.txt'])
+        s = self.scheduler
+        job.set_scheduler(s.host, s.username, password=s.password, port=s.port, use_helper=self.args.helper)
+        return job
+
+    def client(self):
+        s = self.scheduler
+        return RemoteClient(s.host, s.username, s.password, port=s.port, use_helper=self.args.helper)
+
+    def submit(self, bundle=False):
+        timings = []
+        jobs = [self.job('submit%d' % i) for i in range(self.args.jobs)]
+        for job in jobs:
+            start = time.perf_counter()
+            job.submit(bundle=bundle)
+            timings.append(time.perf_counter() - start)
+        self.report('submit%s' % (' (bundle)' if bundle else '',), timings)
+        return jobs
+
+    def status(self, jobs):
+        timings = []
+        for i in range(self.args.polls):
+            start = time.perf_counter()
+            jobs[i % len(jobs)].status
+            timings.append(time.perf_counter() - start)
+        self.report('status poll (one job)', timings)
+
+        timings = []
+        for i in range(max(self.args.polls // 10, 1)):
+            start = time.perf_counter()
+            Job.statuses_for(jobs)
+            timings.append(time.perf_counter() - start)
+        self.report('status poll (%d jobs batched)' % (len(jobs),), timings)
+
+    def transfer(self):
+        source = os.path.join(self.local, 'payload')
+        os.makedirs(source)
+        count = 16
+        size = self.args.size_mb * 1024 * 1024 // count
+        # Half compressible text, half random bytes, as a mix of CSV inputs and binaries would be.
+        for i in range(count):
+            with open(os.path.join(source, 'file%02d' % i), 'wb') as f:
+                f.write(b'x,y,z\n' * (size // 12) + os.urandom(size - size // 12 * 6))
+        total = sum(os.path.getsize(os.path.join(source, name)) for name in os.listdir(source))
+
+        for label, kwargs in [('scp', dict(parallel=0, compression=False)),
+                              ('sftp x4', dict(parallel=4, compression=False)),
+                              ('gzip', dict(compression='gzip'))]:
+            client = self.client()
+            remote = 'transfer-%s' % (label.replace(' ', ''),)
+            client.makedirs(remote)
+            start = time.perf_counter()
+            client.put([source], remote, **kwargs)
+            elapsed = time.perf_counter() - start
+            self.report('put %s' % (label,), value=total / elapsed / 1e6, unit='MB/s')
+            client.close()
+
+            client = self.client()
+            target = os.path.join(self.local, remote)
+            os.makedirs(target)
+            start = time.perf_counter()
+            client.get(os.path.join(remote, 'payload'), target, **kwargs)
+            elapsed = time.perf_counter() - start
+            self.report('get %s' % (label,), value=total / elapsed / 1e6, unit='MB/s')
+            client.close()
+
+    def run(self):
+        with open(os.path.join(self.local, 'in.txt'), 'w') as f:
+            f.write('input')
+        print('%-34s %-24s %5s %8s %8s' % ('benchmark', 'median / p95 or rate', 'conns', 'sessions', 'commands'))
+        jobs = self.submit()
+        self.submit(bundle=True)
+        self.status(jobs)
+        if self.args.size_mb:
+            self.transfer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--jobs', type=int, default=20, help='jobs to submit (default: 20)')
+    parser.add_argument('--polls', type=int, default=100, help='status polls (default: 100)')
+    parser.add_argument('--size-mb', type=int, default=32, help='MB to transfer each way, 0 to skip (default: 32)')
+    parser.add_argument('--latency', type=float, default=0, help='seconds of delay per command (default: 0)')
+    parser.add_argument('--helper', action='store_true', help='run commands through the remote helper')
+    args = parser.parse_args()
+
+    local = tempfile.mkdtemp(prefix='condorpy-bench-')
+    try:
+        with SSHScheduler(latency=args.latency) as scheduler:
+            try:
+                Benchmark(scheduler, local, args).run()
+            finally:
+                client_pool.clear()
+    finally:
+        shutil.rmtree(local, True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+'''
+Load test of condorpy itself against the fake HTCondor commands in tests/fake_condor.
+
+Submits --jobs Jobs with Job.submit_many and polls them with Job.statuses_for until they have all completed, then
+submits a --nodes node Workflow and polls it until DAGMan is done, timing each step. Needs no HTCondor:
+
+    $ python benchmarks/load_test.py --jobs 100000 --nodes 10000
+
+The fake scheduler keeps each proc Idle for --idle seconds and Running for --run seconds. The time spent in the fake
+commands themselves (SQLite queries) is part of each poll; condorpy's own share is what the rest of the timings show.
+'''
+import argparse
+import collections
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from condorpy import Job, Node, Workflow  # noqa: E402
+from tests import fake_condor  # noqa: E402
+
+
+class Timer(object):
+
+    def __init__(self, label):
+        self.label = label
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.start
+        print('%-40s %10.2f s' % (self.label, self.elapsed))
+
+
+def poll(label, interval, read_status, done):
+    """Call read_status until done(status) is true, printing how long each poll took."""
+    polls = []
+    while True:
+        start = time.perf_counter()
+        status = read_status()
+        polls.append(time.perf_counter() - start)
+        print('  %-38s %10.2f s  %s' % (label, polls[-1], status))
+        if done(status):
+            break
+        time.sleep(interval)
+    print('%-40s %10.2f s  (%d polls, %.2f s each on average)' % (label + ' total', sum(polls), len(polls),
+                                                                 sum(polls) / len(polls)))
+
+
+def jobs_load(directory, args):
+    with Timer('create %d jobs' % (args.jobs,)):
+        jobs = [Job('job%d' % i, executable='exe%d' % (i % args.executables), arguments=str(i),
+                    working_directory=directory) for i in range(args.jobs)]
+    with Timer('submit_many'):
+        clusters = Job.submit_many(jobs)
+    print('%-40s %10d' % ('clusters', len(set(clusters))))
+
+    def read_status():
+        totals = collections.Counter()
+        for statuses in Job.statuses_for(jobs).values():
+            totals.update(dict((k, v) for k, v in statuses.items() if v))
+        return dict(totals)
+
+    poll('statuses_for', args.poll_interval, read_status, lambda status: set(status) <= {'Completed'})
+
+
+def workflow_load(directory, args):
+    with Timer('build a %d node workflow' % (args.nodes,)):
+        workflow = Workflow('load', None, None, working_directory=directory)
+        width = max(args.width, 1)
+        above = []
+        for start in range(0, args.nodes, width):
+            layer = [Node(Job('node%d' % i, executable='node', arguments=str(i), working_directory=directory))
+                     for i in range(start, min(start + width, args.nodes))]
+            # Each node is the child of the node above it and, with --parents 2, of that node's neighbour too,
+            # which makes a lattice of diamonds.
+            for j, node in enumerate(layer):
+                for k in range(min(args.parents, len(above))):
+                    node.add_parent(above[(j + k) % len(above)])
+                workflow.add_node(node)
+            above = layer
+    with Timer('submit workflow'):
+        workflow.submit()
+
+    poll('workflow status', args.poll_interval, lambda: workflow.status, lambda status: status != 'Running')
+    with Timer('node_statuses_by_cluster_id'):
+        statuses = workflow.node_statuses_by_cluster_id()
+    print('%-40s %10d' % ('nodes reported', len(statuses)))
+    with Timer('update_node_ids'):
+        workflow.update_node_ids()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--jobs', type=int, default=100000, help='jobs to submit (default: 100000)')
+    parser.add_argument('--executables', type=int, default=1,
+                        help='distinct executables; jobs alternate between them, so each gets a cluster of its own '
+                             'when there are several. With one, they all share a cluster (default: 1)')
+    parser.add_argument('--nodes', type=int, default=10000, help='workflow nodes, 0 to skip (default: 10000)')
+    parser.add_argument('--width', type=int, default=100, help='nodes per workflow layer (default: 100)')
+    parser.add_argument('--parents', type=int, default=1,
+                        help='parents of each node in the layer above; 1 makes chains, 2 diamonds (default: 1)')
+    parser.add_argument('--idle', type=float, default=1, help='seconds each proc is Idle (default: 1)')
+    parser.add_argument('--run', type=float, default=2, help='seconds each proc is Running (default: 2)')
+    parser.add_argument('--poll-interval', type=float, default=1, help='seconds between polls (default: 1)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='condorpy-load-')
+    os.environ['PATH'] = fake_condor.install(os.path.join(directory, 'bin')) + os.pathsep + os.environ['PATH']
+    os.environ.update(FAKE_CONDOR_DB=os.path.join(directory, 'condor.db'), FAKE_CONDOR_IDLE=str(args.idle),
+                      FAKE_CONDOR_RUN=str(args.run))
+    try:
+        if args.jobs:
+            os.makedirs(os.path.join(directory, 'jobs'))
+            jobs_load(os.path.join(directory, 'jobs'), args)
+        if args.nodes:
+            os.makedirs(os.path.join(directory, 'workflow'))
+            workflow_load(os.path.join(directory, 'workflow'), args)
+    finally:
+        shutil.rmtree(directory, True)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@
 from .job import Job
 from .workflow import Workflow, DAG
 from .node import Node
+from .aio import AsyncJob, AsyncWorkflow
+from .submission_pool import SubmissionPool
 from .templates import Templates
 Templates = Templates()
 Templates.load()
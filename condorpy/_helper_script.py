@@ -0,0 +1,135 @@
+# Copyright (c) 2015 Scott Christensen
+#
+# This file is part of condorpy
+#
+# condorpy is free software: you can redistribute it and/or modify it under
+# the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
+# should have been distributed with this file.
+
+"""The helper process condorpy runs on a remote scheduler (see condorpy.remote_helper.RemoteHelper).
+
+This module is uploaded and run as a script, so it must only use the standard library. It reads one JSON request
+per line on stdin and writes one JSON response per line on stdout, with the id of the request it answers:
+
+    {"id": 1, "op": "execute", "command": "condor_submit job.job", "cwd": "job_dir"}
+    {"id": 1, "ok": true, "result": {"stdout": "...", "stderr": "", "exit_status": 0}}
+
+Requests are handled concurrently, each on a thread of its own, so a long one (a condor_wait, say) does not hold up
+the others, and each is answered as soon as it is done, whatever order that leaves the responses in. The requests
+of a batch are run concurrently too. A request that fails is answered with "ok": false and an "error" message
+instead of a result.
+"""
+
+import base64
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+
+def _run(args, shell=False, cwd=None, stdin=None):
+    process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               shell=shell, cwd=cwd or None)
+    stdout, stderr = process.communicate(stdin or b'')
+    return stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace'), process.returncode
+
+
+def op_execute(request):
+    """Run a shell command, with the base64-encoded stdin given, if any."""
+    stdin = base64.b64decode(request['stdin']) if request.get('stdin') else None
+    stdout, stderr, exit_status = _run(request['command'], shell=True, cwd=request.get('cwd'), stdin=stdin)
+    return {'stdout': stdout, 'stderr': stderr, 'exit_status': exit_status}
+
+
+def op_makedirs(request):
+    path = request['path']
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+
+def op_rmtree(request):
+    shutil.rmtree(request['path'], ignore_errors=True)
+
+
+def op_query(request):
+    """The job ads matching a constraint, from condor_q and (if history is true) condor_history."""
+    tools = ['condor_q', 'condor_history'] if request.get('history', True) else ['condor_q']
+    ads = []
+    for tool in tools:
+        args = [tool, '-constraint', request['constraint'], '-json']
+        if request.get('attributes'):
+            args += ['-attributes', ','.join(request['attributes'])]
+        stdout, stderr, exit_status = _run(args)
+        if exit_status != 0:
+            raise RuntimeError('%s failed: %s' % (tool, stderr.strip()))
+        if stdout.strip():
+            ads.extend(json.loads(stdout))
+    return ads
+
+
+def op_batch(request):
+    """Handle several requests in one round trip. Each gets its own ok/result or ok/error entry, in order."""
+    responses = [None] * len(request['requests'])
+
+    def run(i, r):
+        responses[i] = handle(r)
+
+    threads = [threading.Thread(target=run, args=(i, r)) for i, r in enumerate(request['requests'])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+OPS = {
+    'execute': op_execute,
+    'makedirs': op_makedirs,
+    'rmtree': op_rmtree,
+    'query': op_query,
+    'batch': op_batch,
+}
+
+
+def handle(request):
+    try:
+        return {'ok': True, 'result': OPS[request['op']](request)}
+    except Exception as e:
+        return {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)}
+
+
+def main(stdin=sys.stdin, stdout=sys.stdout):
+    lock = threading.Lock()
+
+    def respond(response):
+        with lock:
+            stdout.write(json.dumps(response) + '\n')
+            stdout.flush()
+
+    def answer(request):
+        response = handle(request)
+        response['id'] = request.get('id')
+        respond(response)
+
+    threads = []
+    for line in iter(stdin.readline, ''):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            respond({'id': None, 'ok': False, 'error': 'Bad request: %s' % (e,)})
+            continue
+        thread = threading.Thread(target=answer, args=(request,))
+        thread.start()
+        threads.append(thread)
+        threads = [t for t in threads if t.is_alive()]
+    # The requests still running are answered before the helper exits.
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == '__main__':
+    main()
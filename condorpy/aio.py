@@ -0,0 +1,377 @@
+# Copyright (c) 2015 Scott Christensen
+#
+# This file is part of condorpy
+#
+# condorpy is free software: you can redistribute it and/or modify it under
+# the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
+# should have been distributed with this file.
+"""asyncio versions of the Job and Workflow scheduler operations.
+
+AsyncJob and AsyncWorkflow wrap a Job or Workflow and expose awaitable submit, status, statuses, remove and wait
+methods. With the CLI backend, HTCondor commands run through asyncio subprocesses locally and through non-blocking
+channel reads on a remote scheduler, so many jobs can be submitted and monitored concurrently from one event loop.
+Other backends are called on the loop's default executor. Everything else (attributes, nodes, templates, ...) is
+read from and written to the wrapped object.
+"""
+import asyncio
+import functools
+
+from paramiko import SSHException
+
+from .backends import CLIBackend, WAIT_DONE
+from .job import Job
+from .workflow import Workflow
+from .exceptions import HTCondorError
+from .logger import log
+
+
+REMOTE_READ_SIZE = 32768
+REMOTE_POLL_INTERVAL = 0.05
+
+
+def _in_thread(fn, *args, **kwargs):
+    """Run a blocking call (file writes, SFTP, ...) on the loop's default executor."""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+async def execute_remote(client, command):
+    """Run a command on a remote scheduler without blocking the event loop.
+
+    The channel is put in non-blocking mode and drained as data arrives, waiting on the channel's pollable file
+    descriptor (or polling, where the loop cannot watch it) in between.
+
+    Args:
+        client (RemoteClient): The remote scheduler.
+        command (str): The command to run.
+
+    Returns:
+        tuple: stdout and stderr (str).
+
+    Raises:
+        RuntimeError: If the command exits with a non-zero status, as RemoteClient.execute does.
+
+    """
+    loop = asyncio.get_running_loop()
+    # The session is waited for on the loop: a thread blocked on it would hold on to one of the executor's threads,
+    # which the commands holding the sessions may need in order to finish.
+    while not client._sessions.acquire(blocking=False):
+        await asyncio.sleep(REMOTE_POLL_INTERVAL)
+    try:
+        # Opening a channel (and connecting, the first time) is a blocking round trip.
+        session = await _in_thread(lambda: client.transport.open_session())
+    except BaseException:
+        client._sessions.release()
+        raise
+    try:
+        await _in_thread(session.exec_command, command)
+        session.setblocking(0)
+        readable = asyncio.Event()
+        fd = None
+        try:
+            fd = session.fileno()
+            loop.add_reader(fd, readable.set)
+        except (NotImplementedError, ValueError):
+            fd = None
+
+        stdout = []
+        stderr = []
+        try:
+            while True:
+                while session.recv_ready():
+                    stdout.append(session.recv(REMOTE_READ_SIZE))
+                while session.recv_stderr_ready():
+                    stderr.append(session.recv_stderr(REMOTE_READ_SIZE))
+                if session.exit_status_ready() and not (session.recv_ready() or session.recv_stderr_ready()):
+                    break
+                readable.clear()
+                try:
+                    await asyncio.wait_for(readable.wait(), REMOTE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if fd is not None:
+                loop.remove_reader(fd)
+
+        stdout = b''.join(stdout).decode()
+        stderr = b''.join(stderr).decode()
+        exit_status = session.recv_exit_status()
+        if exit_status != 0:
+            msg = "The command '{0}' failed on host '{1}':\n{2}\n{3}".format(command, client.host, stdout, stderr)
+            raise RuntimeError(msg)
+    finally:
+        session.close()
+        client._sessions.release()
+
+    return stdout, stderr
+
+
+async def execute(obj, args, shell=False, run_in_job_dir=True):
+    """The awaitable counterpart of HTCondorObjectBase._execute.
+
+    Args:
+        obj (HTCondorObjectBase): The job or workflow the command is run for.
+        args (list of str): The command and its arguments. With shell=True, args[0] is the whole shell command.
+        shell (bool, optional): Run the command through the shell. Defaults to False.
+        run_in_job_dir (bool, optional): On a remote scheduler, run the command in the object's remote working
+            directory. Defaults to True.
+
+    Returns:
+        tuple: out and err (str), with failures reported in err rather than raised.
+
+    """
+    out = None
+    err = None
+    if obj._remote:
+        log.info('Executing remote command %s', ' '.join(args))
+        try:
+            out = '\n'.join(await execute_remote(obj._remote, obj._remote_command(args, run_in_job_dir, shell)))
+        except RuntimeError as e:
+            err = str(e)
+        except SSHException as e:
+            err = str(e)
+    else:
+        log.info('Executing local command %s', ' '.join(args))
+        cwd = obj._local_cwd()
+        if shell:
+            process = await asyncio.create_subprocess_shell(args[0], stdout=asyncio.subprocess.PIPE,
+                                                            stderr=asyncio.subprocess.PIPE, cwd=cwd)
+        else:
+            process = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE, cwd=cwd)
+        out, err = await process.communicate()
+        out = out.decode() if isinstance(out, bytes) else out
+        err = err.decode() if isinstance(err, bytes) else err
+
+    log.info('Execute results - out: %s, err: %s', out, err)
+    return out, err
+
+
+class _AsyncHTCondorObject(object):
+    """Shared awaitable operations of AsyncJob and AsyncWorkflow.
+
+    Attribute access that is not an awaitable operation is passed through to the wrapped object.
+    """
+
+    def __init__(self, wrapped):
+        object.__setattr__(self, '_wrapped', wrapped)
+
+    def __getattr__(self, item):
+        if item == '_wrapped':
+            raise AttributeError(item)
+        return getattr(self._wrapped, item)
+
+    def __setattr__(self, key, value):
+        setattr(self._wrapped, key, value)
+
+    def __repr__(self):
+        return '<Async%s>' % (repr(self._wrapped).lstrip('<').rstrip('>'),)
+
+    def _uses_cli(self):
+        return isinstance(self._wrapped.backend, CLIBackend)
+
+    async def _submit(self, args):
+        self._wrapped.refresh()
+        if not self._uses_cli():
+            return await _in_thread(self._wrapped.backend.submit, self._wrapped, args)
+        out, err = await execute(self._wrapped, args)
+        return self._wrapped._read_submit_output(out, err)
+
+    async def remove(self, options=[], sub_job_num=None):
+        """Removes the job or workflow from the queue. See HTCondorObjectBase.remove.
+
+        """
+        if self._uses_cli():
+            out, err = await execute(self._wrapped, self._wrapped._remove_args(options, sub_job_num))
+        else:
+            out, err = await _in_thread(self._wrapped.backend.remove, self._wrapped, options, sub_job_num)
+        self._wrapped.refresh()
+        return out, err
+
+    async def wait(self, options=[], sub_job_num=None):
+        """Wait for the job (or one of its sub-jobs) or workflow to complete. See Job.wait and Workflow.wait.
+
+        """
+        if self._uses_cli():
+            outs, errs = [], []
+            for args in self._wrapped._wait_commands(options, sub_job_num):
+                out, err = await execute(self._wrapped, args)
+                outs.append(out or '')
+                errs.append(err or '')
+                if WAIT_DONE not in outs[-1]:
+                    break
+            out, err = ''.join(outs), ''.join(errs)
+        else:
+            out, err = await _in_thread(self._wrapped.backend.wait, self._wrapped, options, sub_job_num)
+        self._wrapped.refresh()
+        return out, err
+
+    async def _job_status(self):
+        if not self._uses_cli():
+            return await _in_thread(self._wrapped.backend.job_status, self._wrapped)
+        job_id, args = self._wrapped._status_query()
+        out, err = await execute(self._wrapped, args, shell=True, run_in_job_dir=False)
+        return self._wrapped._read_status_output(job_id, out, err)
+
+    async def _cached_status(self, key, update):
+        value = self._wrapped._fresh_status(key)
+        if value is None:
+            value = await update()
+            self._wrapped._cache_status(key, value)
+        return value
+
+
+class AsyncJob(_AsyncHTCondorObject):
+    """An awaitable front-end to a Job.
+
+    Args:
+        job (Job or str): The job to wrap, or the name of a new job. When a name is given, the remaining args are
+            passed on to Job.
+
+    """
+
+    def __init__(self, job, *args, **kwargs):
+        if not isinstance(job, Job):
+            job = Job(job, *args, **kwargs)
+        super(AsyncJob, self).__init__(job)
+
+    @property
+    def job(self):
+        """The wrapped Job.
+
+        """
+        return self._wrapped
+
+    async def submit(self, queue=None, options=[]):
+        """Submits the job. See Job.submit.
+
+        """
+        args = await _in_thread(self.job._prepare_submit, queue, options)
+        return await self._submit(args)
+
+    async def statuses(self):
+        """Return dictionary of all process statuses. See Job.statuses.
+
+        """
+        job = self.job
+        if job.cluster_id == job.NULL_CLUSTER_ID:
+            return "Unexpanded"
+        return await self._cached_status('statuses', self._update_status)
+
+    async def _update_status(self):
+        job = self.job
+        if job._log_tracker:
+            return await _in_thread(job._update_status_from_log)
+        return await self._job_status()
+
+    async def status(self):
+        """The status of the job. See Job.status.
+
+        """
+        if self.job.cluster_id == self.job.NULL_CLUSTER_ID:
+            return "Unexpanded"
+        return self.job._summarize_statuses(await self.statuses())
+
+
+class AsyncWorkflow(_AsyncHTCondorObject):
+    """An awaitable front-end to a Workflow.
+
+    Args:
+        workflow (Workflow or str): The workflow to wrap, or the name of a new workflow. When a name is given, the
+            remaining args are passed on to Workflow.
+
+    """
+
+    def __init__(self, workflow, *args, **kwargs):
+        if not isinstance(workflow, Workflow):
+            workflow = Workflow(workflow, *args, **kwargs)
+        super(AsyncWorkflow, self).__init__(workflow)
+
+    @property
+    def workflow(self):
+        """The wrapped Workflow.
+
+        """
+        return self._wrapped
+
+    async def submit(self, options=[]):
+        """Submits the workflow. See Workflow.submit.
+
+        """
+        args = await _in_thread(self.workflow._prepare_submit, options)
+        return await self._submit(args)
+
+    async def status(self):
+        """Returns status of workflow as a whole (DAG status). See Workflow.status.
+
+        """
+        workflow = self.workflow
+        if workflow.cluster_id == workflow.NULL_CLUSTER_ID:
+            return "Unexpanded"
+        return await self._cached_status('status', self._job_status)
+
+    async def statuses(self):
+        """Get status of workflow nodes. See Workflow.statuses.
+
+        """
+        workflow = self.workflow
+        if workflow.cluster_id == workflow.NULL_CLUSTER_ID:
+            return "Unexpanded"
+        return await self._cached_status('statuses', self._update_statuses)
+
+    async def _update_statuses(self):
+        workflow = self.workflow
+        status_dict = Job._count_statuses([])
+
+        try:
+            if self._uses_cli():
+                dag_id, args = workflow._node_status_query()
+                out, err = await execute(workflow, args, shell=True, run_in_job_dir=False)
+                by_cluster_id = workflow._read_node_status_output(dag_id, out, err)
+            else:
+                by_cluster_id = await _in_thread(workflow.backend.node_statuses, workflow)
+        except (HTCondorError, KeyError, ValueError):
+            log.warning('Batched node status query failed for dag %s; falling back to '
+                        'per-node queries.', workflow.cluster_id, exc_info=True)
+            by_cluster_id = None
+
+        job_statuses = []
+        pending = []
+        for node in await self.node_set():
+            job_status = workflow._batched_node_status(node.job, by_cluster_id)
+            if job_status is None:
+                pending.append(AsyncJob(node.job).status())
+            else:
+                job_statuses.append(job_status)
+
+        # The nodes that need their own query are queried concurrently.
+        job_statuses.extend(await asyncio.gather(*pending, return_exceptions=True))
+
+        for job_status in job_statuses:
+            if isinstance(job_status, BaseException) and not isinstance(job_status, (KeyError, HTCondorError)):
+                raise job_status
+            if job_status in status_dict:
+                status_dict[job_status] += 1
+            else:
+                status_dict['Unexpanded'] += 1
+
+        return status_dict
+
+    async def node_set(self):
+        """The workflow's nodes, with their jobs' cluster ids resolved. See Workflow.node_set.
+
+        """
+        workflow = self.workflow
+        if workflow.cluster_id != workflow.NULL_CLUSTER_ID and workflow._has_unresolved_nodes():
+            await self.update_node_ids()
+        return workflow._node_set
+
+    async def update_node_ids(self):
+        """Associate Jobs with respective cluster ids. See Workflow.update_node_ids.
+
+        """
+        if not self._uses_cli():
+            return await _in_thread(self.workflow.backend.update_node_ids, self.workflow)
+        dag_id, args = self.workflow._node_id_query()
+        out, err = await execute(self.workflow, args, shell=True, run_in_job_dir=False)
+        self.workflow._read_node_id_output(dag_id, out, err)
@@ -0,0 +1,328 @@
+# Copyright (c) 2015 Scott Christensen
+#
+# This file is part of condorpy
+#
+# condorpy is free software: you can redistribute it and/or modify it under
+# the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
+# should have been distributed with this file.
+"""Execution backends that carry out scheduler operations for jobs and workflows.
+
+Job and Workflow write their submit description and dag files themselves, and hand every scheduler operation --
+submit, remove, wait and the status queries -- to a Backend. CLIBackend runs HTCondor's command line tools, locally
+or over ssh. BindingsBackend talks to the local schedd through the htcondor Python bindings, which avoids a
+fork+exec and text parsing for each call; it is only available when the bindings are installed.
+"""
+import os
+
+from .exceptions import HTCondorError
+from .logger import log
+
+try:
+    import htcondor
+except ImportError:
+    htcondor = None
+
+# What condor_wait prints once everything it waited for has finished.
+WAIT_DONE = 'All jobs done.'
+
+
+class Backend(object):
+    """The operations a job or workflow needs from a scheduler.
+
+    """
+    name = None
+
+    def submit(self, obj, args):
+        """Submit a job or workflow whose submit description (or dag) file has been written.
+
+        Args:
+            obj (HTCondorObjectBase): The job or workflow being submitted.
+            args (list of str): The condor_submit or condor_submit_dag args, ending with the file to submit.
+
+        Returns:
+            int: The new cluster id.
+
+        """
+        raise NotImplementedError
+
+    def submit_many(self, jobs, args):
+        """Submit several jobs whose combined submit description file has been written (see Job.submit_many).
+
+        Args:
+            jobs (list of Job): The jobs, in the order they are queued in the file. They share a scheduler and a
+                working directory.
+            args (list of str): The condor_submit args, ending with the combined file.
+
+        Returns:
+            list: A (cluster_id, num_procs) tuple for each cluster created, in the order they were created.
+
+        """
+        raise NotImplementedError
+
+    def remove(self, obj, options=[], sub_job_num=None):
+        """Remove a job or workflow, or one of its procs, from the queue.
+
+        Returns:
+            tuple: out and err (str).
+
+        """
+        raise NotImplementedError
+
+    def wait(self, obj, options=[], sub_job_num=None):
+        """Wait for a job or workflow, or one of its procs, to complete.
+
+        Returns:
+            tuple: out and err (str).
+
+        """
+        raise NotImplementedError
+
+    def job_status(self, obj, sub_job_num=None):
+        """Get the status of a job's or workflow's cluster, in the form of that object's _update_status.
+
+        """
+        raise NotImplementedError
+
+    def node_statuses(self, workflow, sub_job_num=None, stream=False):
+        """Get the status of every node of a workflow, in the form of Workflow.node_statuses_by_cluster_id.
+
+        Args:
+            stream (bool, optional): Parse the results as they arrive rather than once they have all been read,
+                where the backend can.
+
+        """
+        raise NotImplementedError
+
+    def update_node_ids(self, workflow, sub_job_num=None, stream=False):
+        """Associate the jobs of a workflow's nodes with their cluster ids.
+
+        """
+        raise NotImplementedError
+
+    def proc_statuses(self, jobs):
+        """Get the JobStatus code of every proc of several jobs that share a scheduler.
+
+        Returns:
+            dict: cluster_id (int) -> {proc_id (int): JobStatus code (int)}
+
+        """
+        raise NotImplementedError
+
+
+class CLIBackend(Backend):
+    """Runs HTCondor's command line tools through the object's _execute, locally or on its remote scheduler.
+
+    """
+    name = 'cli'
+
+    def submit(self, obj, args):
+        out, err = obj._execute(args)
+        return obj._read_submit_output(out, err)
+
+    def submit_many(self, jobs, args):
+        out, err = jobs[0]._execute(args)
+        return jobs[0]._read_submitted_clusters(out, err)
+
+    def remove(self, obj, options=[], sub_job_num=None):
+        return obj._execute(obj._remove_args(options, sub_job_num))
+
+    def wait(self, obj, options=[], sub_job_num=None):
+        outs, errs = [], []
+        for args in obj._wait_commands(options, sub_job_num):
+            out, err = obj._execute(args)
+            outs.append(out or '')
+            errs.append(err or '')
+            # Stop at the first wait that timed out rather than wait out the timeout again for each proc.
+            if WAIT_DONE not in outs[-1]:
+                break
+        return ''.join(outs), ''.join(errs)
+
+    def job_status(self, obj, sub_job_num=None):
+        job_id, args = obj._status_query(sub_job_num)
+        out, err = obj._execute(args, shell=True, run_in_job_dir=False, idempotent=True)
+        return obj._read_status_output(job_id, out, err, sub_job_num)
+
+    def node_statuses(self, workflow, sub_job_num=None, stream=False):
+        dag_id, args = workflow._node_status_query(sub_job_num)
+        if stream:
+            chunks = workflow._execute_stream(args, shell=True, run_in_job_dir=False)
+            return workflow._collect_node_statuses(dag_id, workflow._node_status_records(chunks))
+        out, err = workflow._execute(args, shell=True, run_in_job_dir=False, idempotent=True)
+        return workflow._read_node_status_output(dag_id, out, err)
+
+    def update_node_ids(self, workflow, sub_job_num=None, stream=False):
+        dag_id, args = workflow._node_id_query(sub_job_num)
+        if stream:
+            chunks = workflow._execute_stream(args, shell=True, run_in_job_dir=False)
+            workflow._link_node_ids(workflow._node_id_records(chunks))
+            return
+        out, err = workflow._execute(args, shell=True, run_in_job_dir=False, idempotent=True)
+        workflow._read_node_id_output(dag_id, out, err)
+
+    def proc_statuses(self, jobs):
+        return type(jobs[0])._query_proc_statuses(jobs)
+
+
+class BindingsBackend(Backend):
+    """Talks to the local schedd through the htcondor Python bindings.
+
+    Queries ask the schedd for just the attributes they need, and history queries stop as soon as the expected
+    number of procs has been found. Operations the bindings cannot carry out the same way are handed to a CLI
+    backend: anything on a remote scheduler, submits and removes given command line options, bulk submits (a
+    submit description with several queue statements), and wait (which only reads the user log, so gains nothing
+    from the bindings).
+
+    Args:
+        schedd (htcondor.Schedd, optional): The schedd to use. Defaults to the local schedd.
+        fallback (Backend, optional): The backend for operations the bindings do not handle. Defaults to a
+            CLIBackend.
+
+    """
+    name = 'bindings'
+
+    def __init__(self, schedd=None, fallback=None):
+        if htcondor is None:
+            raise ImportError('The htcondor Python bindings are required for the bindings backend.')
+        self._schedd = schedd
+        self._fallback = fallback or CLIBackend()
+
+    @property
+    def schedd(self):
+        if self._schedd is None:
+            self._schedd = htcondor.Schedd()
+        return self._schedd
+
+    def submit(self, obj, args):
+        options = args[1:-1]
+        if obj._remote or options:
+            return self._fallback.submit(obj, args)
+
+        cwd = obj._local_cwd()
+        submit_file = obj._local_path(args[-1])
+        try:
+            if args[0] == 'condor_submit_dag':
+                description = htcondor.Submit.from_dag(submit_file, {})
+            else:
+                with open(submit_file) as f:
+                    description = htcondor.Submit(f.read())
+            # condor_submit would be run from the working directory, which relative paths in the description
+            # (including the initial directory itself) are relative to.
+            initial_dir = description.get('initialdir')
+            description['initialdir'] = os.path.join(cwd, initial_dir) if initial_dir else cwd
+            result = self.schedd.submit(description)
+        except _errors() as e:
+            raise HTCondorError(str(e))
+        obj._cluster_id = int(result.cluster())
+        log.info('Submitted %s to cluster %d', args[-1], obj.cluster_id)
+        return obj.cluster_id
+
+    def submit_many(self, jobs, args):
+        return self._fallback.submit_many(jobs, args)
+
+    def remove(self, obj, options=[], sub_job_num=None):
+        if obj._remote or options:
+            return self._fallback.remove(obj, options, sub_job_num)
+        try:
+            result = self.schedd.act(htcondor.JobAction.Remove, obj._proc_constraint(sub_job_num))
+        except _errors() as e:
+            return None, str(e)
+        return 'Job(s) marked for removal: %s' % (result.get('TotalSuccess', 0),), None
+
+    def wait(self, obj, options=[], sub_job_num=None):
+        return self._fallback.wait(obj, options, sub_job_num)
+
+    def job_status(self, obj, sub_job_num=None):
+        if obj._remote:
+            return self._fallback.job_status(obj, sub_job_num)
+        job_id = ' '.join(obj._job_ids(sub_job_num))
+        expected = 1 if sub_job_num else obj._num_procs()
+        ads = self._query(obj._proc_constraint(sub_job_num), ['ProcId', 'JobStatus'], expected)
+        if not ads:
+            log.error('Error while updating status for job %s: Job not found.', job_id)
+            raise HTCondorError('Job not found.')
+        return obj._statuses_from_codes(job_id, [ad['JobStatus'] for ad in ads], sub_job_num)
+
+    def node_statuses(self, workflow, sub_job_num=None, stream=False):
+        if workflow._remote:
+            return self._fallback.node_statuses(workflow, sub_job_num, stream)
+        ads = self._query('DAGManJobID == %d' % (workflow.cluster_id,), ['ClusterId', 'JobStatus'])
+        return workflow._collect_node_statuses(str(workflow.cluster_id),
+                                               [(ad['ClusterId'], ad['JobStatus']) for ad in ads])
+
+    def update_node_ids(self, workflow, sub_job_num=None, stream=False):
+        if workflow._remote:
+            return self._fallback.update_node_ids(workflow, sub_job_num, stream)
+        ads = self._query('DAGManJobID == %d' % (workflow.cluster_id,), ['ClusterId', 'Cmd', 'Args', 'Arguments'])
+        workflow._link_node_ids([(ad['ClusterId'], str(ad.get('Cmd', '')),
+                                  workflow._node_arguments(str(ad.get('Args', 'undefined')),
+                                                           str(ad.get('Arguments', 'undefined'))))
+                                 for ad in ads])
+
+    def proc_statuses(self, jobs):
+        if jobs[0]._remote:
+            return self._fallback.proc_statuses(jobs)
+        cluster_ids = sorted(set(job.cluster_id for job in jobs))
+        constraint = 'member(ClusterId, {%s})' % (', '.join(str(c) for c in cluster_ids),)
+        expected = sum(job._num_procs() for job in jobs)
+        procs = dict()
+        for ad in self._query(constraint, ['ClusterId', 'ProcId', 'JobStatus'], expected):
+            procs.setdefault(ad['ClusterId'], dict()).setdefault(ad['ProcId'], ad['JobStatus'])
+        return procs
+
+    def _query(self, constraint, projection, expected=None):
+        """Query the queue, then the history, as condor_q && condor_history do.
+
+        Args:
+            expected (int, optional): The number of procs that match. When given, the history scan stops once the
+                procs missing from the queue have been found, instead of reading the whole history file.
+
+        """
+        try:
+            ads = sorted(self.schedd.query(constraint, projection), key=lambda ad: ad.get('ProcId', 0))
+            match = -1 if expected is None else expected - len(ads)
+            if match != 0:
+                ads.extend(self.schedd.history(constraint, projection, match))
+        except _errors() as e:
+            raise HTCondorError(str(e))
+        return ads
+
+
+def _errors():
+    """The exceptions the bindings raise for a failed schedd operation."""
+    return (RuntimeError, ValueError, IOError) + tuple(
+        e for e in (getattr(htcondor, 'HTCondorException', None),) if e is not None)
+
+
+_BACKENDS = {CLIBackend.name: CLIBackend,
+             BindingsBackend.name: BindingsBackend}
+_backend_instances = dict()
+_default_backend = CLIBackend.name
+
+
+def set_default_backend(backend):
+    """Set the backend used by every job and workflow that has not been given one of its own.
+
+    Args:
+        backend (Backend or str): A Backend instance, or one of 'cli', 'bindings' or 'auto'. 'auto' uses the
+            bindings when they can be imported and the CLI otherwise.
+
+    """
+    global _default_backend
+    get_backend(backend)
+    _default_backend = backend
+
+
+def get_backend(backend=None):
+    """Resolve a backend name (or None, for the default backend) to a Backend instance.
+
+    """
+    backend = backend or _default_backend
+    if isinstance(backend, Backend):
+        return backend
+    if backend == 'auto':
+        backend = BindingsBackend.name if htcondor is not None else CLIBackend.name
+    if backend not in _BACKENDS:
+        raise ValueError('Unknown backend %r. Expected one of: %s' % (backend, ', '.join(sorted(_BACKENDS))))
+    if backend not in _backend_instances:
+        _backend_instances[backend] = _BACKENDS[backend]()
+    return _backend_instances[backend]
@@ -6,17 +6,27 @@
 # the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
 # should have been distributed with this file.
 
+import codecs
+import contextlib
 import os
 import re
+import shlex
+import time
 import uuid
+import threading
 import subprocess
+import weakref
 
 from .logger import log
 from .exceptions import HTCondorError
 
-from .remote_utils import RemoteClient
+from .remote_utils import client_pool, SubmitBundle
+from .backends import get_backend
 from paramiko import SSHException
 
+# Object -> the weakref.finalize that gives back its reference to its pooled client, so that an object garbage
+# collected without close_remote does not keep the client held in the pool forever.
+_pool_references = weakref.WeakKeyDictionary()
 
 
 class HTCondorObjectBase(object):
@@ -25,6 +35,12 @@ class HTCondorObjectBase(object):
     """
     NULL_CLUSTER_ID = 0
 
+    # condor_submit reports each cluster it creates as "N job(s) submitted to cluster C.", or with -verbose and
+    # -terse as one "** Proc C.P:" line per proc or one "C.P - C.P" line per cluster.
+    _SUBMITTED_CLUSTER = re.compile(r'(\d+) job\(s\) submitted to cluster (\d+)')
+    _SUBMITTED_PROC = re.compile(r'^\*\* Proc (\d+)\.(\d+)', re.MULTILINE)
+    _SUBMITTED_RANGE = re.compile(r'^(\d+)\.(\d+) - (\d+)\.(\d+)\s*$', re.MULTILINE)
+
     def __init__(self,
                  host=None,
                  username=None,
@@ -44,6 +60,9 @@ class HTCondorObjectBase(object):
         object.__setattr__(self, '_cwd', working_directory)
         object.__setattr__(self, '_remote', None)
         object.__setattr__(self, '_remote_id', None)
+        object.__setattr__(self, '_status_cache_ttl', None)
+        object.__setattr__(self, '_status_cache', dict())
+        object.__setattr__(self, '_backend', None)
         if host:
             self.set_scheduler(host=host, port=port, username=username, password=password,
                                private_key=private_key, private_key_pass=private_key_pass)
@@ -59,6 +78,68 @@ class HTCondorObjectBase(object):
     def num_jobs(self):
         return 1
 
+    def _num_procs(self):
+        """The number of procs in the cluster this object submits.
+
+        """
+        return 1
+
+    @property
+    def status_cache_ttl(self):
+        """The number of seconds a status read from the scheduler is reused before it is queried again.
+
+        Defaults to None, meaning statuses are never cached and every read queries the scheduler. The cache is
+        cleared whenever the job or workflow is submitted, removed or waited on, and by calling refresh.
+        """
+        return self._status_cache_ttl
+
+    @status_cache_ttl.setter
+    def status_cache_ttl(self, ttl):
+        self._status_cache_ttl = ttl
+        self.refresh()
+
+    def refresh(self):
+        """Discard any cached statuses so the next read queries the scheduler.
+
+        """
+        self._status_cache.clear()
+
+    def _cached_status(self, key, update):
+        """Return the cached value for key if it is younger than status_cache_ttl, otherwise call update and cache it.
+
+        """
+        value = self._fresh_status(key)
+        if value is None:
+            value = update()
+            self._cache_status(key, value)
+        return value
+
+    def _fresh_status(self, key):
+        """The cached value for key, or None if caching is off or the value is older than status_cache_ttl.
+
+        """
+        cached = self._status_cache.get(key)
+        if self._status_cache_ttl and cached is not None and time.monotonic() - cached[0] < self._status_cache_ttl:
+            return cached[1]
+        return None
+
+    def _cache_status(self, key, value):
+        if self._status_cache_ttl:
+            self._status_cache[key] = (time.monotonic(), value)
+
+    @property
+    def backend(self):
+        """The Backend that carries out this object's scheduler operations (submit, status, remove, wait).
+
+        Defaults to the process-wide default backend (see condorpy.backends.set_default_backend). It can be set to a
+        Backend instance or to one of the names 'cli', 'bindings' or 'auto'.
+        """
+        return get_backend(self._backend)
+
+    @backend.setter
+    def backend(self, backend):
+        self._backend = backend
+
     @property
     def scheduler(self):
         """
@@ -66,7 +147,18 @@ class HTCondorObjectBase(object):
         """
         return self._remote
 
-    def set_scheduler(self, host, username='root', password=None, private_key=None, private_key_pass=None, port=22):
+    def _scheduler_key(self):
+        """A hashable key identifying the scheduler this object submits to.
+
+        Objects with equal keys can be served by one command run through any of them. Local objects all share the
+        key None.
+        """
+        if self._remote:
+            return self._remote.host, self._remote.port, self._remote.username
+        return None
+
+    def set_scheduler(self, host, username='root', password=None, private_key=None, private_key_pass=None, port=22,
+                      max_sessions=10, compression=None, keepalive=30, use_helper=False):
         """
         Defines the remote scheduler
 
@@ -77,14 +169,19 @@ class HTCondorObjectBase(object):
             private_key (str, optional): the path to the private ssh key used to connect to the remote scheduler. Either the password or the private_key must be defined. Default is None.
             private_key_pass (str, optional): the passphrase for the private_key. Default is None.
             port (int, optional): the SSH port of the remote scheduler. Default is 22.
+            max_sessions (int, optional): the MaxSessions of the remote scheduler's sshd. Default is 10.
+            compression (str, optional): None, 'ssh' or 'gzip'. See RemoteClient. Default is None.
+            keepalive (int, optional): seconds between keepalives, or 0 to send none. Default is 30.
+            use_helper (bool, optional): whether to run commands through a RemoteHelper. Default is False.
 
         Returns:
             An RemoteClient representing the remote scheduler.
         """
         # reuse an existing client when the connection parameters are unchanged.
         existing = getattr(self, '_remote', None)
+        options = dict(max_sessions=max_sessions, compression=compression, keepalive=keepalive, use_helper=use_helper)
         if existing is not None and existing.matches(host, username, password, private_key,
-                                                     private_key_pass, port):
+                                                     private_key_pass, port, **options):
             # Preserve _remote_id (names the remote working directory) and skip client
             # replacement to retain the cached SSH transport. A new id would strand the
             # job's inputs and outputs in a directory nothing looks at again.
@@ -94,10 +191,36 @@ class HTCondorObjectBase(object):
         # used to reach it, so replacing the client for a rotated key or a changed
         # password must not strand the job's files in a directory nothing reads.
         same_host = existing is not None and existing.host == host and existing.port == port
-        self._remote = RemoteClient(host, username, password, private_key, private_key_pass, port=port)
+        # Objects that target the same scheduler share one client, and so one SSH transport.
+        self._hold_remote(client_pool.acquire(host, username, password, private_key, private_key_pass, port=port,
+                                              **options), counted=True)
         if not (same_host and getattr(self, '_remote_id', None)):
             self._remote_id = uuid.uuid4().hex
 
+    def _share_remote(self, client):
+        """Use another object's remote client, holding a reference to it in the pool, and give back this object's.
+
+        Every object that holds a pooled client must have acquired or retained it, so that the client is not closed
+        while it is still in use. A SubmitBundle standing in for a client is not counted.
+        """
+        if client is self._remote:
+            return
+        counted = client is not None and not isinstance(client, SubmitBundle) and client_pool.retain(client)
+        self._hold_remote(client, counted)
+
+    def _hold_remote(self, client, counted):
+        """Make client this object's remote client, and give back the pool reference held for the previous one.
+
+        A counted reference (one taken by acquire or retain) is given back when the object switches clients, when
+        close_remote is called, or when the object is garbage collected, whichever comes first.
+        """
+        previous = _pool_references.pop(self, None)
+        self._remote = client
+        if counted:
+            _pool_references[self] = weakref.finalize(self, client_pool.release, client)
+        if previous is not None:
+            previous()
+
     @property
     def remote_input_files(self):
         """A list of paths to files or directories to be copied to a remote server for remote job submission.
@@ -121,42 +244,108 @@ class HTCondorObjectBase(object):
         """
         self._remote_input_files = list(files) if files else None
 
-    def set_cwd(fn):
+    def _local_cwd(self):
+        """The absolute path of this object's working directory.
+
+        A relative working directory is relative to the CONDORPY_HOME environment variable if it is set, or to the
+        process's current directory otherwise. Local commands are run here and local paths are resolved against
+        it explicitly, rather than by changing the process-wide current directory, so objects in different
+        working directories can be used from several threads at once.
         """
-        Decorator to set the specified working directory to execute the function, and then restore the previous cwd.
+        base = os.environ.get('CONDORPY_HOME') or os.getcwd()
+        return os.path.abspath(os.path.join(base, os.path.expanduser(self._cwd)))
+
+    def _local_path(self, path):
+        """Resolve a local path relative to this object's working directory.
+
         """
-        def wrapped(self, *args, **kwargs):
-            log.info('Calling function: %s with args=%s', fn, args if args else [])
-            # Use the CONDORPY_HOME environment variable to force set_cwd to always change to the same directory
-            cwd = os.environ.get('CONDORPY_HOME', os.getcwd())
-            log.info('Saved cwd: %s', cwd)
-            os.chdir(self._cwd)
-            log.info('Changing working directory to: %s', self._cwd)
-            try:
-                return fn(self, *args, **kwargs)
-            finally:
-                os.chdir(cwd)
-                log.info('Restored working directory to: %s', cwd)
+        return os.path.join(self._local_cwd(), path)
+
+    def submit(self, args, bundle=None):
+        """
+
+
+        """
+        self.refresh()
+        if bundle is not None:
+            return self._submit_bundle(args, bundle)
+        return self.backend.submit(self, args)
+
+    @contextlib.contextmanager
+    def _bundling(self):
+        """Collect what is sent to the remote scheduler while preparing a submit into a SubmitBundle.
+
+        Yields:
+            SubmitBundle: The bundle, which stands in for the remote client until the block exits.
+
+        """
+        client = self._remote
+        self._remote = SubmitBundle(client)
+        try:
+            yield self._remote
+        finally:
+            self._remote = client
+
+    def _submit_bundle(self, args, bundle):
+        """Unpack a SubmitBundle on the remote scheduler and run the submit command, all in one remote command.
+
+        """
+        data = bundle.getvalue()
+        command = 'tar -xf - && %s' % (self._remote_command(args),)
+        log.info('Executing remote command %s with a %d byte bundle', command, len(data))
+        out = None
+        err = None
+        try:
+            out = '\n'.join(self._remote.execute(command, stdin=data))
+        except (RuntimeError, SSHException) as e:
+            err = str(e)
+        log.info('Execute results - out: %s, err: %s', out, err)
+        return self._read_submit_output(out, err)
 
-        return wrapped
+    def _read_submit_output(self, out, err):
+        """Set the cluster id from the output of condor_submit or condor_submit_dag.
+
+        Returns:
+            int: The new cluster id, or -1 if it could not be read from the output.
 
-    def submit(self, args):
         """
+        clusters = self._read_submitted_clusters(out, err)
+        self._cluster_id = clusters[0][0] if clusters else -1
+        return self.cluster_id
+
+    @classmethod
+    def _read_submitted_clusters(cls, out, err):
+        """Read every cluster created by condor_submit or condor_submit_dag from its output.
 
+        Returns:
+            list: A (cluster_id, num_procs) tuple for each cluster, in the order they were created. num_procs is
+            None if the output names a cluster without saying how many procs it has.
 
         """
-        out, err = self._execute(args)
         if err:
             if re.match('WARNING|Renaming', err):
                 log.warning(err)
             else:
                 raise HTCondorError(err)
         log.info(out)
-        try:
-            self._cluster_id = int(re.search('(?<=cluster |\*\* Proc )(\d*)', out).group(1))
-        except:
-            self._cluster_id = -1
-        return self.cluster_id
+        out = out or ''
+
+        clusters = [(int(cluster_id), int(num_procs))
+                    for num_procs, cluster_id in cls._SUBMITTED_CLUSTER.findall(out)]
+        if not clusters:
+            for cluster_id, _ in cls._SUBMITTED_PROC.findall(out):
+                if clusters and clusters[-1][0] == int(cluster_id):
+                    clusters[-1] = (clusters[-1][0], clusters[-1][1] + 1)
+                else:
+                    clusters.append((int(cluster_id), 1))
+        if not clusters:
+            clusters = [(int(first_cluster), int(last_proc) - int(first_proc) + 1)
+                        for first_cluster, first_proc, _, last_proc in cls._SUBMITTED_RANGE.findall(out)]
+        if not clusters:
+            match = re.search(r'(?<=cluster )(\d+)', out)
+            if match:
+                clusters = [(int(match.group(1)), None)]
+        return clusters
 
     def remove(self, options=[], sub_job_num=None):
         """Removes a job from the job queue, or from being executed.
@@ -168,18 +357,70 @@ class HTCondorObjectBase(object):
             job_num (int, optional): The number of sub_job to remove rather than the whole cluster. Defaults to None.
 
         """
+        out, err = self.backend.remove(self, options, sub_job_num)
+        self.refresh()
+        return out,err
+
+    def _remove_args(self, options=[], sub_job_num=None):
         args = ['condor_rm']
         args.extend(options)
-        job_id = '%s.%s' % (self.cluster_id, sub_job_num) if sub_job_num else str(self.cluster_id)
-        args.append(job_id)
-        out, err = self._execute(args)
-        return out,err
+        args.extend(self._job_ids(sub_job_num))
+        return args
+
+    def _job_ids(self, sub_job_num=None):
+        """The condor_q, condor_history and condor_rm arguments that select this object's procs, or one of them.
+
+        """
+        return ['%s.%s' % (self.cluster_id, sub_job_num) if sub_job_num else str(self.cluster_id)]
+
+    def _proc_constraint(self, sub_job_num=None):
+        """A ClassAd constraint that matches this object's procs, or one of them.
+
+        """
+        if sub_job_num:
+            return 'ClusterId == %d && ProcId == %d' % (int(self.cluster_id), int(sub_job_num))
+        return 'ClusterId == %d' % (int(self.cluster_id),)
+
+    def _status_query(self, sub_job_num=None):
+        """Build the condor_q/condor_history command that reports the JobStatus of every proc in the cluster.
+
+        Returns:
+            tuple: The job id (str) being queried, and the args to run with shell=True.
 
-    def sync_remote_output(self):
+        """
+        job_id = ' '.join(shlex.quote(arg) for arg in self._job_ids(sub_job_num))
+        format = ['-format', '"%d"', 'JobStatus']
+        cmd = 'condor_q {0} {1} && condor_history {0} {1}'.format(job_id, ' '.join(format))
+        return job_id, [cmd]
+
+    def sync_remote_output(self, incremental=False, include=None, exclude=None):
         """Sync the initial directory containing the output and log files with the remote server.
 
+        Args:
+            incremental (bool, optional): Fetch only the files that are new or have changed since the last
+                incremental sync (see RemoteClient.sync), rather than the whole directory. Defaults to False.
+            include (list of str, optional): fnmatch patterns of the files to sync, e.g. ['*.log']. Matched against
+                each file's path in the initial directory and against its name. Implies an incremental sync.
+            exclude (list of str, optional): Patterns of files not to sync. Implies an incremental sync.
+
+        Returns:
+            list of str: For an incremental sync, the paths fetched, relative to the initial directory.
+
         """
-        self._copy_output_from_remote()
+        if not (incremental or include or exclude):
+            self._copy_output_from_remote()
+            return None
+
+        initial_dir = os.path.normpath(self.initial_dir)
+        # Where _copy_output_from_remote puts the directory.
+        local_dir = self._local_cwd()
+        if initial_dir != os.curdir:
+            local_dir = os.path.join(local_dir, os.path.basename(initial_dir))
+        if not os.path.isdir(local_dir):
+            os.makedirs(local_dir)
+        manifest_path = os.path.join(local_dir, '.%s.sync.json' % (self._remote_id,))
+        return self._remote.sync(os.path.join(self._remote_id, initial_dir), local_dir, manifest_path,
+                                 include=include, exclude=exclude)
 
     def close_remote(self):
         """Cleans up and closes connection to remote server if defined.
@@ -188,62 +429,166 @@ class HTCondorObjectBase(object):
         if self._remote:
             try:
                 # first see if remote dir is still there
-                self._remote.execute('ls %s' % (self._remote_id,))
+                self._remote.execute('ls %s' % (self._remote_id,), retry=True)
                 if self.status != 'Completed':
                     self.remove()
-                self._remote.execute('rm -rf %s' % (self._remote_id,))
+                self._remote.rmtree(self._remote_id)
             except RuntimeError:
                 pass
-            self._remote.close()
+            # The connection stays open in the pool for other objects that target the same scheduler.
+            self._hold_remote(None, counted=False)
             del self._remote
 
-    @set_cwd
-    def _execute(self, args, shell=False, run_in_job_dir=True):
+    def _execute(self, args, shell=False, run_in_job_dir=True, idempotent=False):
+        """Run a command, on the remote scheduler if there is one.
+
+        Args:
+            args (list of str): The command and its arguments. With shell=True, args[0] is the whole shell command.
+            shell (bool, optional): Run the command through the shell. Defaults to False.
+            run_in_job_dir (bool, optional): On a remote scheduler, run the command in the object's remote working
+                directory. Defaults to True.
+            idempotent (bool, optional): Whether the command is safe to run again (a query, say), so that it is
+                retried if the connection to the remote scheduler fails while it runs. Defaults to False.
+
+        Returns:
+            tuple: out and err (str), with failures reported in err rather than raised.
+
+        """
         out = None
         err = None
         if self._remote:
             log.info('Executing remote command %s', ' '.join(args))
-            cmd = ' '.join(args)
             try:
-                if run_in_job_dir:
-                    cmd = 'cd %s && %s' % (self._remote_id, cmd)
-                out = '\n'.join(self._remote.execute(cmd))
+                out = '\n'.join(self._remote.execute(self._remote_command(args, run_in_job_dir, shell),
+                                                      retry=idempotent))
             except RuntimeError as e:
                 err = str(e)
             except SSHException as e:
                 err = str(e)
         else:
             log.info('Executing local command %s', ' '.join(args))
-            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=shell)
-            out, err = process.communicate()
-            out = out.decode() if isinstance(out, bytes) else out
-            err = err.decode() if isinstance(err, bytes) else err
+            out, err = self._execute_local(args, shell)
 
         log.info('Execute results - out: %s, err: %s', out, err)
         return out, err
 
-    @set_cwd
+    def _execute_many(self, commands, shell=False, run_in_job_dir=True, idempotent=False):
+        """Run several commands as _execute does, concurrently on a remote scheduler.
+
+        Args:
+            commands (list of list of str): The args of each command.
+            idempotent (bool, optional): Whether the commands may be retried, as with _execute. Defaults to False.
+
+        Returns:
+            list: The out and err (str) of each command, in the order given.
+
+        """
+        if not self._remote or len(commands) < 2:
+            return [self._execute(args, shell=shell, run_in_job_dir=run_in_job_dir, idempotent=idempotent)
+                    for args in commands]
+
+        futures = [self._remote.submit_command(self._remote_command(args, run_in_job_dir, shell), retry=idempotent)
+                   for args in commands]
+        results = []
+        for args, future in zip(commands, futures):
+            log.info('Executing remote command %s', ' '.join(args))
+            try:
+                results.append(('\n'.join(future.result()), None))
+            except (RuntimeError, SSHException) as e:
+                results.append((None, str(e)))
+            log.info('Execute results - out: %s, err: %s', *results[-1])
+        return results
+
+    def _execute_stream(self, args, shell=False, run_in_job_dir=True):
+        """Run a command as _execute does, but yield its stdout in chunks as it arrives instead of buffering it all.
+
+        Raises:
+            HTCondorError: Once the output has been read, if the command failed or wrote to stderr (which _execute
+                reports as err).
+
+        """
+        log.info('Streaming %s command %s', 'remote' if self._remote else 'local', ' '.join(args))
+        if self._remote:
+            output = self._remote.iter_output(self._remote_command(args, run_in_job_dir, shell))
+        else:
+            output = self._iter_local_output(args, shell)
+
+        stderr = []
+        try:
+            for name, text in output:
+                if name == 'stdout':
+                    yield text
+                else:
+                    stderr.append(text)
+        except (RuntimeError, SSHException) as e:
+            raise HTCondorError(str(e))
+        if ''.join(stderr):
+            raise HTCondorError(''.join(stderr))
+
+    def _iter_local_output(self, args, shell=False, read_size=32768):
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=shell,
+                                   cwd=self._local_cwd())
+        # stderr is drained on a thread so that a command writing a lot to it cannot block on a full pipe.
+        stderr = []
+        reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()))
+        reader.daemon = True
+        reader.start()
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        try:
+            for data in iter(lambda: process.stdout.read1(read_size), b''):
+                yield 'stdout', decoder.decode(data)
+            yield 'stdout', decoder.decode(b'', final=True)
+        finally:
+            process.stdout.close()
+            reader.join()
+            process.stderr.close()
+            process.wait()
+        if stderr and stderr[0]:
+            yield 'stderr', stderr[0].decode('utf-8', 'replace')
+
+    def _remote_command(self, args, run_in_job_dir=True, shell=False):
+        # Without shell, each arg is one argument to the command, as it would be locally.
+        cmd = args[0] if shell else ' '.join(shlex.quote(arg) for arg in args)
+        if run_in_job_dir:
+            cmd = 'cd %s && %s' % (self._remote_id, cmd)
+        return cmd
+
+    def _execute_local(self, args, shell=False):
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=shell,
+                                   cwd=self._local_cwd())
+        out, err = process.communicate()
+        out = out.decode() if isinstance(out, bytes) else out
+        err = err.decode() if isinstance(err, bytes) else err
+        return out, err
+
     def _copy_input_files_to_remote(self):
-        self._remote.put(self.remote_input_files, self._remote_id)
+        local_paths = [self._local_path(path) for path in self.remote_input_files or []]
+        if self._remote.input_cache is not None:
+            self._remote.input_cache.put(local_paths, self._remote_id)
+        else:
+            self._remote.put(local_paths, self._remote_id)
 
-    @set_cwd
     def _copy_output_from_remote(self):
-        self._remote.get(os.path.join(self._remote_id, self.initial_dir))
+        self._remote.get(os.path.join(self._remote_id, self.initial_dir), self._local_cwd())
 
-    @set_cwd
     def _open(self, file_name, mode='w'):
         if self._remote:
             return self._remote.remote_file(os.path.join(self._remote_id, file_name), mode)
         else:
-            return open(file_name, mode)
+            return self._open_local(file_name, mode)
+
+    def _open_local(self, file_name, mode='w'):
+        return open(self._local_path(file_name), mode)
 
-    @set_cwd
     def _make_dir(self, dir_name):
         try:
             log.info('making directory %s', dir_name)
             if self._remote:
                 self._remote.makedirs(os.path.join(self._remote_id, dir_name))
             else:
-                os.makedirs(dir_name)
+                self._make_local_dir(dir_name)
         except OSError:
             log.warn('Unable to create directory %s. It may already exist.', dir_name)
+
+    def _make_local_dir(self, dir_name):
+        os.makedirs(self._local_path(dir_name))
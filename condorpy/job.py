@@ -12,6 +12,7 @@ from collections import OrderedDict
 
 from .htcondor_object_base import HTCondorObjectBase
 from .static import CONDOR_JOB_STATUSES
+from .user_log import UserLogTracker
 from .logger import log
 from .exceptions import NoExecutable, RemoteError, HTCondorError
 
@@ -54,6 +55,11 @@ class Job(HTCondorObjectBase):
 
     """
 
+    # Most clusters a single batched status query will ask about (see statuses_for).
+    _STATUS_BATCH_SIZE = 1000
+    # Number of itemdata rows written to the submit description file at a time.
+    _ITEM_CHUNK_SIZE = 1000
+
     def __init__(self,
                  name,
                  attributes=None,
@@ -73,6 +79,12 @@ class Job(HTCondorObjectBase):
         object.__setattr__(self, '_attributes', OrderedDict())
         object.__setattr__(self, '_num_jobs', int(num_jobs))
         object.__setattr__(self, '_job_file', '')
+        object.__setattr__(self, '_log_tracker', None)
+        # The job's first proc in a cluster it shares with other jobs (see submit_many), or None if it has a cluster
+        # of its own.
+        object.__setattr__(self, '_first_proc', None)
+        object.__setattr__(self, '_itemdata', None)
+        object.__setattr__(self, '_num_items', None)
         super(Job, self).__init__(host, username, password, private_key, private_key_pass, remote_input_files, working_directory)
 
         attributes = attributes or OrderedDict()
@@ -82,7 +94,7 @@ class Job(HTCondorObjectBase):
             self.set(attr, value)
 
     def __str__(self):
-        return '\n'.join(self._list_attributes()) + '\n\nqueue %d\n' % (self.num_jobs)
+        return ''.join(self._description_chunks())
 
     def __repr__(self):
         return '<Job: name=%s, num_jobs=%d, cluster_id=%s>' % (self.name, self.num_jobs, self.cluster_id)
@@ -90,6 +102,12 @@ class Job(HTCondorObjectBase):
     def __copy__(self):
         copy = Job(self.name)
         copy.__dict__.update(self.__dict__)
+        copy._remote = None
+        copy._share_remote(self._remote)
+        copy._status_cache = dict()
+        if self._log_tracker:
+            copy._log_tracker = None
+            copy.track_user_log()
         return copy
 
     def __deepcopy__(self, memo):
@@ -143,6 +161,54 @@ class Job(HTCondorObjectBase):
     def num_jobs(self, num_jobs):
         self._num_jobs = int(num_jobs)
 
+    def _num_procs(self):
+        if self._itemdata:
+            return self.num_jobs * (self._num_items or 0)
+        return self.num_jobs
+
+    @property
+    def item_variables(self):
+        """The names of the variables set from each item of the job's itemdata, or None if it has none.
+
+        """
+        return self._itemdata[0] if self._itemdata else None
+
+    def queue_from(self, variables, items):
+        """Queue num_jobs procs for each item of a list, as 'queue var1,var2 from ...' does.
+
+        Each item sets the named variables, which attribute values can reference as $(var1). This way a parameter
+        sweep is one cluster and one submit description file rather than a Job per point. Items from a Python
+        iterable are streamed into the submit description file when it is written, so a generator can supply very
+        many of them without holding them in memory, but it is used up by the first write (or str of the job):
+        writing the job again raises ValueError rather than queueing no items, so pass a list to submit a job whose
+        description has already been written, or call queue_from again with fresh items.
+
+        If the initialdir attribute references item variables, a directory is created for each item when the job
+        is submitted.
+
+        Args:
+            variables (str or list of str): The variable names, as a list or as a comma separated string.
+            items (iterable or str): One item per proc (or per num_jobs procs). An item is a tuple with a value
+                for each variable, or a string in the itemdata format (values separated by commas or spaces, the
+                last variable getting the rest of the line). A str is taken to be the path of an itemdata file
+                instead, relative to the working directory.
+
+        """
+        if isinstance(variables, str):
+            variables = [v.strip() for v in variables.split(',')]
+        variables = [v for v in variables if v]
+        if not variables:
+            raise ValueError('At least one item variable is required.')
+        self._itemdata = (variables, items)
+        self._num_items = len(items) if hasattr(items, '__len__') and not isinstance(items, str) else None
+
+    def clear_itemdata(self):
+        """Go back to queueing num_jobs procs without itemdata.
+
+        """
+        self._itemdata = None
+        self._num_items = None
+
     @property
     def status(self):
         """The status
@@ -151,11 +217,16 @@ class Job(HTCondorObjectBase):
         if self.cluster_id == self.NULL_CLUSTER_ID:
             return "Unexpanded"
 
-        status_dict = self.statuses
+        return self._summarize_statuses(self.statuses)
+
+    def _summarize_statuses(self, status_dict):
+        """Reduce per-proc status counts to one status, which is 'Various' unless every proc shares a status.
+
+        """
         # determine job status
         status = "Various"
         for key, val in status_dict.items():
-            if val == self.num_jobs:
+            if val == self._num_procs():
                 status = key
         return status
 
@@ -167,7 +238,155 @@ class Job(HTCondorObjectBase):
         if self.cluster_id == self.NULL_CLUSTER_ID:
             return "Unexpanded"
 
-        return self._update_status()
+        if self._log_tracker:
+            return self._cached_status('statuses', self._update_status_from_log)
+        return self._cached_status('statuses', self._update_status)
+
+    @property
+    def log_tracker(self):
+        """The UserLogTracker statuses are read from, or None if they are queried from the scheduler.
+
+        """
+        return self._log_tracker
+
+    def track_user_log(self, enabled=True):
+        """Read the job's statuses from its user log instead of querying condor_q and condor_history.
+
+        Each status read then only parses the events appended to the log since the previous read, and the scheduler
+        is not contacted at all. For remote jobs the log is read over SFTP.
+
+        Args:
+            enabled (bool, optional): If False go back to querying the scheduler. Defaults to True.
+
+        """
+        self._log_tracker = UserLogTracker(self.log_file, opener=self._open) if enabled else None
+        self.refresh()
+
+    @classmethod
+    def statuses_for(cls, jobs):
+        """Get the statuses of many jobs with one query per scheduler.
+
+        Jobs are grouped by the scheduler they were submitted to, and each group is answered by a single
+        condor_q/condor_history constraint query rather than one query per job. A job missing from the batched
+        results (or a group whose batched query fails) falls back to its own query, and jobs tracking their user
+        log read it instead.
+
+        Args:
+            jobs (iterable of Job): The jobs to get statuses for.
+
+        Returns:
+            dict: Job -> the value that job's statuses property would return.
+
+        """
+        results = dict()
+        groups = dict()
+        for job in jobs:
+            if job.cluster_id == job.NULL_CLUSTER_ID:
+                results[job] = "Unexpanded"
+            elif job._fresh_status('statuses') is not None:
+                results[job] = job._fresh_status('statuses')
+            elif job._log_tracker:
+                results[job] = job.statuses
+            else:
+                groups.setdefault(job._scheduler_key(), []).append(job)
+
+        for group in groups.values():
+            try:
+                procs = group[0].backend.proc_statuses(group)
+            except HTCondorError:
+                log.warning('Batched status query failed for %d job(s); falling back to per-job queries.',
+                            len(group), exc_info=True)
+                procs = dict()
+
+            for job in group:
+                codes = procs.get(job.cluster_id, dict())
+                first_proc = job._first_proc or 0
+                # Looked up by proc id, as sorting the procs of a shared cluster for each of its jobs is quadratic.
+                codes = [codes[proc] for proc in range(first_proc, first_proc + job._num_procs()) if proc in codes]
+                if len(codes) == job._num_procs():
+                    results[job] = cls._count_statuses(codes)
+                else:
+                    results[job] = job._update_status()
+                job._cache_status('statuses', results[job])
+
+        return results
+
+    @classmethod
+    def _query_proc_statuses(cls, jobs):
+        """Query the status of every proc of several jobs that share a scheduler.
+
+        Args:
+            jobs (list of Job): Submitted jobs that all share one scheduler.
+
+        Returns:
+            dict: cluster_id (int) -> {proc_id (int): JobStatus code (int)}
+
+        """
+        job_delimiter = '+++'
+        attr_delimiter = ';;;'
+        format = [
+            '-format', '"%d' + attr_delimiter + '"', 'ClusterId',
+            '-format', '"%d' + attr_delimiter + '"', 'ProcId',
+            '-format', '"%d' + job_delimiter + '"', 'JobStatus',
+        ]
+        cluster_ids = sorted(set(job.cluster_id for job in jobs))
+        procs = dict()
+        # `sh -c` and exec_command both take the whole command as one argument, which the kernel caps at 128 KiB,
+        # so very large batches are split across a few queries, which run concurrently on a remote scheduler.
+        helper = jobs[0]._remote.helper if jobs[0]._remote else None
+        if helper is not None:
+            return cls._query_proc_statuses_with_helper(helper, cluster_ids)
+
+        commands = []
+        for start in range(0, len(cluster_ids), cls._STATUS_BATCH_SIZE):
+            batch = cluster_ids[start:start + cls._STATUS_BATCH_SIZE]
+            constraint = "'member(ClusterId, {%s})'" % (','.join(str(c) for c in batch),)
+            cmd = ('condor_q -constraint {0} {1} && '
+                   'condor_history -constraint {0} {1}').format(constraint, ' '.join(format))
+            commands.append([cmd])
+
+        for out, err in jobs[0]._execute_many(commands, shell=True, run_in_job_dir=False, idempotent=True):
+            if err:
+                raise HTCondorError(err)
+
+            for record in (out or '').replace('"', '').split(job_delimiter):
+                parts = [p for p in record.strip().split(attr_delimiter) if p != '']
+                if len(parts) < 3:
+                    continue
+                try:
+                    cluster_id, proc_id, status_code = (int(p) for p in parts[:3])
+                except ValueError:
+                    continue
+                # condor_q runs first, so a proc that shows up in both the queue and the history keeps its
+                # queue status, as it does in the per-job query.
+                procs.setdefault(cluster_id, dict()).setdefault(proc_id, status_code)
+
+        return procs
+
+    @classmethod
+    def _query_proc_statuses_with_helper(cls, helper, cluster_ids):
+        """_query_proc_statuses through the scheduler's RemoteHelper, which answers with job ads rather than text.
+
+        """
+        attributes = ['ClusterId', 'ProcId', 'JobStatus']
+        requests = []
+        for start in range(0, len(cluster_ids), cls._STATUS_BATCH_SIZE):
+            batch = cluster_ids[start:start + cls._STATUS_BATCH_SIZE]
+            constraint = 'member(ClusterId, {%s})' % (','.join(str(c) for c in batch),)
+            requests.append(('query', dict(constraint=constraint, attributes=attributes)))
+
+        procs = dict()
+        try:
+            responses = helper.client.call_with_retry(lambda: helper.batch(requests))
+        except RuntimeError as e:
+            raise HTCondorError(str(e))
+        for response in responses:
+            if not response['ok']:
+                raise HTCondorError(response['error'])
+            for ad in response['result']:
+                # Queue ads come before history ads, as in the text query.
+                procs.setdefault(ad['ClusterId'], dict()).setdefault(ad['ProcId'], ad['JobStatus'])
+        return procs
 
     @property
     def job_file(self):
@@ -175,7 +394,11 @@ class Job(HTCondorObjectBase):
 
         """
         job_file_name = '%s.job' % (self.name)
-        job_file_path = os.path.join(self.initial_dir, job_file_name)
+        initial_dir = self.initial_dir
+        if self._item_references(initial_dir):
+            # There is one initial directory per item, so the file goes in the working directory.
+            initial_dir = os.curdir
+        job_file_path = os.path.join(initial_dir, job_file_name)
         self._job_file = job_file_path
         return self._job_file
 
@@ -209,7 +432,7 @@ class Job(HTCondorObjectBase):
             raise RemoteError('Cannot define an absolute path as an initial_dir on a remote scheduler')
         return initial_dir
 
-    def submit(self, queue=None, options=[]):
+    def submit(self, queue=None, options=[], bundle=False):
         """Submits the job either locally or to a remote server if it is defined.
 
         Args:
@@ -218,6 +441,120 @@ class Job(HTCondorObjectBase):
             options (list of str, optional): A list of command line options for the condor_submit command. For
                 details on valid options see: http://research.cs.wisc.edu/htcondor/manual/current/condor_submit.html.
                 Defaults to an empty list.
+            bundle (bool, optional): On a remote scheduler, send the submit description file, the directories it
+                needs and the input files as one tar archive, and unpack it and run condor_submit in a single remote
+                command, rather than making a round trip for each. Defaults to False. Ignored for local jobs.
+
+        """
+        if not (bundle and self._remote):
+            args = self._prepare_submit(queue, options)
+            return super(Job, self).submit(args)
+
+        with self._bundling() as submit_bundle:
+            args = self._prepare_submit(queue, options)
+        return super(Job, self).submit(args, submit_bundle)
+
+    @classmethod
+    def submit_many(cls, jobs, options=[]):
+        """Submit many jobs with one condor_submit per scheduler.
+
+        The jobs are rendered into a single submit description file, one queue statement per job, which is
+        submitted in one call instead of one call per job. Attributes a job does not set are cleared before its
+        queue statement, so no job inherits another's attributes. The combined file is named after the first job
+        and written to its working directory, and jobs on a remote scheduler share the first job's remote
+        directory, as the nodes of a workflow do.
+
+        Note:
+            condor_submit may put consecutive jobs into the same cluster (it starts a new one when the executable
+            changes). Each job keeps track of which procs of its cluster are its own, but $(Process) counts across
+            the whole cluster; use $(Step) for a job's own proc number.
+
+        Args:
+            jobs (iterable of Job): The jobs to submit.
+            options (list of str, optional): A list of command line options for the condor_submit command.
+                Defaults to an empty list.
+
+        Returns:
+            list: The cluster id of each job, in the order given.
+
+        """
+        jobs = list(jobs)
+        groups = OrderedDict()
+        for job in jobs:
+            if not job.executable:
+                log.error('Job %s was submitted with no executable', job.name)
+                raise NoExecutable('You cannot submit a job without an executable')
+            groups.setdefault((job._scheduler_key(), job._cwd), []).append(job)
+
+        for group in groups.values():
+            first = group[0]
+            for job in group:
+                job._share_remote(first._remote)
+                job._remote_id = first._remote_id
+                job._make_job_dirs()
+                if job._remote:
+                    job._copy_input_files_to_remote()
+                job.refresh()
+
+            submit_file = '%s.bulk.job' % (first.name,)
+            f = first._open(submit_file, 'w')
+            try:
+                for chunk in cls._bulk_submit_description(group):
+                    f.write(chunk)
+            finally:
+                f.close()
+
+            args = ['condor_submit']
+            args.extend(options)
+            args.append(submit_file)
+            log.info('Submitting %d jobs with options: %s', len(group), args)
+            cls._assign_clusters(group, first.backend.submit_many(group, args))
+
+        return [job.cluster_id for job in jobs]
+
+    @staticmethod
+    def _bulk_submit_description(jobs):
+        """Render the combined submit description of several jobs, one job at a time.
+
+        """
+        previous = []
+        for job in jobs:
+            keys = [k for k, v in job.attributes.items() if v]
+            cleared = ['%s =' % (k,) for k in previous if k not in keys]
+            yield '\n'.join(cleared + job._list_attributes()) + '\n\n'
+            for chunk in job._queue_chunks(job._make_item_dir):
+                yield chunk
+            yield '\n'
+            previous.extend(k for k in keys if k not in previous)
+
+    @staticmethod
+    def _assign_clusters(jobs, clusters):
+        """Set each job's cluster id (and its first proc, if it shares the cluster) from the clusters condor_submit
+        created for them.
+
+        """
+        clusters = iter(clusters)
+        cluster_id = None
+        size = None
+        remaining = 0
+        next_proc = 0
+        for job in jobs:
+            if remaining <= 0:
+                cluster_id, size = next(clusters, (-1, None))
+                # When the count is unknown, the rest of the jobs are taken to be in this cluster.
+                remaining = size if size is not None else sum(j._num_procs() for j in jobs)
+                next_proc = 0
+            job._cluster_id = cluster_id
+            job._first_proc = None if next_proc == 0 and size == job._num_procs() else next_proc
+            next_proc += job._num_procs()
+            remaining -= job._num_procs()
+            log.info('Job %s submitted to cluster %s', job.name, cluster_id)
+
+    def _prepare_submit(self, queue=None, options=[]):
+        """Write the submit description file (and copy inputs to a remote scheduler) ahead of condor_submit.
+
+        Returns:
+            list: The condor_submit args.
 
         """
         if not self.executable:
@@ -225,6 +562,7 @@ class Job(HTCondorObjectBase):
             raise NoExecutable('You cannot submit a job without an executable')
 
         self._num_jobs = queue or self.num_jobs
+        self._first_proc = None
 
         self._write_job_file()
 
@@ -233,7 +571,7 @@ class Job(HTCondorObjectBase):
         args.append(self.job_file)
 
         log.info('Submitting job %s with options: %s', self.name, args)
-        return super(Job, self).submit(args)
+        return args
 
     def edit(self):
         """Interface for CLI edit command.
@@ -253,16 +591,29 @@ class Job(HTCondorObjectBase):
                 Defaults to an empty list.
             job_num (int, optional): The number
         """
-        args = ['condor_wait']
-        args.extend(options)
-        job_id = '%s.%s' % (self.cluster_id, sub_job_num) if sub_job_num else str(self.cluster_id)
+        out, err = self.backend.wait(self, options, sub_job_num)
+        self.refresh()
+        return out, err
+
+    def _wait_commands(self, options=[], sub_job_num=None):
+        """The condor_wait commands to run in turn to wait for the job, or one of its sub-jobs.
+
+        condor_wait takes a single job id, so a job that shares its cluster with others (see submit_many) waits on
+        each of its own procs rather than on the whole cluster.
+
+        """
+        if sub_job_num:
+            job_ids = ['%s.%s' % (self.cluster_id, (self._first_proc or 0) + int(sub_job_num))]
+        elif self._first_proc is not None:
+            job_ids = ['%s.%s' % (self.cluster_id, proc)
+                       for proc in range(self._first_proc, self._first_proc + self._num_procs())]
+        else:
+            job_ids = [str(self.cluster_id)]
         if self._remote:
             abs_log_file = self.log_file
         else:
-            abs_log_file = os.path.abspath(self.log_file)
-        args.extend([abs_log_file, job_id])
-        out, err = self._execute(args)
-        return out, err
+            abs_log_file = self._local_path(self.log_file)
+        return [['condor_wait'] + list(options) + [abs_log_file, job_id] for job_id in job_ids]
 
     def get(self, attr, value=None, resolve=True):
         """Get the value of an attribute from submit description file.
@@ -354,11 +705,28 @@ class Job(HTCondorObjectBase):
             str: The current status of the job
 
         """
-        job_id = '%s.%s' % (self.cluster_id, sub_job_num) if sub_job_num else str(self.cluster_id)
-        format = ['-format', '"%d"', 'JobStatus']
-        cmd = 'condor_q {0} {1} && condor_history {0} {1}'.format(job_id, ' '.join(format))
-        args = [cmd]
-        out, err = self._execute(args, shell=True, run_in_job_dir=False)
+        return self.backend.job_status(self, sub_job_num)
+
+    def _job_ids(self, sub_job_num=None):
+        if self._first_proc is None:
+            return super(Job, self)._job_ids(sub_job_num)
+        if sub_job_num:
+            return ['%s.%s' % (self.cluster_id, self._first_proc + int(sub_job_num))]
+        # The job shares its cluster with jobs submitted alongside it (see submit_many).
+        return ['-constraint', self._proc_constraint()]
+
+    def _proc_constraint(self, sub_job_num=None):
+        if self._first_proc is None:
+            return super(Job, self)._proc_constraint(sub_job_num)
+        if sub_job_num:
+            return super(Job, self)._proc_constraint(self._first_proc + int(sub_job_num))
+        return 'ClusterId == %d && ProcId >= %d && ProcId < %d' % (int(self.cluster_id), self._first_proc,
+                                                                   self._first_proc + self._num_procs())
+
+    def _read_status_output(self, job_id, out, err, sub_job_num=None):
+        """Count the per-proc statuses in the output of the command built by _status_query.
+
+        """
         if err:
             log.error('Error while updating status for job %s: %s', job_id, err)
             raise HTCondorError(err)
@@ -369,20 +737,53 @@ class Job(HTCondorObjectBase):
         out = out.replace('\"', '')
         log.info('Job %s status: %s', job_id, out)
 
+        return self._statuses_from_codes(job_id, out, sub_job_num)
+
+    def _statuses_from_codes(self, job_id, status_codes, sub_job_num=None):
+        """Count the per-proc statuses, given the JobStatus codes reported for the cluster in proc order.
+
+        """
         if not sub_job_num:
-            if len(out) >= self.num_jobs:
-                out = out[:self.num_jobs]
+            if len(status_codes) >= self._num_procs():
+                status_codes = status_codes[:self._num_procs()]
             else:
-                msg = 'There are {0} sub-jobs, but {1} status(es).'.format(self.num_jobs, len(out))
+                msg = 'There are {0} sub-jobs, but {1} status(es).'.format(self._num_procs(), len(status_codes))
                 log.error(msg)
                 raise HTCondorError(msg)
 
+        return self._count_statuses(status_codes)
+
+    def _update_status_from_log(self):
+        """Gets the job statuses from the user log.
+
+        Return:
+            dict: The number of procs in each status.
+
+        """
+        # The log path can resolve differently once the job is submitted (e.g. templates put $(cluster) in it).
+        log_file = self.log_file
+        if self._log_tracker.path != log_file:
+            self._log_tracker = UserLogTracker(log_file, opener=self._open)
+        self._log_tracker.update()
+        return self._log_tracker.statuses(self.cluster_id, self._num_procs(), self._first_proc or 0)
+
+    @staticmethod
+    def _count_statuses(status_codes):
+        """Count how many procs are in each status.
+
+        Args:
+            status_codes (iterable): One JobStatus code per proc, as an int or a string.
+
+        Returns:
+            dict: status name (str) -> number of procs in that status.
+
+        """
         #initialize status dictionary
         status_dict = dict()
         for val in CONDOR_JOB_STATUSES.values():
             status_dict[val] = 0
 
-        for status_code_str in out:
+        for status_code_str in status_codes:
             status_code = 0
             try:
                 status_code = int(status_code_str)
@@ -400,15 +801,124 @@ class Job(HTCondorObjectBase):
                 attribute_list.append(k + ' = ' + str(v))
         return attribute_list
 
+    def _description_chunks(self, on_item=None):
+        """The submit description, in pieces small enough to write one at a time.
+
+        Args:
+            on_item (callable, optional): Called with a dict of the item variables' values as each item is
+                rendered.
+
+        """
+        yield '\n'.join(self._list_attributes()) + '\n\n'
+        for chunk in self._queue_chunks(on_item):
+            yield chunk
+
+    def _queue_chunks(self, on_item=None):
+        """The queue statement, with any itemdata streamed after it in chunks of _ITEM_CHUNK_SIZE rows.
+
+        """
+        if not self._itemdata:
+            yield 'queue %d\n' % (self.num_jobs,)
+            return
+
+        variables, items = self._itemdata
+        if isinstance(items, str):
+            yield 'queue %d %s from %s\n' % (self.num_jobs, ','.join(variables), items)
+            if on_item:
+                # The local copy: the remote one is only uploaded once the submit description has been written.
+                item_file = self._open_local(items, 'r')
+                try:
+                    rows = [row for row in (line.strip() for line in item_file) if row and not row.startswith('#')]
+                finally:
+                    item_file.close()
+                for row in rows:
+                    on_item(self._item_values(row))
+                self._num_items = len(rows)
+            return
+
+        if iter(items) is items:
+            # An iterator can only be read once; _num_items is set as soon as it has been.
+            if self._num_items is not None:
+                raise ValueError('The items of job %s were used up when its submit description was first written. '
+                                 'Call queue_from again before writing it again.' % (self.name,))
+            self._num_items = 0
+        yield 'queue %d %s from (\n' % (self.num_jobs, ','.join(variables))
+        num_items = 0
+        rows = []
+        for item in items:
+            row = self._item_row(item)
+            rows.append(row)
+            num_items += 1
+            if on_item:
+                on_item(self._item_values(item))
+            if len(rows) == self._ITEM_CHUNK_SIZE:
+                yield '\n'.join(rows) + '\n'
+                rows = []
+        if rows:
+            yield '\n'.join(rows) + '\n'
+        yield ')\n'
+        self._num_items = num_items
+
+    def _item_row(self, item):
+        """Format an item as a line of itemdata.
+
+        """
+        if isinstance(item, (list, tuple)):
+            if len(item) != len(self.item_variables):
+                raise ValueError('Item %r does not have a value for each of the variables %s.'
+                                 % (item, ', '.join(self.item_variables)))
+            row = ','.join(str(value) for value in item)
+        else:
+            row = str(item)
+        if '\n' in row or row.strip() == ')':
+            raise ValueError('Item %r cannot be written as a line of itemdata.' % (item,))
+        return row
+
+    def _item_values(self, item):
+        """Map each item variable to its value in an item, splitting a line of itemdata as condor_submit does.
+
+        """
+        variables = self.item_variables
+        if isinstance(item, (list, tuple)):
+            values = [str(value) for value in item]
+        else:
+            values = re.split(r'[\s,]+', str(item).strip(), maxsplit=len(variables) - 1)
+        return dict(zip([v.lower() for v in variables], values))
+
+    def _item_references(self, value):
+        """Whether a value references any item variables.
+
+        """
+        if not self._itemdata or not value:
+            return False
+        variables = set(v.lower() for v in self.item_variables)
+        return any(name.lower() in variables for name in re.findall(r'\$\((.*?)\)', value))
+
+    def _make_item_dir(self, values):
+        """Create the initial directory of one item, when the initial directory depends on item variables.
+
+        """
+        initial_dir = self.initial_dir
+        if self._item_references(initial_dir):
+            self._make_dir(re.sub(r'\$\((.*?)\)', lambda m: values.get(m.group(1).lower(), m.group(0)), initial_dir))
+
     def _write_job_file(self):
         self._make_job_dirs()
         job_file = self._open(self.job_file, 'w')
-        job_file.write(self.__str__())
-        job_file.close()
+        try:
+            for chunk in self._description_chunks(self._make_item_dir):
+                job_file.write(chunk)
+        finally:
+            job_file.close()
         if self._remote:
             self._copy_input_files_to_remote()
 
     def _make_job_dirs(self):
+        if self._item_references(self.initial_dir):
+            # Each item's directory is made as the itemdata is written, but the job file needs the remote directory.
+            if self._remote:
+                self._make_dir('')
+            return
         self._make_dir(self.initial_dir)
         log_dir = self.get('logdir')
         if log_dir:
@@ -440,4 +950,8 @@ class Job(HTCondorObjectBase):
         if match.group(1) == 'cluster':
             return str(self.cluster_id)
 
+        # Item variables only have values once condor_submit expands the queue statement.
+        if self._item_references(match.group(0)):
+            return match.group(0)
+
         return self.get(match.group(1), match.group(0))
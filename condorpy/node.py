@@ -5,6 +5,8 @@
 # condorpy is free software: you can redistribute it and/or modify it under
 # the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
 # should have been distributed with this file.
+import itertools
+
 from .logger import log
 
 from .htcondor_object_base import HTCondorObjectBase
@@ -15,6 +17,10 @@ class Node(object):
     """
 
     """
+    # Stamps every change to the graph: a new parent or child link anywhere, or a node added to a workflow. Cached
+    # traversals record the stamp they were computed at and are stale once it moves on. next() on a count is atomic.
+    _generations = itertools.count(1)
+    _graph_generation = 0
 
     def __init__(self, job,
                  parents=None,
@@ -45,6 +51,8 @@ class Node(object):
             ...
         """
         self.job = job
+        self._ancestors = None
+        self._descendants = None
         self._parent_nodes = parents or set()
         self._link_parent_nodes()
         self._child_nodes = children or set()
@@ -371,6 +379,7 @@ class Node(object):
         """
         assert isinstance(parent, Node)
         self.parent_nodes.add(parent)
+        self._graph_changed()
         if self not in parent.child_nodes:
             parent.add_child(self)
 
@@ -382,6 +391,7 @@ class Node(object):
         """
         assert isinstance(parent, Node)
         self.parent_nodes.discard(parent)
+        self._graph_changed()
         if self in parent.child_nodes:
             parent.remove_child(self)
 
@@ -393,6 +403,7 @@ class Node(object):
         """
         assert isinstance(child, Node)
         self.child_nodes.add(child)
+        self._graph_changed()
         if self not in child.parent_nodes:
             child.add_parent(self)
 
@@ -404,6 +415,7 @@ class Node(object):
         """
         assert isinstance(child, Node)
         self.child_nodes.discard(child)
+        self._graph_changed()
         if self in child.parent_nodes:
             child.remove_parent(self)
 
@@ -433,18 +445,12 @@ class Node(object):
 
     def _get_all_ancestors(self):
         """
-
-        :return:
+        traverses all ancestor nodes
+        :raises: CircularDependency if self is contained in ancestors
+        :return: a set containing all ancestor nodes
         """
-        ancestors = set()
-        ancestors = ancestors.union(self.parent_nodes)
-        for parent in self.parent_nodes:
-            ancestors = ancestors.union(parent._get_all_ancestors())
-
-        if self in ancestors:
-            log.error('circular dependancy found in %s. Ancestors: %s ', self, ancestors)
-            raise CircularDependency('Node %s contains itself in it\'s list of dependencies.' % (self.job.name,))
-        return ancestors
+        self._ancestors = self._closure(self._ancestors, lambda node: node.parent_nodes, 'Ancestors')
+        return set(self._ancestors[1])
 
     def _get_all_descendants(self):
         """
@@ -452,15 +458,45 @@ class Node(object):
         :raises: CircularDependency if self is contained in descendants
         :return: a set containing all descendant nodes
         """
-        descendants = set()
-        descendants = descendants.union(self.child_nodes)
-        for child in self.child_nodes:
-            descendants = descendants.union(child._get_all_descendants())
+        self._descendants = self._closure(self._descendants, lambda node: node.child_nodes, 'Descendants')
+        return set(self._descendants[1])
+
+    def _closure(self, cached, relatives, label):
+        """Every node reachable from this one through relatives, reusing cached if the graph is unchanged since.
+
+        One iterative walk visits each node and link once, however many paths lead to a node and however long the
+        chains, where recursing into every relative and merging their sets repeats the work below each shared node.
 
-        if self in descendants:
-            log.error('circular dependancy found in %s. Descendants: %s ', self, descendants)
+        Args:
+            cached (tuple): The (generation, frozenset) of the last walk, or None.
+            relatives (callable): Returns the nodes a node links to in the direction being walked.
+            label (str): Names the direction in the log when a cycle is found.
+
+        Returns:
+            tuple: The (generation, frozenset) to cache.
+
+        """
+        generation = Node._graph_generation
+        if cached is not None and cached[0] == generation:
+            return cached
+
+        found = set()
+        stack = list(relatives(self))
+        while stack:
+            node = stack.pop()
+            if node not in found:
+                found.add(node)
+                stack.extend(relatives(node))
+
+        if self in found:
+            log.error('circular dependancy found in %s. %s: %s ', self, label, found)
             raise CircularDependency('Node %s contains itself in it\'s list of dependencies.' % (self.job.name,))
-        return descendants
+        return generation, frozenset(found)
+
+    @classmethod
+    def _graph_changed(cls):
+        """Mark every cached traversal stale."""
+        cls._graph_generation = next(cls._generations)
 
     def _link_parent_nodes(self):
         """
@@ -0,0 +1,274 @@
+# Copyright (c) 2015 Scott Christensen
+#
+# This file is part of condorpy
+#
+# condorpy is free software: you can redistribute it and/or modify it under
+# the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
+# should have been distributed with this file.
+
+import hashlib
+import json
+import os
+import posixpath
+import shlex
+import threading
+import time
+import uuid
+
+from .exceptions import RemoteError
+from .logger import log
+
+
+class RemoteInputCache(object):
+    """A content-addressed store of input files on a remote scheduler, shared by every job submitted to it.
+
+    Each file is hashed locally and uploaded once to ~/.condorpy/cas/<sha256> on the scheduler, then hard-linked
+    into each job's remote directory (or copied, where a hard link cannot be made). A local JSON index records
+    which hashes each host already has and when each was last used, so a repeated submission uploads only the files
+    the scheduler has not seen. When max_bytes is set, the least recently used objects beyond it are removed from
+    the scheduler; a job directory that linked or copied one keeps its copy, and an object a put is still using
+    is never removed. The index is locked only while it is read and written, so puts to the same or different
+    schedulers upload and link their files at the same time.
+
+    Jobs should not modify their inputs in place: a hard-linked input is the cached object.
+
+    To use it, set it as a client's input_cache:
+
+        >>> job.scheduler.input_cache = RemoteInputCache(job.scheduler, max_bytes=10 * 2 ** 30)
+
+    Args:
+        client (RemoteClient): The connection to the scheduler.
+        index_path (str, optional): The local index file. Defaults to ~/.condorpy/cas_index.json.
+        max_bytes (int, optional): Most bytes to keep cached on the scheduler. Defaults to None, meaning no limit.
+
+    """
+
+    DIRECTORY = '.condorpy/cas'
+    DEFAULT_INDEX = os.path.join('~', '.condorpy', 'cas_index.json')
+
+    # abspath -> (size, mtime, sha256), so that an unchanged file is not hashed again for every job.
+    _digests = dict()
+    _digests_lock = threading.Lock()
+    # Serializes updates to index files shared by the caches of several clients.
+    _index_lock = threading.Lock()
+    _index_changed = threading.Condition(_index_lock)
+    # (host_key, digest) -> the number of puts using that object, which eviction must leave alone.
+    _in_use = dict()
+    # (host_key, digest) of objects being removed; puts that need one wait until it is gone.
+    _evicting = set()
+
+    def __init__(self, client, index_path=None, max_bytes=None):
+        self.client = client
+        self.index_path = os.path.expanduser(index_path or self.DEFAULT_INDEX)
+        self.max_bytes = max_bytes
+
+    @property
+    def host_key(self):
+        """The key of this scheduler's entries in the index.
+
+        """
+        return '%s@%s:%s' % (self.client.username, self.client.host, self.client.port)
+
+    @classmethod
+    def file_digest(cls, path):
+        """The sha256 of a local file, hashed again only if its size or mtime has changed.
+
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with cls._digests_lock:
+            size, mtime, digest = cls._digests.get(path, (None, None, None))
+        if (size, mtime) == (stat.st_size, stat.st_mtime_ns):
+            return digest
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with cls._digests_lock:
+            cls._digests[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+    def put(self, local_paths, remote_path):
+        """Copy local files and directories into a remote directory through the cache, as RemoteClient.put would.
+
+        Raises:
+            RemoteError: If a file could not be linked into the remote directory even after uploading it again.
+
+        """
+        if isinstance(local_paths, str):
+            local_paths = [local_paths]
+        files, dirs = self._walk(local_paths, remote_path)
+        digests = [self.file_digest(local_path) for local_path, target in files]
+        keys = set((self.host_key, digest) for digest in digests)
+
+        with self._index_changed:
+            while keys & self._evicting:
+                self._index_changed.wait()
+            for key in keys:
+                self._in_use[key] = self._in_use.get(key, 0) + 1
+            known = set(self._load().get(self.host_key, ()))
+        try:
+            uploaded = self._upload(files, digests, known)
+            missing = self._link(dirs, files, digests)
+            if missing:
+                # The index is out of date (someone cleared the cache on the scheduler), so upload those again.
+                log.info('%d cached inputs are gone from %s, uploading them again', len(missing), self.client.host)
+                retry = [(f, d) for f, d in zip(files, digests) if d in missing]
+                uploaded.update(self._upload([f for f, d in retry], [d for f, d in retry], known - missing))
+                if self._link([], [f for f, d in retry], [d for f, d in retry]):
+                    raise RemoteError('Could not link cached inputs into %s on %s' % (remote_path, self.client.host))
+            evicted = self._record(uploaded, digests)
+        finally:
+            with self._index_changed:
+                for key in keys:
+                    self._in_use[key] -= 1
+                    if not self._in_use[key]:
+                        del self._in_use[key]
+        if evicted:
+            self._evict(evicted)
+
+    def _record(self, uploaded, digests):
+        """Add uploaded objects to the index, mark digests as used, and choose the objects to evict.
+
+        Returns:
+            list: The digests to evict, which stay in the index until _evict has removed them.
+
+        """
+        with self._index_changed:
+            index = self._load()
+            entries = index.setdefault(self.host_key, dict())
+            entries.update(uploaded)
+            now = time.time()
+            for digest in digests:
+                if digest in entries:
+                    entries[digest]['used'] = now
+            evicted = self._choose_evictions(entries)
+            self._evicting.update((self.host_key, digest) for digest in evicted)
+            self._save(index)
+        return evicted
+
+    def _walk(self, local_paths, remote_path):
+        """Every file to copy and the remote path it goes to, and the remote directories to make for them.
+
+        """
+        files = []
+        dirs = [remote_path]
+        for local_path in local_paths:
+            local_path = local_path.rstrip(os.sep)
+            target = posixpath.join(remote_path, os.path.basename(local_path))
+            if not os.path.isdir(local_path):
+                files.append((local_path, target))
+                continue
+            for root, dir_names, file_names in os.walk(local_path):
+                relative = os.path.relpath(root, local_path)
+                remote_root = posixpath.normpath(posixpath.join(target, *relative.split(os.sep)))
+                dirs.append(remote_root)
+                files.extend((os.path.join(root, name), posixpath.join(remote_root, name)) for name in file_names)
+        return files, dirs
+
+    def _object_path(self, digest):
+        return posixpath.join(self.DIRECTORY, digest)
+
+    def _upload(self, files, digests, known):
+        """Upload the files whose digests are not known to be on the scheduler.
+
+        Returns:
+            dict: The index entry of each object uploaded, by digest.
+
+        """
+        pending = dict()
+        for (local_path, target), digest in zip(files, digests):
+            if digest not in known:
+                pending.setdefault(digest, local_path)
+        entries = dict()
+        if not pending:
+            return entries
+
+        self.client.makedirs(self.DIRECTORY)
+        sftp = self.client.sftp
+        for digest, local_path in pending.items():
+            log.info('Uploading %s to the input cache on %s', local_path, self.client.host)
+            # Uploaded under a temporary name and renamed, so an interrupted upload never looks complete.
+            partial = '%s.%s.part' % (self._object_path(digest), uuid.uuid4().hex)
+            sftp.put(local_path, partial)
+            sftp.chmod(partial, os.stat(local_path).st_mode & 0o777)
+            sftp.posix_rename(partial, self._object_path(digest))
+            entries[digest] = dict(size=os.path.getsize(local_path), used=time.time())
+        return entries
+
+    def _link(self, dirs, files, digests):
+        """Link cached objects into place with one remote shell script.
+
+        Returns:
+            set: The digests whose objects were not on the scheduler.
+
+        """
+        lines = []
+        if dirs:
+            lines.append('mkdir -p %s' % (' '.join(shlex.quote(d) for d in sorted(set(dirs))),))
+        for (local_path, target), digest in zip(files, digests):
+            # A copy rather than a symlink where a hard link fails, so evicting the object cannot break the job.
+            lines.append('if [ -f {0} ]; then ln -f {0} {1} 2>/dev/null || cp -pf {0} {1}; '
+                         'else echo MISSING {2}; fi'.format(shlex.quote(self._object_path(digest)),
+                                                            shlex.quote(target), digest))
+        # The script goes on stdin, since a command line is limited in length and there may be many files.
+        out, err = self.client.execute('sh -s', stdin='\n'.join(lines).encode('utf-8'))
+        return set(line.split()[1] for line in out.splitlines() if line.startswith('MISSING '))
+
+    def _choose_evictions(self, entries):
+        """The least recently used objects beyond max_bytes that no put is using or already evicting.
+
+        """
+        if not self.max_bytes:
+            return []
+        total = sum(entry['size'] for entry in entries.values())
+        evicted = []
+        for digest, entry in sorted(entries.items(), key=lambda item: item[1]['used']):
+            if total <= self.max_bytes:
+                break
+            key = (self.host_key, digest)
+            if key in self._in_use or key in self._evicting:
+                continue
+            evicted.append(digest)
+            total -= entry['size']
+        return evicted
+
+    def _evict(self, evicted):
+        """Remove objects from the scheduler, then from the index.
+
+        """
+        log.info('Evicting %d objects from the input cache on %s', len(evicted), self.client.host)
+        try:
+            self.client.execute('rm -f %s' % (' '.join(self._object_path(digest) for digest in evicted),))
+            removed = evicted
+        except RuntimeError as e:
+            log.warning('Could not evict objects from the input cache on %s: %s', self.client.host, e)
+            removed = []
+        with self._index_changed:
+            try:
+                index = self._load()
+                entries = index.setdefault(self.host_key, dict())
+                for digest in removed:
+                    entries.pop(digest, None)
+                self._save(index)
+            finally:
+                self._evicting.difference_update((self.host_key, digest) for digest in evicted)
+                self._index_changed.notify_all()
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return dict()
+
+    def _save(self, index):
+        directory = os.path.dirname(self.index_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        partial = '%s.%s.part' % (self.index_path, uuid.uuid4().hex)
+        with open(partial, 'w') as f:
+            json.dump(index, f)
+        os.replace(partial, self.index_path)
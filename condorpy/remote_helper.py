@@ -0,0 +1,228 @@
+# Copyright (c) 2015 Scott Christensen
+#
+# This file is part of condorpy
+#
+# condorpy is free software: you can redistribute it and/or modify it under
+# the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
+# should have been distributed with this file.
+
+import hashlib
+import inspect
+import itertools
+import json
+import socket
+import threading
+
+from paramiko import SSHException
+
+from . import _helper_script
+from .logger import log
+
+
+class HelperExited(RuntimeError):
+    """The helper exited, or its connection dropped, before it answered a request.
+
+    """
+    pass
+
+
+class RemoteHelper(object):
+    """A long-lived helper process on a remote scheduler that carries out requests sent over one channel.
+
+    Each command run through RemoteClient.execute opens a new SSH session and starts a shell on the scheduler. The
+    helper (condorpy/_helper_script.py) is uploaded to ~/.condorpy the first time it is started on a host and then
+    answers line-delimited JSON requests (execute, makedirs, rmtree, query and batch) on a channel that stays open,
+    so a request costs one round trip on an open channel.
+
+    Requests from any number of threads share the channel. Each is tagged with an id, and the helper works on them
+    concurrently and answers each as soon as it is done, so a long condor_wait does not hold up a status poll sent
+    after it. A reader thread hands each answer to the request waiting for it.
+
+    The helper holds one of its client's sessions for as long as it runs.
+
+    Args:
+        client (RemoteClient): The connection to run the helper on.
+        python (str, optional): The python interpreter on the scheduler. Defaults to 'python3'.
+
+    """
+
+    DIRECTORY = '.condorpy'
+
+    def __init__(self, client, python='python3'):
+        self.client = client
+        self.python = python
+        self._session = None
+        self._stdin = None
+        # id -> [threading.Event, response] of each request sent to the running helper and not yet answered, or
+        # None once the helper has stopped answering.
+        self._pending = dict()
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # Held to start and stop the helper, and to write a request. _start holds it while it waits for the helper
+        # to answer, so the reader thread must never need it.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _source():
+        return inspect.getsource(_helper_script)
+
+    @property
+    def remote_path(self):
+        """Where the helper script is uploaded, named by its content so that an updated helper is uploaded again.
+
+        """
+        digest = hashlib.sha256(self._source().encode('utf-8')).hexdigest()[:16]
+        return '%s/helper-%s.py' % (self.DIRECTORY, digest)
+
+    @property
+    def running(self):
+        return self._session is not None and self._pending is not None and not self._session.exit_status_ready()
+
+    def start(self):
+        """Upload the helper if the scheduler does not have it yet, and start it.
+
+        Raises:
+            RuntimeError: If the helper does not answer.
+
+        """
+        with self._lock:
+            if not self.running:
+                self._start()
+
+    def request(self, op, **params):
+        """Send one request and wait for its answer.
+
+        Returns:
+            The request's result.
+
+        Raises:
+            RuntimeError: If the request failed.
+            HelperExited: If the helper exited before answering.
+
+        """
+        response = self._round_trip(dict(op=op, **params))
+        if not response['ok']:
+            raise RuntimeError("The helper on host '{0}' could not {1}: {2}".format(self.client.host, op,
+                                                                                 response['error']))
+        return response['result']
+
+    def batch(self, requests):
+        """Send several requests in one round trip.
+
+        Args:
+            requests (list of tuple): The op (str) and params (dict) of each request.
+
+        Returns:
+            list of dict: The response to each request, in the order given: 'ok' and either 'result' or 'error'.
+
+        """
+        return self.request('batch', requests=[dict(params, op=op) for op, params in requests])
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _upload(self):
+        sftp = self.client.sftp
+        try:
+            sftp.stat(self.remote_path)
+        except IOError:
+            try:
+                sftp.mkdir(self.DIRECTORY)
+            except IOError:
+                pass
+            log.info('Uploading the condorpy helper to %s:%s', self.client.host, self.remote_path)
+            with sftp.open(self.remote_path, 'w') as f:
+                f.write(self._source())
+
+    def _start(self):
+        self._close()
+        self._upload()
+        self.client._sessions.acquire()
+        try:
+            session = self.client.transport.open_session()
+            session.exec_command('%s %s' % (self.python, self.remote_path))
+        except Exception:
+            self.client._sessions.release()
+            raise
+        self._session = session
+        self._stdin = session.makefile('wb', -1)
+        with self._pending_lock:
+            self._pending = dict()
+        reader = threading.Thread(target=self._read, args=(session.makefile('rb', -1), self._pending),
+                                  name='condorpy-helper-%s' % (self.client.host,))
+        reader.daemon = True
+        reader.start()
+        # An empty batch checks that the helper is up (the interpreter might be missing) before it is relied on.
+        self._wait(self._send({'op': 'batch', 'requests': []}))
+
+    def _round_trip(self, request):
+        with self._lock:
+            # A helper that has exited is started again, but a request is never sent twice: if the helper exits
+            # while handling one (a submit, say) there is no knowing whether it was carried out.
+            if not self.running:
+                self._start()
+            waiter = self._send(request)
+        return self._wait(waiter)
+
+    def _send(self, request):
+        """Write a request to the helper. Called with _lock held.
+
+        Returns:
+            list: The [threading.Event, response] that is filled in when the answer comes.
+
+        """
+        request['id'] = next(self._ids)
+        waiter = [threading.Event(), None]
+        with self._pending_lock:
+            if self._pending is None:
+                # The helper stopped answering since it was found to be running.
+                waiter[0].set()
+                return waiter
+            self._pending[request['id']] = waiter
+        try:
+            self._stdin.write((json.dumps(request) + '\n').encode('utf-8'))
+            self._stdin.flush()
+        except (IOError, socket.error, SSHException):
+            self._close()
+        return waiter
+
+    def _wait(self, waiter):
+        waiter[0].wait()
+        if waiter[1] is None:
+            raise HelperExited("The helper on host '{0}' exited.".format(self.client.host))
+        return waiter[1]
+
+    def _read(self, stdout, pending):
+        """Hand each answer the helper writes to the request waiting for it, until the helper exits.
+
+        """
+        try:
+            for line in iter(stdout.readline, b''):
+                response = json.loads(line.decode('utf-8'))
+                with self._pending_lock:
+                    waiter = pending.pop(response.get('id'), None)
+                if waiter is None:
+                    log.warning('The helper on host %s answered an unknown request: %s', self.client.host, response)
+                    continue
+                waiter[1] = response
+                waiter[0].set()
+        except Exception as e:
+            log.debug('Stopped reading from the helper on host %s: %s', self.client.host, e)
+        finally:
+            # Whatever is still waiting will not be answered.
+            with self._pending_lock:
+                if self._pending is pending:
+                    self._pending = None
+                waiters = list(pending.values())
+                pending.clear()
+            for event, _ in waiters:
+                event.set()
+
+    def _close(self):
+        if self._session is not None:
+            session, self._session = self._session, None
+            try:
+                session.close()
+            finally:
+                self.client._sessions.release()
@@ -1,9 +1,38 @@
+import base64
+import codecs
+import fnmatch
+import io
+import json
 import os
+import posixpath
+import select
+import shlex
+import socket
+import tarfile
+import tempfile
 import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import paramiko
 import scp
 
+from .exceptions import RemoteError
+from .logger import log
+from .remote_helper import HelperExited, RemoteHelper
+from .retry import RetryPolicy
+from .transfer import TransferEngine
+
+
+# Seconds to wait for a command's output before checking whether it has exited.
+_POLL_INTERVAL = 0.1
+
+# Files that only ever grow, so a sync can fetch just what was added since the last one.
+APPEND_ONLY_SUFFIXES = ('.out', '.err', '.log')
+
+# The ways put and get can compress what they send (see RemoteClient).
+COMPRESSION_MODES = (None, 'ssh', 'gzip')
 
 _private_key_cache = {}
 _private_key_cache_lock = threading.Lock()
@@ -42,17 +71,80 @@ def load_private_key(filename, password=None):
         return key
 
 
+def _is_transient(error):
+    """True if an error means the connection failed rather than the command, so the command can be tried again.
+
+    """
+    if isinstance(error, (paramiko.AuthenticationException, paramiko.BadHostKeyException)):
+        return False
+    return isinstance(error, (socket.error, EOFError, paramiko.SSHException, HelperExited))
+
+
 class RemoteClient(object):
+    """An SSH connection to a remote scheduler.
+
+    Commands run as separate channels on one transport, so several can run at once (see submit_command and
+    execute_many). sshd refuses more than MaxSessions open channels per connection, so at most max_sessions - 1
+    commands run at a time, leaving a session for SFTP; other commands wait for one to finish.
+
+    With use_helper set, commands, makedirs, rmtree and query are sent instead to a RemoteHelper process that is
+    uploaded and started on first use and then stays running, so they cost no new session or login shell. If the
+    helper cannot be started (the scheduler has no python3, say), use_helper is turned off and everything runs as
+    it would without it. iter_output always runs its command on a session of its own.
+
+    Input files are copied into each job's remote directory with put, unless input_cache is set to a
+    RemoteInputCache (see condorpy.remote_cache), which uploads each distinct file to the scheduler only once.
+    put and get copy one file after another with SCP, unless parallel_transfers is set to a number of SFTP
+    channels for a TransferEngine to spread the files over; transfer_progress is then passed on as its progress
+    callback.
+
+    Transfers can be compressed, which pays off for text such as CSV files and logs on a slow link. With
+    compression='ssh' the SSH transport compresses everything sent over the connection, commands and their output
+    included; it is negotiated when the client connects, so it only applies to connections made after it is set.
+    With compression='gzip', put and get send files and directories as a single gzipped tar stream over one
+    command instead, and put and get can also choose it (or no compression) per call.
+
+    The transport sends a keepalive every keepalive seconds, so that an idle connection is not dropped by a
+    firewall or NAT while a monitor waits between polls. A dropped connection is made again on next use, and
+    connecting is retried with backoff according to retry_policy. Commands that are safe to run twice (queries such
+    as condor_q, condor_history and ls) can be run with execute(command, retry=True) to retry them the same way if
+    the connection drops while they run; other commands, condor_submit above all, are never retried, since there is
+    no knowing whether one that lost its connection was carried out.
+
+    Args:
+        max_sessions (int, optional): The scheduler's sshd MaxSessions. Defaults to 10, the sshd default.
+        use_helper (bool, optional): Whether to use a RemoteHelper. Defaults to False.
+        compression (str, optional): None, 'ssh' or 'gzip'. Defaults to None, meaning no compression.
+        keepalive (int, optional): Seconds between keepalives, or 0 to send none. Defaults to 30.
+        retry_policy (RetryPolicy, optional): How to retry connecting and idempotent commands. Defaults to
+            RetryPolicy().
+
+    """
+
     def __init__(self,
                  host,
                  username,
                  password=None,
                  private_key=None,
                  private_key_pass=None,
-                 port=22):
+                 port=22,
+                 max_sessions=10,
+                 use_helper=False,
+                 compression=None,
+                 keepalive=30,
+                 retry_policy=None):
+        # Set before anything can raise, so that close (run by __del__) finds them on a half-made client too.
+        self._transport = None
+        self._sftp = None
+        self._executor = None
+        self._helper = None
+        if compression not in COMPRESSION_MODES:
+            raise ValueError('compression must be one of %s' % (COMPRESSION_MODES,))
+        self.compression = compression
         self.host = host
         self.username = username
         self.password = password
+        self.private_key = None
         self.private_key_path = None
         self.private_key_pass = private_key_pass
         self.private_key_mtime = None
@@ -62,12 +154,25 @@ class RemoteClient(object):
             self.private_key_mtime = _key_file_mtime(private_key)
             self.private_key = load_private_key(private_key, private_key_pass)
         self.port = port
-        self._transport = None
-        self._scp = None
-        self._sftp = None
+        # A client may be shared by several jobs (see RemoteClientPool), possibly on different threads.
+        self._lock = threading.RLock()
+        self.max_sessions = max_sessions
+        self._sessions = threading.BoundedSemaphore(max(max_sessions - 1, 1))
+        self.use_helper = use_helper
+        # What the client was asked for, which matches compares: use_helper is turned off if the helper won't start.
+        self._requested_helper = use_helper
+        self.input_cache = None
+        self.parallel_transfers = None
+        self.transfer_progress = None
+        self.keepalive = keepalive
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Separate from _lock: starting the helper waits for a session, which a running command can only give
+        # back after it has taken _lock to get the transport.
+        self._helper_lock = threading.Lock()
 
-    def matches(self, host, username, password, private_key, private_key_pass, port):
-        """True if this client already targets the given connection parameters.
+    def matches(self, host, username, password, private_key, private_key_pass, port, max_sessions=10,
+                compression=None, keepalive=30, use_helper=False):
+        """True if this client already targets the given connection parameters, with the given options.
 
         The key file's mtime is part of the comparison: this client decrypted its
         key when it was built, so a rotated key file means it holds a stale one and
@@ -84,6 +189,10 @@ class RemoteClient(object):
             and self.private_key_path == key_path
             and self.private_key_pass == private_key_pass
             and self.private_key_mtime == (_key_file_mtime(key_path) if key_path else None)
+            and self.max_sessions == max_sessions
+            and self.compression == compression
+            and self.keepalive == keepalive
+            and self._requested_helper == use_helper
         )
 
     def __del__(self):
@@ -91,51 +200,329 @@ class RemoteClient(object):
 
     @property
     def transport(self):
-        if self._transport is None or not self._transport.is_active():
-            sock = (self.host, self.port)
-            self._transport = paramiko.Transport(sock)
-            self._transport.connect(username=self.username, password=self.password, pkey=self.private_key)
-        return self._transport
+        with self._lock:
+            if self._transport is None or not self._transport.is_active():
+                if self._transport is not None:
+                    log.info('The connection to %s was lost; connecting again', self.host)
+                    self._transport.close()
+                self._transport = None
+                self._transport = self.retry_policy.call(self._connect, _is_transient)
+            return self._transport
+
+    def call_with_retry(self, func):
+        """Call func, retrying it according to retry_policy for as long as it fails because the connection did.
+
+        """
+        return self.retry_policy.call(func, _is_transient)
+
+    def _connect(self):
+        transport = paramiko.Transport((self.host, self.port))
+        try:
+            if self.compression == 'ssh':
+                transport.use_compression(True)
+            transport.connect(username=self.username, password=self.password, pkey=self.private_key)
+        except Exception:
+            transport.close()
+            raise
+        if self.keepalive:
+            transport.set_keepalive(self.keepalive)
+        return transport
 
     @property
     def sftp(self):
-        if self._sftp is None or self._sftp.sock.closed:
-            self._sftp = paramiko.SFTPClient.from_transport(self.transport)
-        return self._sftp
+        with self._lock:
+            if self._sftp is None or self._sftp.sock.closed:
+                self._sftp = paramiko.SFTPClient.from_transport(self.transport)
+            return self._sftp
 
     @property
     def scp(self):
-        if self._scp is None or not self._scp.transport.is_active():
-            self._scp = scp.SCPClient(self.transport)
-        return self._scp
+        """A new SCPClient on the shared transport. SCPClients are not thread-safe, so each transfer gets its own.
+
+        """
+        return scp.SCPClient(self.transport)
+
+    @property
+    def helper(self):
+        """The running RemoteHelper, started on first use, or None if use_helper is off.
+
+        """
+        if not self.use_helper:
+            return None
+        with self._helper_lock:
+            if self._helper is None:
+                helper = RemoteHelper(self)
+                try:
+                    helper.start()
+                except (IOError, paramiko.SSHException, RuntimeError, ValueError) as e:
+                    log.warning('Could not start the condorpy helper on %s, running commands without it: %s',
+                                self.host, e)
+                    self.use_helper = False
+                    return None
+                self._helper = helper
+            return self._helper
+
+    @staticmethod
+    def _drain_bytes(session, read_size=32768):
+        """Yield a command's output as it arrives, reading stdout and stderr together.
+
+        Reading one stream to the end before the other would let a command that fills the other stream's channel
+        window stall forever.
+
+        Yields:
+            tuple: 'stdout' or 'stderr', and a chunk of bytes.
+
+        """
+        while True:
+            received = False
+            if session.recv_ready():
+                received = True
+                yield 'stdout', session.recv(read_size)
+            if session.recv_stderr_ready():
+                received = True
+                yield 'stderr', session.recv_stderr(read_size)
+            if received:
+                continue
+            # The exit status is sent after all of the output, so once it is in and nothing is left to read the
+            # output is complete.
+            if session.exit_status_ready() and not (session.recv_ready() or session.recv_stderr_ready()):
+                break
+            select.select([session], [], [], _POLL_INTERVAL)
+
+    @classmethod
+    def _drain(cls, session, read_size=32768):
+        """_drain_bytes, decoded.
+
+        Yields:
+            tuple: 'stdout' or 'stderr', and a chunk of text.
+
+        """
+        decoders = dict((name, codecs.getincrementaldecoder('utf-8')('replace')) for name in ('stdout', 'stderr'))
+        for name, data in cls._drain_bytes(session, read_size):
+            yield name, decoders[name].decode(data)
+        for name, decoder in decoders.items():
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield name, tail
+
+    def iter_output(self, command, read_size=32768):
+        """Run a command and yield its output as it arrives, rather than once the command has finished.
+
+        Yields:
+            tuple: 'stdout' or 'stderr', and a chunk of text.
+
+        Raises:
+            RuntimeError: Once the output has been read, if the command exits with a non-zero status.
+
+        """
+        with self._sessions:
+            session = self.transport.open_session()
+            try:
+                session.exec_command(command)
+                stderr = []
+                for name, text in self._drain(session, read_size):
+                    if name == 'stderr':
+                        stderr.append(text)
+                    yield name, text
+                exit_status = session.recv_exit_status()
+                if exit_status != 0:
+                    msg = "The command '{0}' failed on host '{1}':\n{2}".format(command, self.host, ''.join(stderr))
+                    raise RuntimeError(msg)
+            finally:
+                session.close()
 
-    def _get_output(self, session):
-        stdout = session.makefile('r', -1)
-        stdout = '\n'.join([line for line in stdout.readlines()])
-        stderr = session.makefile_stderr('r', -1)
-        stderr = '\n'.join([line for line in stderr.readlines()])
+    def iter_lines(self, command):
+        """Run a command and yield each line of its output as soon as the line is complete.
 
+        Yields:
+            tuple: 'stdout' or 'stderr', and a line (with its line ending).
+
+        """
+        partial = dict(stdout='', stderr='')
+        for name, text in self.iter_output(command):
+            lines = (partial[name] + text).splitlines(True)
+            partial[name] = lines.pop() if lines and not lines[-1].endswith(('\n', '\r')) else ''
+            for line in lines:
+                yield name, line
+        for name, line in partial.items():
+            if line:
+                yield name, line
+
+    def _helper_output(self, command, result):
+        # Same form as execute's output without the helper.
+        stdout = '\n'.join(result['stdout'].splitlines(True))
+        stderr = '\n'.join(result['stderr'].splitlines(True))
+        if result['exit_status'] != 0:
+            msg = "The command '{0}' failed on host '{1}':\n{2}\n{3}".format(command, self.host, stdout, stderr)
+            raise RuntimeError(msg)
         return stdout, stderr
 
-    def execute(self, command):
-        session = None
+    @staticmethod
+    def _send_stdin(session, data):
         try:
-            session = self.transport.open_session()
-            session.exec_command(command)
-            stdout, stderr = self._get_output(session)
-            exit_status = session.recv_exit_status()
-            if exit_status != 0:
-                msg = "The command '{0}' failed on host '{1}':\n{2}\n{3}".format(command, self.host, stdout, stderr)
-                raise RuntimeError(msg)
-        finally:
-            session and session.close()
+            if hasattr(data, 'read'):
+                for block in iter(lambda: data.read(32768), b''):
+                    session.sendall(block)
+            else:
+                session.sendall(data)
+            session.shutdown_write()
+        except (socket.error, paramiko.SSHException):
+            # The command has exited or the connection dropped; either shows up as the command's failure.
+            pass
+
+    def execute(self, command, stdin=None, retry=False):
+        """Run a command and wait for it to finish.
+
+        Args:
+            command (str): The command.
+            stdin (bytes or file, optional): Data, or a binary file to read it from, to send to the command's stdin,
+                which is then closed. Defaults to None, meaning nothing is sent.
+            retry (bool, optional): Whether the command is safe to run again if the connection fails while it runs,
+                in which case it is retried according to retry_policy. Defaults to False.
+
+        Returns:
+            tuple: The command's stdout and stderr (str).
+
+        Raises:
+            RuntimeError: If the command exits with a non-zero status.
+
+        """
+        if not retry:
+            return self._execute_once(command, stdin)
+        if hasattr(stdin, 'read'):
+            # A file can only be read once.
+            stdin = stdin.read()
+        return self.call_with_retry(lambda: self._execute_once(command, stdin))
+
+    def _execute_once(self, command, stdin=None):
+        helper = self.helper
+        if helper is not None:
+            params = dict(command=command)
+            if stdin is not None:
+                data = stdin.read() if hasattr(stdin, 'read') else stdin
+                params['stdin'] = base64.b64encode(data).decode('ascii')
+            return self._helper_output(command, helper.request('execute', **params))
+
+        session = None
+        stdout = []
+        stderr = []
+        with self._sessions:
+            try:
+                session = self.transport.open_session()
+                session.exec_command(command)
+                if stdin is not None:
+                    # Sent from another thread so that output filling the channel window cannot stall the send.
+                    sender = threading.Thread(target=self._send_stdin, args=(session, stdin))
+                    sender.daemon = True
+                    sender.start()
+                for name, text in self._drain(session):
+                    (stdout if name == 'stdout' else stderr).append(text)
+                # Same form as joining the output's readlines() with newlines.
+                stdout = '\n'.join(''.join(stdout).splitlines(True))
+                stderr = '\n'.join(''.join(stderr).splitlines(True))
+                exit_status = session.recv_exit_status()
+                if exit_status != 0:
+                    msg = "The command '{0}' failed on host '{1}':\n{2}\n{3}".format(command, self.host, stdout,
+                                                                                   stderr)
+                    raise RuntimeError(msg)
+            finally:
+                session and session.close()
 
         return stdout, stderr
 
+    def _execute_to_file(self, command, out_file):
+        """Run a command on a session of its own (never the helper), writing its stdout to a binary file as it
+        arrives.
+
+        Raises:
+            RuntimeError: If the command exits with a non-zero status.
+
+        """
+        with self._sessions:
+            session = self.transport.open_session()
+            try:
+                session.exec_command(command)
+                stderr = []
+                for name, data in self._drain_bytes(session):
+                    if name == 'stdout':
+                        out_file.write(data)
+                    else:
+                        stderr.append(data)
+                if session.recv_exit_status() != 0:
+                    msg = "The command '{0}' failed on host '{1}':\n{2}".format(
+                        command, self.host, b''.join(stderr).decode('utf-8', 'replace'))
+                    raise RuntimeError(msg)
+            finally:
+                session.close()
+
+    def submit_command(self, command, retry=False):
+        """Start running a command on its own channel and return without waiting for it.
+
+        Args:
+            command (str): The command.
+            retry (bool, optional): Whether the command may be retried, as with execute. Defaults to False.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the stdout and stderr that execute would return, or raises its
+            error.
+
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(self.max_sessions - 1, 1))
+            return self._executor.submit(self.execute, command, retry=retry)
+
+    def execute_many(self, commands, retry=False):
+        """Run several commands concurrently, each on its own channel of the one transport.
+
+        Args:
+            commands (list of str): The commands.
+            retry (bool, optional): Whether the commands may be retried, as with execute. Defaults to False.
+
+        Returns:
+            list: The stdout and stderr of each command, in the order given.
+
+        Raises:
+            RuntimeError: For the first command (in the order given) that failed, once all of them have finished.
+
+        """
+        helper = self.helper
+        if helper is not None:
+            # One round trip for all of them.
+            results = []
+            errors = []
+            requests = [('execute', dict(command=command)) for command in commands]
+            if retry:
+                responses = self.call_with_retry(lambda: helper.batch(requests))
+            else:
+                responses = helper.batch(requests)
+            for command, response in zip(commands, responses):
+                try:
+                    if not response['ok']:
+                        raise RuntimeError("The command '{0}' failed on host '{1}':\n{2}".format(
+                            command, self.host, response['error']))
+                    results.append(self._helper_output(command, response['result']))
+                except RuntimeError as e:
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+            return results
+
+        futures = [self.submit_command(command, retry=retry) for command in commands]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [future.result() for future in futures]
+
     def remote_file(self, remote_file_path, mode='w'):
         return self.sftp.open(remote_file_path, mode)
 
     def makedirs(self, remote_path):
+        helper = self.helper
+        if helper is not None:
+            helper.request('makedirs', path=remote_path)
+            return
         try:
             self.sftp.stat(remote_path)
         except IOError:
@@ -145,19 +532,481 @@ class RemoteClient(object):
             if basename:
                 self.sftp.mkdir(remote_path)
 
-    def put(self, local_paths, remote_path):
-        self.scp.put(files=local_paths,
-                     remote_path=remote_path,
-                     recursive=True)
+    def rmtree(self, remote_path):
+        """Remove a remote directory and everything in it, if it exists.
+
+        """
+        helper = self.helper
+        if helper is not None:
+            helper.request('rmtree', path=remote_path)
+        else:
+            self.execute('rm -rf %s' % (shlex.quote(remote_path),))
+
+    def query(self, constraint, attributes=None, history=True):
+        """The job ads that match a ClassAd constraint.
+
+        Args:
+            constraint (str): The constraint, e.g. 'ClusterId == 5'.
+            attributes (list of str, optional): The attributes to include in each ad. Defaults to all of them.
+            history (bool, optional): Whether to include jobs that have left the queue. Defaults to True.
+
+        Returns:
+            list of dict: The ads from condor_q, followed by those from condor_history.
+
+        Raises:
+            RuntimeError: If condor_q or condor_history fails.
+
+        """
+        helper = self.helper
+        if helper is not None:
+            return self.call_with_retry(
+                lambda: helper.request('query', constraint=constraint, attributes=attributes, history=history))
+
+        ads = []
+        for tool in ['condor_q', 'condor_history'] if history else ['condor_q']:
+            command = '%s -constraint %s -json' % (tool, shlex.quote(constraint))
+            if attributes:
+                command += ' -attributes %s' % (','.join(attributes),)
+            stdout, stderr = self.execute(command, retry=True)
+            if stdout.strip():
+                ads.extend(json.loads(stdout))
+        return ads
+
+    def list_files(self, remote_dir):
+        """List every file under a remote directory, with one command (it uses GNU find's -printf).
+
+        Returns:
+            dict: path relative to remote_dir (str) -> (size (int), mtime (float))
+
+        """
+        out, err = self.execute("find %s -type f -printf '%%s %%T@ %%P\\0'" % (shlex.quote(remote_dir),), retry=True)
+        files = dict()
+        for record in out.split('\0'):
+            if record.strip():
+                size, mtime, path = record.split(' ', 2)
+                files[path] = (int(size), float(mtime))
+        return files
+
+    def sync(self, remote_dir, local_dir, manifest_path, include=None, exclude=None,
+             append_suffixes=APPEND_ONLY_SUFFIXES):
+        """Fetch the files under a remote directory that are new or have changed since the last sync.
+
+        The size and mtime of each fetched file are kept in a local manifest. A file is fetched again when either
+        has changed on the scheduler or the local copy is gone or has a different size. A file ending in one of
+        append_suffixes that has grown is assumed to have only been appended to, and just the new bytes are fetched.
 
-    def get(self, remote_paths, local_path='.'):
-        self.scp.get(remote_paths,
-                     local_path,
-                     recursive=True)
+        Args:
+            remote_dir (str): The remote directory.
+            local_dir (str): The local directory to sync into.
+            manifest_path (str): The local manifest file.
+            include (list of str, optional): fnmatch patterns, matched against each file's path relative to
+                remote_dir and against its name. Only matching files are synced. Defaults to None, meaning all files.
+            exclude (list of str, optional): Patterns of files not to sync. Defaults to None.
+            append_suffixes (tuple of str, optional): Suffixes of files that only grow. Defaults to
+                APPEND_ONLY_SUFFIXES.
+
+        Returns:
+            list of str: The relative paths of the files fetched.
+
+        """
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (IOError, ValueError):
+            manifest = dict()
+
+        fetched = []
+        remote_files = self.list_files(remote_dir)
+        for path, (size, mtime) in sorted(remote_files.items()):
+            if (include and not _matches(path, include)) or (exclude and _matches(path, exclude)):
+                continue
+            local_path = os.path.join(local_dir, *path.split('/'))
+            local_size = os.path.getsize(local_path) if os.path.isfile(local_path) else None
+            known_size, known_mtime = manifest.get(path, (None, None))
+            if (known_size, known_mtime, local_size) == (size, mtime, size):
+                continue
+
+            remote_path = posixpath.join(remote_dir, path)
+            if path.endswith(tuple(append_suffixes)) and local_size is not None and local_size == known_size \
+                    and local_size < size:
+                self._fetch_tail(remote_path, local_path, local_size)
+            else:
+                self._fetch(remote_path, local_path)
+            # The size fetched, which is more than was listed if the file grew in the meantime.
+            manifest[path] = (os.path.getsize(local_path), mtime)
+            fetched.append(path)
+
+        manifest = dict((path, entry) for path, entry in manifest.items() if path in remote_files)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        return fetched
+
+    def _fetch(self, remote_path, local_path):
+        directory = os.path.dirname(local_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        partial = local_path + '.part'
+        self.sftp.get(remote_path, partial)
+        os.replace(partial, local_path)
+
+    def _fetch_tail(self, remote_path, local_path, offset):
+        with self.sftp.open(remote_path, 'rb') as remote_file:
+            remote_file.seek(offset)
+            with open(local_path, 'ab') as local_file:
+                for block in iter(lambda: remote_file.read(32768), b''):
+                    local_file.write(block)
+
+    def _transfer_engine(self, parallel):
+        parallel = self.parallel_transfers if parallel is None else parallel
+        if parallel:
+            return TransferEngine(self, parallel, self.transfer_progress)
+        return None
+
+    def _gzip(self, compression):
+        """Whether a transfer with the given per-call compression is sent as a gzipped tar stream.
+
+        """
+        if compression is None:
+            compression = self.compression
+        if compression == 'ssh' and self.compression != 'ssh':
+            raise ValueError('SSH compression is negotiated when the client connects, so it can only be set on '
+                             'the client.')
+        if compression not in COMPRESSION_MODES + (False,):
+            raise ValueError('compression must be one of %s' % (COMPRESSION_MODES + (False,),))
+        return compression == 'gzip'
+
+    def put(self, local_paths, remote_path, parallel=None, compression=None):
+        """Copy local files and directories into a remote directory.
+
+        Args:
+            parallel (int, optional): The number of SFTP channels to copy over. Defaults to None, meaning
+                parallel_transfers. 0 copies with SCP.
+            compression (str, optional): 'gzip' to send a gzipped tar stream, or False for no compression of the
+                transfer itself. Defaults to None, meaning the client's compression.
+
+        """
+        if self._gzip(compression):
+            self._put_gzip(local_paths, remote_path)
+            return
+        engine = self._transfer_engine(parallel)
+        if engine:
+            engine.put(local_paths, remote_path)
+            return
+        with self._sessions:
+            self.scp.put(files=local_paths,
+                         remote_path=remote_path,
+                         recursive=True)
+
+    def get(self, remote_paths, local_path='.', parallel=None, compression=None):
+        """Copy remote files and directories into a local directory.
+
+        Args:
+            parallel (int, optional): The number of SFTP channels to copy over. Defaults to None, meaning
+                parallel_transfers. 0 copies with SCP.
+            compression (str, optional): 'gzip' to receive a gzipped tar stream, or False for no compression of the
+                transfer itself. Defaults to None, meaning the client's compression.
+
+        """
+        if self._gzip(compression):
+            self._get_gzip(remote_paths, local_path)
+            return
+        engine = self._transfer_engine(parallel)
+        if engine:
+            engine.get(remote_paths, local_path)
+            return
+        with self._sessions:
+            self.scp.get(remote_paths,
+                         local_path,
+                         recursive=True)
+
+    def _put_gzip(self, local_paths, remote_path):
+        if isinstance(local_paths, str):
+            local_paths = [local_paths]
+        # Spooled to a temporary file rather than held in memory, since inputs can be large.
+        with tempfile.TemporaryFile() as archive:
+            with tarfile.open(fileobj=archive, mode='w:gz', compresslevel=6) as tar:
+                for local_path in local_paths:
+                    tar.add(local_path, arcname=os.path.basename(local_path.rstrip(os.sep)))
+            log.info('Sending %d compressed bytes to %s:%s', archive.tell(), self.host, remote_path)
+            archive.seek(0)
+            remote_path = shlex.quote(remote_path)
+            self.execute('mkdir -p {0} && tar -xzf - -C {0}'.format(remote_path), stdin=archive)
+
+    def _get_gzip(self, remote_paths, local_path='.'):
+        if isinstance(remote_paths, str):
+            remote_paths = [remote_paths]
+        if not os.path.isdir(local_path):
+            os.makedirs(local_path)
+        for remote_path in remote_paths:
+            # 'dir/.' is archived as '.', so its contents land in local_path itself, as with scp.
+            parent, name = posixpath.split(remote_path.rstrip('/'))
+            command = 'tar -czf - -C %s %s' % (shlex.quote(parent or '.'), shlex.quote(name))
+            with tempfile.TemporaryFile() as archive:
+                self._execute_to_file(command, archive)
+                log.info('Received %d compressed bytes from %s:%s', archive.tell(), self.host, remote_path)
+                archive.seek(0)
+                with tarfile.open(fileobj=archive, mode='r:gz') as tar:
+                    if hasattr(tarfile, 'data_filter'):
+                        # Refuse absolute paths, links out of local_path and the like from the scheduler.
+                        tar.extractall(local_path, filter='data')
+                    else:
+                        tar.extractall(local_path)
 
     def close(self):
+        if self._helper is not None:
+            self._helper.close()
+            self._helper = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
         if self._sftp is not None:
             self._sftp.close()
         if self._transport is not None:
             self._transport.close()
 
+
+def _matches(path, patterns):
+    name = posixpath.basename(path)
+    return any(fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+class _BundleFile(object):
+    """A file opened for writing in a SubmitBundle. It is added to the bundle when it is closed.
+
+    """
+
+    def __init__(self, bundle, path, binary=False):
+        self._bundle = bundle
+        self._path = path
+        self._buffer = io.BytesIO() if binary else io.StringIO()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def close(self):
+        data = self._buffer.getvalue()
+        self._bundle.add_file(self._path, data.encode('utf-8') if isinstance(data, str) else data)
+
+
+class SubmitBundle(object):
+    """Stands in for a RemoteClient while a submit is prepared, packing what would be sent into one tar archive.
+
+    The files written through remote_file, the directories made with makedirs and the local files copied with put
+    are added to the archive instead of each costing an SFTP or SCP round trip. The archive is then sent as the
+    stdin of a single command that unpacks it and runs condor_submit (see HTCondorObjectBase._submit_bundle).
+    Paths in the archive are relative to the remote home directory, as remote paths are. Everything else is passed
+    on to the client.
+
+    Args:
+        client (RemoteClient): The client the bundle stands in for.
+
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._buffer = io.BytesIO()
+        self._tar = tarfile.open(fileobj=self._buffer, mode='w')
+        self._dirs = set()
+        self._mtime = int(time.time())
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _tar_info(self, path, type=tarfile.REGTYPE, mode=0o644, size=0):
+        info = tarfile.TarInfo(path)
+        info.type = type
+        info.mode = mode
+        info.size = size
+        info.mtime = self._mtime
+        return info
+
+    def makedirs(self, remote_path):
+        path = ''
+        for part in posixpath.normpath(remote_path).split('/'):
+            path = posixpath.join(path, part)
+            if part in ('', '.') or path in self._dirs:
+                continue
+            self._dirs.add(path)
+            self._tar.addfile(self._tar_info(path, tarfile.DIRTYPE, 0o755))
+
+    def remote_file(self, remote_file_path, mode='w'):
+        if 'r' in mode:
+            return self.client.remote_file(remote_file_path, mode)
+        return _BundleFile(self, remote_file_path, binary='b' in mode)
+
+    def add_file(self, remote_path, data):
+        """Add a file with the given contents (bytes).
+
+        """
+        remote_path = posixpath.normpath(remote_path)
+        self.makedirs(posixpath.dirname(remote_path))
+        self._tar.addfile(self._tar_info(remote_path, size=len(data)), io.BytesIO(data))
+
+    def put(self, local_paths, remote_path):
+        if isinstance(local_paths, str):
+            local_paths = [local_paths]
+        self.makedirs(remote_path)
+        for local_path in local_paths:
+            arcname = posixpath.join(posixpath.normpath(remote_path), os.path.basename(local_path.rstrip(os.sep)))
+            self._tar.add(local_path, arcname=arcname, recursive=True)
+
+    def getvalue(self):
+        """Finish the archive and return it.
+
+        Returns:
+            bytes: The tar archive.
+
+        """
+        if not self._tar.closed:
+            self._tar.close()
+        return self._buffer.getvalue()
+
+
+class RemoteClientPool(object):
+    """Shares one RemoteClient, and so one SSH transport, between every job and workflow that targets a scheduler.
+
+    Clients are keyed by host, port, username and credentials, including the private key file's path and mtime,
+    so a rotated key gets a new client just as RemoteClient.matches requires. Their options (max_sessions,
+    compression, keepalive and use_helper) are part of the key too, so objects that ask for different ones get different
+    clients. Each acquire must be paired with a
+    release. A client nobody holds is kept open for idle_timeout seconds so that it can be picked up again
+    without a new handshake, and is closed after that (or sooner, to make room under max_connections).
+
+    Args:
+        max_connections (int, optional): Most clients kept at once. Defaults to None, meaning no limit.
+        idle_timeout (float, optional): Seconds a client nobody holds stays open. Defaults to 300. None keeps idle
+            clients open until they are evicted or the pool is cleared.
+
+    """
+
+    def __init__(self, max_connections=None, idle_timeout=300):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        # key -> [client, reference count, time the count dropped to zero]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(host, username, password, private_key, private_key_pass, port, *options):
+        key_path = os.path.expanduser(private_key) if private_key else None
+        return (host, port, username, password, key_path, private_key_pass,
+                _key_file_mtime(key_path) if key_path else None) + options
+
+    def acquire(self, host, username, password=None, private_key=None, private_key_pass=None, port=22,
+                max_sessions=10, compression=None, keepalive=30, use_helper=False):
+        """Get the shared client for a scheduler, connecting a new one if there is none.
+
+        The arguments are those of RemoteClient.
+
+        Raises:
+            RemoteError: If the pool already holds max_connections clients and none of them is idle.
+
+        """
+        key = self._key(host, username, password, private_key, private_key_pass, port, max_sessions, compression,
+                        keepalive, use_helper)
+        with self._lock:
+            to_close = self._pop_idle(expired_only=True)
+            entry = self._entries.get(key)
+            if entry is None:
+                if self.max_connections and len(self._entries) >= self.max_connections:
+                    to_close.extend(self._pop_idle(limit=len(self._entries) - self.max_connections + 1))
+                    if len(self._entries) >= self.max_connections:
+                        raise RemoteError('All %d pooled connections are in use.' % (self.max_connections,))
+                client = RemoteClient(host, username, password, private_key, private_key_pass, port=port,
+                                      max_sessions=max_sessions, compression=compression, keepalive=keepalive,
+                                      use_helper=use_helper)
+                entry = self._entries[key] = [client, 0, None]
+            self._entries.move_to_end(key)
+            entry[1] += 1
+            entry[2] = None
+        self._close(to_close)
+        return entry[0]
+
+    def retain(self, client):
+        """Take another reference to a client got from acquire, for another object that is to share it.
+
+        Each retain must be paired with a release, as an acquire is. A client the pool does not hold is not counted.
+
+        Returns:
+            bool: True if the reference was counted, and so must be released.
+        """
+        with self._lock:
+            for entry in self._entries.values():
+                if entry[0] is client:
+                    entry[1] += 1
+                    entry[2] = None
+                    return True
+        return False
+
+    def release(self, client):
+        """Give back a client got from acquire. A client the pool does not hold is closed.
+
+        """
+        with self._lock:
+            for entry in self._entries.values():
+                if entry[0] is client:
+                    if entry[1] == 0:
+                        # More releases than acquires: something shared the client without retaining it, and may
+                        # still be using it.
+                        log.error('Client for %s@%s was released more times than it was acquired.', client.username,
+                                  client.host)
+                    entry[1] = max(entry[1] - 1, 0)
+                    if entry[1] == 0:
+                        entry[2] = time.monotonic()
+                    to_close = self._pop_idle(expired_only=True)
+                    break
+            else:
+                to_close = [client]
+        self._close(to_close)
+
+    def evict_idle(self):
+        """Close the idle clients that have outlived idle_timeout.
+
+        """
+        with self._lock:
+            to_close = self._pop_idle(expired_only=True)
+        self._close(to_close)
+
+    def clear(self):
+        """Close every client, held or not, and empty the pool.
+
+        """
+        with self._lock:
+            to_close = [entry[0] for entry in self._entries.values()]
+            self._entries.clear()
+        self._close(to_close)
+
+    def _pop_idle(self, expired_only=False, limit=None):
+        """Remove idle clients, least recently used first, and return them to be closed outside the lock.
+
+        """
+        now = time.monotonic()
+        popped = []
+        for key, entry in list(self._entries.items()):
+            if limit is not None and len(popped) >= limit:
+                break
+            if entry[1]:
+                continue
+            if expired_only and (self.idle_timeout is None or now - entry[2] < self.idle_timeout):
+                continue
+            popped.append(self._entries.pop(key)[0])
+        return popped
+
+    @staticmethod
+    def _close(clients):
+        for client in clients:
+            client.close()
+
+
+# The pool every job and workflow acquires its RemoteClient from.
+client_pool = RemoteClientPool()
+
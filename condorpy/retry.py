@@ -0,0 +1,84 @@
+# Copyright (c) 2015 Scott Christensen
+#
+# This file is part of condorpy
+#
+# condorpy is free software: you can redistribute it and/or modify it under
+# the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
+# should have been distributed with this file.
+
+import random
+import time
+
+from .logger import log
+
+
+class RetryPolicy(object):
+    """How often, and how long apart, to try an operation that can fail for a while (a dropped connection, say).
+
+    The delay before each retry grows exponentially from initial_delay up to max_delay, and is cut by a random part
+    of up to jitter of it, so that many clients that lost the same link do not all come back at the same moment.
+
+    Args:
+        max_attempts (int, optional): The number of tries, the first one included. Defaults to 5.
+        initial_delay (float, optional): Seconds to wait before the first retry. Defaults to 0.5.
+        max_delay (float, optional): The longest wait between tries, in seconds. Defaults to 30.
+        multiplier (float, optional): How much the delay grows after each retry. Defaults to 2.
+        jitter (float, optional): The largest part of each delay (0 to 1) that is taken off at random.
+            Defaults to 0.5.
+
+    Example:
+        >>> policy = RetryPolicy(max_attempts=3)
+        >>> policy.call(lambda: client.execute('condor_q'), retry_if=lambda e: isinstance(e, socket.error))
+
+    """
+
+    def __init__(self, max_attempts=5, initial_delay=0.5, max_delay=30, multiplier=2, jitter=0.5):
+        self.max_attempts = max(int(max_attempts), 1)
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def __repr__(self):
+        return '<RetryPolicy: %d attempts, %.1f-%.1f s>' % (self.max_attempts, self.initial_delay, self.max_delay)
+
+    def delays(self):
+        """The delay before each retry, in seconds.
+
+        Yields:
+            float: max_attempts - 1 delays.
+
+        """
+        for n in range(self.max_attempts - 1):
+            delay = min(self.max_delay, self.initial_delay * self.multiplier ** n)
+            yield delay * (1 - self.jitter * random.random())
+
+    def call(self, func, retry_if, on_retry=None, sleep=time.sleep):
+        """Call func until it returns, raises an error that retry_if rejects, or runs out of attempts.
+
+        Args:
+            func (callable): Called with no arguments.
+            retry_if (callable): Called with each error func raises; returns whether to try again.
+            on_retry (callable, optional): Called with the error before each retry, to clean up after it.
+                Defaults to None.
+            sleep (callable, optional): Waits the given number of seconds. Defaults to time.sleep.
+
+        Returns:
+            What func returns.
+
+        Raises:
+            The last error func raised, if it is not retried.
+
+        """
+        delays = self.delays()
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                delay = next(delays, None) if retry_if(e) else None
+                if delay is None:
+                    raise
+                log.warning('%s: %s; trying again in %.1f seconds', type(e).__name__, e, delay)
+                if on_retry is not None:
+                    on_retry(e)
+                sleep(delay)
@@ -14,3 +14,16 @@ CONDOR_JOB_STATUSES = {0: 'Unexpanded',
                        4: 'Completed',
                        5: 'Held',
                        6: 'Submission_err'}
+
+# The job status each user log event moves a proc into. Events that do not change a proc's status (image size
+# updates, file transfers, DAG script terminations, etc.) are left out.
+USER_LOG_EVENT_STATUSES = {0: 'Idle',          # Submit
+                           1: 'Running',       # Execute
+                           4: 'Idle',          # Job evicted
+                           5: 'Completed',     # Job terminated
+                           7: 'Idle',          # Shadow exception
+                           9: 'Removed',       # Job aborted
+                           12: 'Held',         # Job held
+                           13: 'Idle',         # Job released
+                           14: 'Running',      # Parallel node executed
+                           24: 'Idle'}         # Reconnect failed
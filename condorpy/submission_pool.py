@@ -0,0 +1,187 @@
+# Copyright (c) 2015 Scott Christensen
+#
+# This file is part of condorpy
+#
+# condorpy is free software: you can redistribute it and/or modify it under
+# the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
+# should have been distributed with this file.
+
+import collections
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .logger import log
+
+
+class _RateLimiter(object):
+    """Spaces calls at least 1/rate seconds apart.
+
+    """
+
+    def __init__(self, rate):
+        self._interval = 1.0 / rate
+        self._next = 0.0
+
+    def delay(self):
+        """Seconds until the next call may start.
+
+        """
+        return max(self._next - time.monotonic(), 0.0)
+
+    def take(self):
+        """Book a call starting now.
+
+        """
+        self._next = max(time.monotonic(), self._next) + self._interval
+
+
+class _HostQueue(object):
+    """The submits waiting on one scheduler's limits, and how many of its submits are running.
+
+    """
+
+    def __init__(self, max_running, max_rate):
+        self.pending = collections.deque()
+        self.running = 0
+        self.max_running = max_running
+        self.rate_limiter = _RateLimiter(max_rate) if max_rate else None
+        self.timer = None
+
+    def full(self):
+        return bool(self.max_running) and self.running >= self.max_running
+
+
+class SubmissionPool(object):
+    """Submits independent jobs and workflows in parallel on a pool of threads.
+
+    Each submit writes the submit description file, uploads input files to a remote scheduler and runs
+    condor_submit on one of the pool's threads, so a batch is not limited to one SSH round trip after another.
+    Objects are grouped by the scheduler they submit to (every local object shares one group), and each group can
+    be limited to a number of concurrent submits and a number of submits started per second so that a single
+    schedd is not overwhelmed. Submits held back by those limits wait in their group's queue rather than on a
+    thread, so a throttled scheduler never keeps the others' submits from running.
+
+    Args:
+        max_workers (int, optional): The number of threads. Defaults to 8.
+        max_per_host (int, optional): Most submits run at once against one scheduler. Defaults to None, meaning
+            only max_workers limits them.
+        max_rate (float, optional): Most submits started per second against one scheduler. Defaults to None,
+            meaning no limit.
+
+    Example:
+        >>> with SubmissionPool(max_per_host=4, max_rate=10) as pool:
+        ...     futures = [pool.submit(job) for job in jobs]
+        >>> cluster_ids = [future.result() for future in futures]
+
+    """
+
+    def __init__(self, max_workers=8, max_per_host=None, max_rate=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._max_per_host = max_per_host
+        self._max_rate = max_rate
+        self._hosts = dict()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._shutdown = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def submit(self, obj, *args, **kwargs):
+        """Submit a job or workflow on the pool.
+
+        Args:
+            obj (Job or Workflow): The object to submit. Any other args are passed on to its submit method.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the new cluster id, or raises the error the submit raised.
+
+        """
+        future = Future()
+        key = obj._scheduler_key()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot submit to a SubmissionPool after shutdown')
+            if key not in self._hosts:
+                self._hosts[key] = _HostQueue(self._max_per_host, self._max_rate)
+            host = self._hosts[key]
+            host.pending.append((future, obj, args, kwargs))
+            self._dispatch(host)
+        return future
+
+    def map(self, objs, *args, **kwargs):
+        """Submit several jobs or workflows on the pool.
+
+        Returns:
+            list: A future (see submit) for each object, in the order given.
+
+        """
+        return [self.submit(obj, *args, **kwargs) for obj in objs]
+
+    def shutdown(self, wait=True):
+        """Stop accepting submits and, if wait is True, wait for the pending ones to finish.
+
+        """
+        with self._lock:
+            self._shutdown = True
+            if wait:
+                while self._busy():
+                    self._idle.wait()
+            elif self._busy():
+                # The last submit to finish shuts the executor down; queued submits still need it until then.
+                return
+        self._executor.shutdown(wait=wait)
+
+    def _busy(self):
+        return any(host.pending or host.running for host in self._hosts.values())
+
+    def _dispatch(self, host):
+        # Called with _lock held. Only submits the host's limits allow are handed to the executor.
+        while host.pending and not host.full():
+            future = host.pending[0][0]
+            if future.cancelled():
+                host.pending.popleft()
+                continue
+            if host.rate_limiter:
+                delay = host.rate_limiter.delay()
+                if delay:
+                    if host.timer is None:
+                        host.timer = threading.Timer(delay, self._resume, (host,))
+                        host.timer.daemon = True
+                        host.timer.start()
+                    return
+                host.rate_limiter.take()
+            future, obj, args, kwargs = host.pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            host.running += 1
+            self._executor.submit(self._run, host, future, obj, args, kwargs)
+        self._notify_if_idle()
+
+    def _resume(self, host):
+        with self._lock:
+            host.timer = None
+            self._dispatch(host)
+
+    def _notify_if_idle(self):
+        if not self._busy():
+            self._idle.notify_all()
+            if self._shutdown:
+                self._executor.shutdown(wait=False)
+
+    def _run(self, host, future, obj, args, kwargs):
+        try:
+            log.info('Submitting %s from the submission pool', obj)
+            result = obj.submit(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                host.running -= 1
+                self._dispatch(host)
@@ -0,0 +1,197 @@
+# Copyright (c) 2015 Scott Christensen
+#
+# This file is part of condorpy
+#
+# condorpy is free software: you can redistribute it and/or modify it under
+# the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
+# should have been distributed with this file.
+
+import collections
+import os
+import posixpath
+import shlex
+import stat
+import threading
+import time
+
+import paramiko
+
+from .logger import log
+
+
+class TransferStats(object):
+    """The progress of a transfer, as passed to a TransferEngine's progress callback.
+
+    """
+
+    def __init__(self, files_total, bytes_total):
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.files_done = 0
+        self.bytes_done = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    def __repr__(self):
+        return '<TransferStats: %d/%d files, %d/%d bytes, %.0f bytes/s>' % (
+            self.files_done, self.files_total, self.bytes_done, self.bytes_total, self.throughput)
+
+    @property
+    def elapsed(self):
+        """Seconds since the transfer started, or that it took once it has finished.
+
+        """
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self):
+        """Bytes transferred per second so far.
+
+        """
+        elapsed = self.elapsed
+        return self.bytes_done / elapsed if elapsed else 0.0
+
+
+class TransferEngine(object):
+    """Copies many files to or from a remote scheduler over several SFTP channels at once.
+
+    A single channel spends most of a high-latency link waiting for acknowledgements, so files are spread over
+    parallelism SFTP channels of the client's transport, biggest first. Each file is written with pipelined SFTP
+    writes and read with prefetched reads, so a big file keeps its channel busy too. Each channel holds one of the
+    client's sessions while the transfer runs.
+
+    Args:
+        client (RemoteClient): The connection to transfer over.
+        parallelism (int, optional): The number of SFTP channels. Defaults to 4.
+        progress (callable, optional): Called with the TransferStats each time a block or a file is done. It is
+            called from the transfer threads, one call at a time, and should return quickly. Defaults to None.
+
+    Example:
+        >>> engine = TransferEngine(client, parallelism=8, progress=lambda stats: print(stats))
+        >>> engine.put(['inputs/', 'model.bin'], job_dir)
+        <TransferStats: 120/120 files, 524288000/524288000 bytes, 31457280 bytes/s>
+
+    """
+
+    def __init__(self, client, parallelism=4, progress=None):
+        self.client = client
+        self.parallelism = max(int(parallelism), 1)
+        self.progress = progress
+
+    def put(self, local_paths, remote_path):
+        """Copy local files and directories (recursively) into a remote directory, as RemoteClient.put does.
+
+        Returns:
+            TransferStats: The finished transfer.
+
+        """
+        if isinstance(local_paths, str):
+            local_paths = [local_paths]
+        transfers = []
+        dirs = set([remote_path])
+        for local_path in local_paths:
+            local_path = local_path.rstrip(os.sep)
+            target = posixpath.join(remote_path, os.path.basename(local_path))
+            if not os.path.isdir(local_path):
+                transfers.append((local_path, target, os.path.getsize(local_path)))
+                continue
+            for root, dir_names, file_names in os.walk(local_path):
+                relative = os.path.relpath(root, local_path)
+                remote_root = posixpath.normpath(posixpath.join(target, *relative.split(os.sep)))
+                dirs.add(remote_root)
+                for name in file_names:
+                    path = os.path.join(root, name)
+                    transfers.append((path, posixpath.join(remote_root, name), os.path.getsize(path)))
+        self.client.execute('mkdir -p %s' % (' '.join(shlex.quote(d) for d in sorted(dirs)),))
+
+        return self._run(transfers, lambda sftp, src, dst, callback: sftp.put(src, dst, callback=callback))
+
+    def get(self, remote_paths, local_path='.'):
+        """Copy remote files and directories (recursively) into a local directory, as RemoteClient.get does.
+
+        A remote directory given as 'dir/.' has its contents copied into local_path itself.
+
+        Returns:
+            TransferStats: The finished transfer.
+
+        """
+        if isinstance(remote_paths, str):
+            remote_paths = [remote_paths]
+        transfers = []
+        for remote_path in remote_paths:
+            name = posixpath.basename(remote_path.rstrip('/'))
+            attributes = self.client.sftp.stat(remote_path)
+            if not stat.S_ISDIR(attributes.st_mode):
+                target = os.path.join(local_path, name) if os.path.isdir(local_path) else local_path
+                transfers.append((remote_path, target, attributes.st_size))
+                continue
+            target = local_path if name in ('', '.') else os.path.join(local_path, name)
+            for path, (size, mtime) in self.client.list_files(remote_path).items():
+                transfers.append((posixpath.join(remote_path, path), os.path.join(target, *path.split('/')), size))
+        for local_dir in set(os.path.dirname(dst) for src, dst, size in transfers):
+            if local_dir and not os.path.isdir(local_dir):
+                os.makedirs(local_dir)
+
+        return self._run(transfers, lambda sftp, src, dst, callback: sftp.get(src, dst, callback=callback))
+
+    def _run(self, transfers, transfer_file):
+        stats = TransferStats(len(transfers), sum(size for src, dst, size in transfers))
+        lock = threading.Lock()
+        errors = []
+        # Biggest first, so that a big file does not start last and leave the other channels idle.
+        pending = collections.deque(sorted(transfers, key=lambda item: item[2], reverse=True))
+
+        def report():
+            if self.progress is not None:
+                self.progress(stats)
+
+        def transfer(sftp, src, dst):
+            done = [0]
+
+            def callback(transferred, total):
+                with lock:
+                    stats.bytes_done += transferred - done[0]
+                    done[0] = transferred
+                    report()
+
+            transfer_file(sftp, src, dst, callback)
+            with lock:
+                stats.files_done += 1
+                report()
+
+        def worker():
+            # A worker holds a session only while there is work left, so a worker that waited for one (the client
+            # had fewer free sessions than parallelism) gives it straight back if the others have finished.
+            with self.client._sessions:
+                if not pending or errors:
+                    return
+                try:
+                    sftp = paramiko.SFTPClient.from_transport(self.client.transport)
+                except Exception as e:
+                    errors.append(e)
+                    return
+                try:
+                    while not errors:
+                        try:
+                            src, dst, size = pending.popleft()
+                        except IndexError:
+                            break
+                        transfer(sftp, src, dst)
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    sftp.close()
+
+        log.info('Transferring %d files (%d bytes) over %d channels to/from %s', stats.files_total,
+                 stats.bytes_total, self.parallelism, self.client.host)
+        threads = [threading.Thread(target=worker) for _ in range(min(self.parallelism, len(pending)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats.finished = time.monotonic()
+        if errors:
+            raise errors[0]
+        log.info('Transferred %r', stats)
+        return stats
@@ -0,0 +1,128 @@
+# Copyright (c) 2015 Scott Christensen
+#
+# This file is part of condorpy
+#
+# condorpy is free software: you can redistribute it and/or modify it under
+# the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
+# should have been distributed with this file.
+
+import re
+
+from .static import CONDOR_JOB_STATUSES, USER_LOG_EVENT_STATUSES
+from .logger import log
+
+
+class UserLogTracker(object):
+    """Tracks job statuses by incrementally reading an HTCondor user (event) log.
+
+    The tracker remembers the byte offset it has read up to, so each update only reads and parses the events
+    appended since the last one. An event that is still being written (one without its closing '...' line) is
+    left for the next update. Only the classic text log format is understood, not the XML one.
+
+    Args:
+        path (str): The path to the user log.
+        opener (callable, optional): Called as opener(path, mode) to open the log. It must return a file object
+            that supports seek and read, such as a local file or a paramiko SFTPFile. Defaults to open.
+
+    """
+
+    EVENT_SEPARATOR = b'\n...\n'
+    EVENT_HEADER = re.compile(r'^(\d{3}) \((\d+)\.(\d+)\.\d+\)')
+
+    def __init__(self, path, opener=open):
+        self.path = path
+        self._opener = opener
+        self._offset = 0
+        self._proc_statuses = dict()
+
+    def __repr__(self):
+        return '<UserLogTracker: path=%s, offset=%d>' % (self.path, self._offset)
+
+    @property
+    def offset(self):
+        """The number of bytes of the log that have been parsed.
+
+        """
+        return self._offset
+
+    def update(self):
+        """Read and parse any complete events appended to the log since the last update.
+
+        Returns:
+            int: The number of new events parsed.
+
+        """
+        try:
+            log_file = self._opener(self.path, 'rb')
+        except (IOError, OSError):
+            log.info('User log %s does not exist yet.', self.path)
+            return 0
+        try:
+            log_file.seek(self._offset)
+            data = log_file.read()
+        finally:
+            log_file.close()
+
+        # Only consume up to the end of the last complete event.
+        end = data.rfind(self.EVENT_SEPARATOR)
+        if end == -1:
+            return 0
+        end += len(self.EVENT_SEPARATOR)
+        self._offset += end
+        return self._parse(data[:end].decode('utf-8', 'replace'))
+
+    def _parse(self, text):
+        num_events = 0
+        at_event_start = True
+        for line in text.splitlines():
+            if line.strip() == '...':
+                at_event_start = True
+                continue
+            if not at_event_start:
+                continue
+            at_event_start = False
+            match = self.EVENT_HEADER.match(line)
+            if not match:
+                continue
+            num_events += 1
+            event_code, cluster_id, proc_id = (int(group) for group in match.groups())
+            status = USER_LOG_EVENT_STATUSES.get(event_code)
+            if status:
+                self._proc_statuses[(cluster_id, proc_id)] = status
+        return num_events
+
+    def proc_statuses(self, cluster_id):
+        """The status of each proc in a cluster, as of the last update.
+
+        Args:
+            cluster_id (int): The cluster to get proc statuses for.
+
+        Returns:
+            dict: proc id (int) -> status name (str) for each proc that has appeared in the log.
+
+        """
+        return dict((proc_id, status) for (cluster, proc_id), status in self._proc_statuses.items()
+                    if cluster == cluster_id)
+
+    def statuses(self, cluster_id, num_jobs=1, first_proc=0):
+        """Count how many procs of a cluster are in each status, as of the last update.
+
+        Procs that have not appeared in the log yet are counted as 'Unexpanded'.
+
+        Args:
+            cluster_id (int): The cluster to count statuses for.
+            num_jobs (int, optional): The number of procs in the cluster. Defaults to 1.
+            first_proc (int, optional): The first proc to count, for jobs that share a cluster. Defaults to 0.
+
+        Returns:
+            dict: status name (str) -> number of procs in that status, in the same form as Job.statuses.
+
+        """
+        status_dict = dict()
+        for val in CONDOR_JOB_STATUSES.values():
+            status_dict[val] = 0
+
+        proc_statuses = self.proc_statuses(cluster_id)
+        for proc_id in range(first_proc, first_proc + num_jobs):
+            status_dict[proc_statuses.get(proc_id, 'Unexpanded')] += 1
+        return status_dict
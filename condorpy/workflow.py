@@ -5,11 +5,14 @@
 # condorpy is free software: you can redistribute it and/or modify it under
 # the terms of the BSD 2-Clause License. A copy of the BSD 2-Clause License
 # should have been distributed with this file.
+import contextlib
+import itertools
 import os
+from collections import OrderedDict
 
 from condorpy.static import CONDOR_JOB_STATUSES
 
-from condorpy.exceptions import HTCondorError
+from condorpy.exceptions import HTCondorError, CircularDependency
 
 from .htcondor_object_base import HTCondorObjectBase
 from .node import Node
@@ -20,6 +23,12 @@ class Workflow(HTCondorObjectBase):
     """
 
     """
+    # Separators between records, and between attributes within a record, in -format output.
+    _JOB_DELIMITER = '+++'
+    _ATTR_DELIMITER = ';;;'
+    # Number of nodes whose lines are written to the dag file at a time.
+    _NODE_CHUNK_SIZE = 1000
+
     def __init__(self,
                  name,
                  config,
@@ -30,38 +39,23 @@ class Workflow(HTCondorObjectBase):
                  private_key=None,
                  private_key_pass=None,
                  remote_input_files=None,
-                 working_directory='.'):
+                 working_directory='.',
+                 join_layers=False):
 
         self._name = name
         self._config = config
         self._max_jobs = max_jobs
         self._dag_file = ""
         self._node_set = set()
+        self._complete_generation = None
+        self._topological_order = None
+        self._join_layers = join_layers
         super(Workflow, self).__init__(host, username, password, private_key, private_key_pass, remote_input_files, working_directory)
 
     def __str__(self):
         """
         """
-        result = []
-        if self.config:
-            result.append('CONFIG {0}\n'.format(self.config))
-
-        self.complete_node_set()
-        list_functions = Node.all_list_functions()
-        options = ['']*len(list_functions)
-        for node in self._node_set:
-            for i, list_function_name in enumerate(list_functions):
-                list_function = getattr(node, list_function_name)
-                options[i] += list_function()
-        result.extend(options)
-
-        if self.max_jobs:
-            max_jobs_list = ''
-            for category, max_jobs in self.max_jobs.items():
-                max_jobs_list += 'MAXJOBS {0} {1}\n'.format(category, str(max_jobs))
-            result.append(max_jobs_list)
-
-        return '\n'.join(result)
+        return ''.join(self._dag_chunks())
 
     def __repr__(self):
         """
@@ -89,6 +83,19 @@ class Workflow(HTCondorObjectBase):
         if os.path.exists(config):
             self._config = config
 
+    @property
+    def join_layers(self):
+        """Whether parents that share more than a couple of children are linked to them through a NOOP node.
+
+        A line listing p parents and c children is p * c dependencies to DAGMan. Routing them through a NOOP join
+        node leaves p + c of them.
+        """
+        return self._join_layers
+
+    @join_layers.setter
+    def join_layers(self, join_layers):
+        self._join_layers = join_layers
+
     @property
     def max_jobs(self):
         return self._max_jobs
@@ -140,7 +147,7 @@ class Workflow(HTCondorObjectBase):
         if self.cluster_id == self.NULL_CLUSTER_ID:
             return "Unexpanded"
 
-        return self._update_status()
+        return self._cached_status('status', self._update_status)
 
     @property
     def statuses(self):
@@ -150,7 +157,7 @@ class Workflow(HTCondorObjectBase):
         if self.cluster_id == self.NULL_CLUSTER_ID:
             return "Unexpanded"
 
-        return self._update_statuses()
+        return self._cached_status('statuses', self._update_statuses)
 
     def _update_status(self, sub_job_num=None):
         """Gets the workflow status.
@@ -159,11 +166,12 @@ class Workflow(HTCondorObjectBase):
             str: The current status of the workflow.
 
         """
-        job_id = '%s.%s' % (self.cluster_id, sub_job_num) if sub_job_num else str(self.cluster_id)
-        format = ['-format', '"%d"', 'JobStatus']
-        cmd = 'condor_q {0} {1} && condor_history {0} {1}'.format(job_id, ' '.join(format))
-        args = [cmd]
-        out, err = self._execute(args, shell=True, run_in_job_dir=False)
+        return self.backend.job_status(self, sub_job_num)
+
+    def _read_status_output(self, job_id, out, err, sub_job_num=None):
+        """Read the DAGMan job's status from the output of the command built by _status_query.
+
+        """
         if err:
             log.error('Error while updating status for job %s: %s', job_id, err)
             raise HTCondorError(err)
@@ -173,11 +181,16 @@ class Workflow(HTCondorObjectBase):
 
         out = out.replace('\"', '').split('\n')
 
+        return self._statuses_from_codes(job_id, out, sub_job_num)
+
+    def _statuses_from_codes(self, job_id, status_codes, sub_job_num=None):
+        """The DAGMan job's status, given the JobStatus codes reported for it.
 
+        """
         status_code = 0
-        for status_code_str in out:
+        for status_code_str in status_codes:
             try:
-                status_code = int(status_code_str.strip())
+                status_code = int(str(status_code_str).strip())
             except:
                 pass
 
@@ -187,33 +200,74 @@ class Workflow(HTCondorObjectBase):
 
         return key
 
-    def node_statuses_by_cluster_id(self, sub_job_num=None):
+    def node_statuses_by_cluster_id(self, sub_job_num=None, stream=False):
         """
         Get the status of every node in the DAG with a single remote query.
         Parameters:
             sub_job_num (int, optional): The sub-job number of the DAG.
+            stream (bool, optional): Parse the query's output as it arrives rather than once it has all been read,
+                so a very large DAG's condor_history dump is never held in memory. Defaults to False.
         Returns:
             dict: cluster_id (int) -> condor status name (str), e.g. {12: 'Running'}
         """
+        return self.backend.node_statuses(self, sub_job_num, stream)
+
+    def _node_status_query(self, sub_job_num=None):
         dag_id = '%s.%s' % (self.cluster_id, sub_job_num) if sub_job_num else str(self.cluster_id)
-        job_delimiter = '+++'
-        attr_delimiter = ';;;'
+        job_delimiter = self._JOB_DELIMITER
+        attr_delimiter = self._ATTR_DELIMITER
         format = [
             '-format', '"%d' + attr_delimiter + '"', 'ClusterId',
             '-format', '"%d' + job_delimiter + '"', 'JobStatus',
         ]
         cmd = ('condor_q -constraint DAGManJobID=={0} {1} && '
                'condor_history -constraint DAGManJobID=={0} {1}').format(dag_id, ' '.join(format))
-        out, err = self._execute([cmd], shell=True, run_in_job_dir=False)
+        return dag_id, [cmd]
+
+    def _read_node_status_output(self, dag_id, out, err):
         if err:
             raise HTCondorError(err)
 
+        return self._collect_node_statuses(dag_id, self._node_status_records([out]))
+
+    def _node_status_records(self, chunks):
+        """Parse the output of _node_status_query, given in chunks, into a (ClusterId, JobStatus) list per proc.
+
+        """
+        for record in self._split_records(chunks):
+            parts = [p for p in record.replace('"', '').strip().split(self._ATTR_DELIMITER) if p != '']
+            if parts:
+                yield parts
+
+    @classmethod
+    def _split_records(cls, chunks):
+        """Split output given in chunks into the records separated by _JOB_DELIMITER, yielding each one once it is
+        complete.
+
+        """
+        partial = ''
+        for chunk in chunks:
+            records = (partial + chunk).split(cls._JOB_DELIMITER)
+            partial = records.pop()
+            for record in records:
+                yield record
+        if partial:
+            yield partial
+
+    def _collect_node_statuses(self, dag_id, records):
+        """Map each node's cluster id to its status.
+
+        Args:
+            dag_id (str): The id of the DAGMan job the records belong to.
+            records (iterable): A (ClusterId, JobStatus) sequence for every proc in the dag.
+
+        Returns:
+            dict: cluster_id (int) -> condor status name (str)
+
+        """
         statuses = dict()
         discarded = 0
-        for record in out.replace('"', '').split(job_delimiter):
-            parts = [p for p in record.strip().split(attr_delimiter) if p != '']
-            if not parts:
-                continue
+        for parts in records:
             if len(parts) < 2:
                 discarded += 1
                 continue
@@ -262,17 +316,8 @@ class Workflow(HTCondorObjectBase):
         for node in self.node_set:
             job = node.job
             try:
-                # The batched query cannot reproduce Job.status for a multi-proc
-                # job: that compares the per-proc counts against num_jobs, so it
-                # needs to know how many procs were expected, which the queue
-                # alone does not say. Those nodes keep the per-node query.
-                if by_cluster_id is not None and job.num_jobs == 1:
-                    job_status = by_cluster_id.get(job.cluster_id)
-                    if job_status is None:
-                        job_status = 'Unexpanded' if job.cluster_id == job.NULL_CLUSTER_ID else job.status
-                elif job.cluster_id == job.NULL_CLUSTER_ID:
-                    job_status = 'Unexpanded'
-                else:
+                job_status = self._batched_node_status(job, by_cluster_id)
+                if job_status is None:
                     job_status = job.status
                 status_dict[job_status] += 1
             except (KeyError, HTCondorError):
@@ -280,14 +325,39 @@ class Workflow(HTCondorObjectBase):
 
         return status_dict
 
-    def update_node_ids(self, sub_job_num=None):
+    @staticmethod
+    def _batched_node_status(job, by_cluster_id):
+        """The status of a node's job according to the batched node query.
+
+        Returns:
+            str: The job's status, or None if the job needs its own status query.
+
+        """
+        # The batched query cannot reproduce Job.status for a multi-proc
+        # job: that compares the per-proc counts against num_jobs, so it
+        # needs to know how many procs were expected, which the queue
+        # alone does not say. Those nodes keep the per-node query.
+        if job.cluster_id == job.NULL_CLUSTER_ID:
+            return 'Unexpanded'
+        if by_cluster_id is not None and job._num_procs() == 1:
+            return by_cluster_id.get(job.cluster_id)
+        return None
+
+    def update_node_ids(self, sub_job_num=None, stream=False):
         """
         Associate Jobs with respective cluster ids.
+
+        Args:
+            stream (bool, optional): Parse the query's output as it arrives rather than once it has all been read.
+                Defaults to False.
         """
+        self.backend.update_node_ids(self, sub_job_num, stream)
+
+    def _node_id_query(self, sub_job_num=None):
         # Build condor_q and condor_history commands
         dag_id = '%s.%s' % (self.cluster_id, sub_job_num) if sub_job_num else str(self.cluster_id)
-        job_delimiter = '+++'
-        attr_delimiter = ';;;'
+        job_delimiter = self._JOB_DELIMITER
+        attr_delimiter = self._ATTR_DELIMITER
 
         format = [
             '-format', '"%d' + attr_delimiter + '"', 'ClusterId',
@@ -299,62 +369,94 @@ class Workflow(HTCondorObjectBase):
         cmd = 'condor_q -constraint DAGManJobID=={0} {1} && condor_history -constraint DAGManJobID=={0} {1}'.format(dag_id, ' '.join(format))
 
         # 'condor_q -constraint DAGManJobID==1018 -format "%d\n" ClusterId -format "%s\n" CMD -format "%s\n" ARGS && condor_history -constraint DAGManJobID==1018 -format "%d\n" ClusterId -format "%s\n" CMD -format "%s\n" ARGS'
-        _args = [cmd]
-        out, err = self._execute(_args, shell=True, run_in_job_dir=False)
+        return dag_id, [cmd]
+
+    def _read_node_id_output(self, dag_id, out, err):
+        """Link each node's job to its cluster id, matching on the Cmd and Args in the output of _node_id_query.
 
+        """
         if err:
             log.error('Error while associating ids for jobs dag %s: %s', dag_id, err)
             raise HTCondorError(err)
         if not out:
             log.warning('Error while associating ids for jobs in dag %s: No jobs found for dag.', dag_id)
 
+        self._link_node_ids(self._node_id_records([out or '']))
+
+    def _node_id_records(self, chunks):
+        """Parse the output of _node_id_query, given in chunks, into a (ClusterId, Cmd, arguments) tuple per job.
+
+        """
+        attr_delimiter = self._ATTR_DELIMITER
         try:
             # Split into one line per job
-            jobs_out = out.split(job_delimiter)
+            for job_out in self._split_records(chunks):
+                if not job_out or attr_delimiter not in job_out:
+                    continue
 
-            # Snapshot: a concurrent add_node would otherwise raise "Set changed
-            # size during iteration" partway through matching. set.copy() runs
-            # entirely in C, so it cannot itself be interrupted mid-copy.
-            nodes = self._node_set.copy()
+                # Split line by attributes
+                cluster_id, cmd, _args, _arguments = job_out.split(attr_delimiter)
+                yield cluster_id, cmd, self._node_arguments(_args, _arguments)
 
-            # Match node to cluster id using combination of cmd and arguments
-            for node in nodes:
-                job = node.job
+        except ValueError as e:
+            log.warning(str(e))
 
-                # Skip jobs that already have cluster id defined
-                if job.cluster_id != job.NULL_CLUSTER_ID:
-                    continue
+    @staticmethod
+    def _node_arguments(_args, _arguments):
+        """The arguments of a node's job, from its (old style) Args and (new style) Arguments attributes.
 
-                for job_out in jobs_out:
-                    if not job_out or attr_delimiter not in job_out:
-                        continue
+        """
+        # If new form of arguments is used, _args will be 'undefined' and _arguments will not
+        if _args == 'undefined' and _arguments != 'undefined':
+            args = _arguments.strip()
 
-                    # Split line by attributes
-                    cluster_id, cmd, _args, _arguments = job_out.split(attr_delimiter)
+        # If both are undefined, then there are no arguments
+        elif _args == 'undefined' and _arguments == 'undefined':
+            args = None
 
-                    # If new form of arguments is used, _args will be 'undefined' and _arguments will not
-                    if _args == 'undefined' and _arguments != 'undefined':
-                        args = _arguments.strip()
+        # Otherwise, using old form and _arguments will be 'undefined' and _args will not.
+        else:
+            args = _args.strip()
+        return args
 
-                    # If both are undefined, then there are no arguments
-                    elif _args == 'undefined' and _arguments == 'undefined':
-                        args = None
+    def _link_node_ids(self, records):
+        """Associate each unresolved node's job with the cluster whose command and arguments match its own.
 
-                    # Otherwise, using old form and _arguments will be 'undefined' and _args will not.
-                    else:
-                        args = _args.strip()
+        Args:
+            records (iterable): A (ClusterId, Cmd, arguments) tuple for every job in the dag.
 
-                    job_cmd = job.executable
-                    job_args = job.arguments.strip() if job.arguments else None
+        """
+        # Snapshot: a concurrent add_node would otherwise raise "Set changed
+        # size during iteration" partway through matching. set.copy() runs
+        # entirely in C, so it cannot itself be interrupted mid-copy.
+        nodes = self._node_set.copy()
 
-                    if job_cmd in cmd and job_args == args:
-                        log.info('Linking cluster_id %s to job with command and arguments: %s %s', cluster_id,
-                                  job_cmd, job_args)
-                        job._cluster_id = int(cluster_id)
-                        break
+        # Unresolved jobs by arguments, so the records can be matched as they stream in rather than held in memory
+        # to be scanned once per node. Skip jobs that already have cluster id defined.
+        unresolved = dict()
+        for node in nodes:
+            job = node.job
+            if job.cluster_id == job.NULL_CLUSTER_ID:
+                unresolved.setdefault(job.arguments.strip() if job.arguments else None, []).append(job)
 
-        except ValueError as e:
-            log.warning(str(e))
+        # Match node to cluster id using combination of cmd and arguments; each job takes the first record it matches.
+        for cluster_id, cmd, args in records:
+            jobs = unresolved.get(args)
+            if not jobs:
+                continue
+            matched = [job for job in jobs if job.executable in cmd]
+            if not matched:
+                continue
+            try:
+                cluster_id = int(cluster_id)
+            except ValueError as e:
+                log.warning(str(e))
+                continue
+            for job in matched:
+                log.info('Linking cluster_id %s to job with command and arguments: %s %s', cluster_id,
+                         job.executable, args)
+                job._cluster_id = cluster_id
+            unresolved[args] = [job for job in jobs if job not in matched]
 
     def add_node(self, node):
         """
@@ -363,6 +465,7 @@ class Workflow(HTCondorObjectBase):
         # set.add is atomic; rebinding to a union is a read-modify-write that can
         # drop a concurrent writer's node, and copies the whole set on every add.
         self._node_set.add(node)
+        Node._graph_changed()
 
     def add_job(self, job):
         """
@@ -374,11 +477,42 @@ class Workflow(HTCondorObjectBase):
         self.add_node(node)
         return node
 
-    def submit(self, options=[]):
+    def submit(self, options=[], bundle=False):
         """
         ensures that all relatives of nodes in node_set are also added to the set before submitting
+
+        Args:
+            options (list of str, optional): A list of command line options for condor_submit_dag.
+            bundle (bool, optional): On a remote scheduler, send the dag file and every node's files as one tar
+                archive and submit in a single remote command. See Job.submit. Defaults to False.
         """
-        self.complete_node_set()
+        if not (bundle and self._remote):
+            args = self._prepare_submit(options)
+            return super(Workflow, self).submit(args)
+
+        with self._bundling() as submit_bundle:
+            args = self._prepare_submit(options)
+        return super(Workflow, self).submit(args, submit_bundle)
+
+    @contextlib.contextmanager
+    def _bundling(self):
+        with super(Workflow, self)._bundling() as submit_bundle:
+            try:
+                yield submit_bundle
+            finally:
+                # The nodes were handed the bundle as their remote client while their files were written.
+                for node in self._node_set:
+                    if node.job._remote is submit_bundle:
+                        node.job._share_remote(submit_bundle.client)
+
+    def _prepare_submit(self, options=[]):
+        """Write the dag file and the submit description file of every node ahead of condor_submit_dag.
+
+        Returns:
+            list: The condor_submit_dag args.
+
+        """
+        self.validate()
         self._write_job_file()
 
         args = ['condor_submit_dag']
@@ -386,28 +520,252 @@ class Workflow(HTCondorObjectBase):
         args.append(self.dag_file)
 
         log.info('Submitting workflow %s with options: %s', self.name, args)
-        return super(Workflow, self).submit(args)
+        return args
 
     def wait(self, options=[]):
         """
 
         :return:
         """
+        out, err = self.backend.wait(self, options)
+        self.refresh()
+        return out, err
+
+    def close_remote(self):
+        """Cleans up and closes connection to remote server if defined, giving back the node jobs' share of it too.
+
+        """
+        if self._remote:
+            for node in self._node_set.copy():
+                # The node jobs share the workflow's client and remote directory (see _write_job_file).
+                if node.job._remote is self._remote:
+                    node.job._hold_remote(None, counted=False)
+        super(Workflow, self).close_remote()
+
+    def _wait_commands(self, options=[], sub_job_num=None):
         args = ['condor_wait']
         args.extend(options)
         args.append('%s.dagman.log' % (self.dag_file))
-
-        return self._execute(args)
+        return [args]
 
     def complete_node_set(self):
+        """Add every node linked to the nodes in node_set, however distantly, to it.
+
+        A single walk over parent and child links collects them all, and the result stands until a node is added
+        or a link changes, so rendering and then submitting the dag walks the graph once.
         """
-        """
-        complete_node_set = set()
-        for node in self.node_set:
-            complete_node_set.add(node)
-            complete_node_set = complete_node_set.union(node.get_all_family_nodes())
+        generation = Node._graph_generation
+        if self._complete_generation == generation:
+            return
+
+        complete_node_set = set(self.node_set)
+        stack = list(complete_node_set)
+        while stack:
+            node = stack.pop()
+            for relative in itertools.chain(node.parent_nodes, node.child_nodes):
+                if relative not in complete_node_set:
+                    complete_node_set.add(relative)
+                    stack.append(relative)
 
         self._node_set = complete_node_set
+        self._complete_generation = generation
+
+    def topological_order(self):
+        """Every node of the workflow, each after all of its parents.
+
+        Completes the node set first. The order is worked out in a single pass over the graph (Kahn's algorithm) and
+        kept until a node is added or a link changes.
+
+        Returns:
+            list: The nodes, parents first.
+
+        Raises:
+            CircularDependency: If the nodes' links form any cycles. The message names every node in every cycle.
+
+        """
+        self.complete_node_set()
+        generation = self._complete_generation
+        if self._topological_order is not None and self._topological_order[0] == generation:
+            return list(self._topological_order[1])
+
+        nodes = self._node_set
+        waiting = dict((node, len(node.parent_nodes)) for node in nodes)
+        order = [node for node, count in waiting.items() if not count]
+        for node in order:
+            for child in node.child_nodes:
+                waiting[child] -= 1
+                if not waiting[child]:
+                    order.append(child)
+
+        if len(order) < len(nodes):
+            # Whatever is left is in a cycle or downstream of one; only the cycles themselves are reported.
+            cycles = self._find_cycles(set(node for node, count in waiting.items() if count))
+            names = '; '.join(', '.join(sorted(node.job.name for node in cycle)) for cycle in cycles)
+            log.error('circular dependencies found in %s: %s', self.name, names)
+            raise CircularDependency('Workflow %s has circular dependencies among nodes: %s' % (self.name, names))
+
+        self._topological_order = (generation, order)
+        return list(order)
+
+    def validate(self):
+        """Check that the workflow is a DAG.
+
+        Raises:
+            CircularDependency: If the nodes' links form any cycles. See topological_order.
+
+        """
+        self.topological_order()
+
+    @staticmethod
+    def _find_cycles(nodes):
+        """The strongly connected components of nodes that contain a cycle, found with Tarjan's algorithm.
+
+        Iterative rather than recursive, so that long chains cannot reach the recursion limit.
+
+        Args:
+            nodes (set): The nodes to search. Links to nodes outside of it are ignored.
+
+        Returns:
+            list: A list of nodes for each cycle.
+
+        """
+        index = dict()
+        low = dict()
+        stack = []
+        on_stack = set()
+        cycles = []
+        counter = itertools.count()
+
+        def visit(node):
+            index[node] = low[node] = next(counter)
+            stack.append(node)
+            on_stack.add(node)
+            return node, iter(node.child_nodes)
+
+        for root in nodes:
+            if root in index:
+                continue
+            work = [visit(root)]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in nodes:
+                        continue
+                    if child not in index:
+                        work.append(visit(child))
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member is node:
+                                break
+                        if len(component) > 1 or node in node.child_nodes:
+                            cycles.append(component)
+        return cycles
+
+    def _dag_chunks(self):
+        """The dag file, in pieces small enough to write one at a time.
+
+        Each section (JOB, VARS, PARENT/CHILD, SCRIPT and so on) lists every node in topological order, and is
+        yielded _NODE_CHUNK_SIZE nodes at a time, so that the file is never held in memory whole.
+        """
+        nodes = self.topological_order()
+        relations = self._relations(nodes)
+        sections = []
+        if self.config:
+            sections.append(['CONFIG {0}\n'.format(self.config)])
+        for list_function_name in Node.all_list_functions():
+            if list_function_name == Node.list_relations.__name__:
+                sections.append(self._relation_lines(relations))
+            elif list_function_name == Node.__str__.__name__:
+                sections.append(itertools.chain(self._node_lines(nodes, list_function_name),
+                                                self._join_lines(relations)))
+            else:
+                sections.append(self._node_lines(nodes, list_function_name))
+        if self.max_jobs:
+            sections.append([''.join('MAXJOBS {0} {1}\n'.format(category, str(max_jobs))
+                                     for category, max_jobs in self.max_jobs.items())])
+
+        for i, section in enumerate(sections):
+            if i:
+                yield '\n'
+            for chunk in section:
+                yield chunk
+
+    def _node_lines(self, nodes, list_function_name):
+        """One section of the dag file: the lines list_function_name gives for each node, in chunks of
+        _NODE_CHUNK_SIZE nodes.
+
+        """
+        for start in range(0, len(nodes), self._NODE_CHUNK_SIZE):
+            yield ''.join(getattr(node, list_function_name)() for node in nodes[start:start + self._NODE_CHUNK_SIZE])
+
+    def _relations(self, nodes):
+        """Group the nodes that have children by their set of children, for the PARENT/CHILD lines.
+
+        Nodes with the same children share a line, so a layer of n nodes that all lead to the same m nodes is one
+        line of n + m names rather than n lines of m names each.
+
+        Args:
+            nodes (list): The workflow's nodes, in the order their groups' lines are to be written.
+
+        Returns:
+            list: A (parents, children, join) tuple for each line, where join is the name of the NOOP node to link
+                them through, or None.
+
+        """
+        groups = OrderedDict()
+        for node in nodes:
+            if node.child_nodes:
+                groups.setdefault(frozenset(node.child_nodes), []).append(node)
+
+        relations = []
+        # The join nodes' names are numbered, skipping any a node of the workflow already has.
+        taken = set(node.job.name for node in nodes) if self.join_layers else set()
+        joins = itertools.count()
+        for children, parents in groups.items():
+            join = None
+            if self.join_layers and len(parents) + len(children) < len(parents) * len(children):
+                join = next(name for name in ('%s_join%d' % (self.name, i) for i in joins) if name not in taken)
+            relations.append((parents, children, join))
+        return relations
+
+    def _relation_lines(self, relations):
+        """The PARENT/CHILD section of the dag file, in chunks of _NODE_CHUNK_SIZE lines.
+
+        """
+        lines = []
+        for parents, children, join in relations:
+            parent_names = ' '.join(node.job.name for node in parents)
+            child_names = parents[0]._get_child_names()
+            if join:
+                lines.append('PARENT %s CHILD %s\n' % (parent_names, join))
+                lines.append('PARENT %s CHILD %s\n' % (join, child_names))
+            else:
+                lines.append('PARENT %s CHILD %s\n' % (parent_names, child_names))
+            if len(lines) >= self._NODE_CHUNK_SIZE:
+                yield ''.join(lines)
+                lines = []
+        if lines:
+            yield ''.join(lines)
+
+    def _join_lines(self, relations):
+        """The JOB lines of the NOOP join nodes. DAGMan does not read a NOOP node's submit description file.
+
+        """
+        joins = [join for parents, children, join in relations if join]
+        if joins:
+            yield ''.join('JOB %s ./%s.job NOOP\n' % (join, join) for join in joins)
 
     def _write_job_file(self):
         """
@@ -415,10 +773,13 @@ class Workflow(HTCondorObjectBase):
         log.debug('writing dag file "%s" in "%s".', self.dag_file, self._cwd)
         self._make_dir(self.initial_dir)
         dag_file = self._open(self.dag_file, 'w')
-        dag_file.write(self.__str__())
-        dag_file.close()
+        try:
+            for chunk in self._dag_chunks():
+                dag_file.write(chunk)
+        finally:
+            dag_file.close()
         for node in self._node_set:
-            node.job._remote = self._remote
+            node.job._share_remote(self._remote)
             node.job._remote_id = self._remote_id
             node.job._cwd = self._cwd
             node.job._write_job_file()
@@ -0,0 +1,36 @@
+'''
+A fake HTCondor command suite for load testing condorpy without a pool (see condor.py).
+
+    >>> bin_dir = install(os.path.join(tmp, 'bin'))
+    >>> os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+    >>> os.environ['FAKE_CONDOR_DB'] = os.path.join(tmp, 'condor.db')
+
+tests.ssh_harness.SSHScheduler installs them on the scheduler it serves.
+'''
+import os
+import sys
+
+from .condor import COMMANDS
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'condor.py')
+
+
+def install(bin_dir, python=sys.executable):
+    """Write a condor_* executable for each fake command to a directory.
+
+    Args:
+        bin_dir (str): The directory, which is made if it does not exist.
+        python (str, optional): The interpreter to run the commands with. Defaults to this one.
+
+    Returns:
+        str: bin_dir.
+
+    """
+    if not os.path.isdir(bin_dir):
+        os.makedirs(bin_dir)
+    for name in COMMANDS:
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\nexec %s %s %s "$@"\n' % (python, SCRIPT, name))
+        os.chmod(path, 0o755)
+    return bin_dir
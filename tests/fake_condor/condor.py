@@ -0,0 +1,484 @@
+"""A stand-in for a busy HTCondor scheduler: condor_submit, condor_submit_dag, condor_q, condor_history, condor_rm and
+condor_wait, backed by a SQLite database.
+
+Run as `python condor.py <command> <args>` (the wrappers written by tests.fake_condor.install do this). It only uses
+the standard library, so it can also run on the scheduler of tests/ssh_harness.py.
+
+Jobs are not run. Each proc is Idle for FAKE_CONDOR_IDLE seconds after it is submitted, then Running for
+FAKE_CONDOR_RUN seconds, then Completed. condor_q reports Idle and Running procs, condor_history Completed and
+Removed ones. The nodes of a DAG are submitted as DAGMan would: each one once its parents have completed. The
+database is FAKE_CONDOR_DB, ~/fake_condor.db by default.
+
+The -format, -af, -json, -attributes and -constraint forms condorpy uses are supported, with constraints made of
+comparisons of the attributes in ATTRIBUTES joined by &&, || and !, and member(Attr, {...}).
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+IDLE, RUNNING, REMOVED, COMPLETED = 1, 2, 3, 4
+
+# ClassAd attribute -> SQL expression. ClassAd attribute names are case-insensitive.
+ATTRIBUTES = {
+    'clusterid': 'cluster',
+    'procid': 'proc',
+    'jobstatus': ('CASE WHEN removed THEN %d WHEN :now < start THEN %d WHEN :now < finish THEN %d ELSE %d END'
+                  % (REMOVED, IDLE, RUNNING, COMPLETED)),
+    'cmd': 'cmd',
+    'arguments': 'arguments',
+    'args': 'NULL',
+    'iwd': 'iwd',
+    'userlog': 'user_log',
+    'dagmanjobid': 'dagman_job_id',
+    'qdate': 'CAST(submitted AS INTEGER)',
+    'owner': 'owner',
+}
+# The attributes of an ad, in the order select reads them.
+FIELDS = ['ClusterId', 'ProcId', 'JobStatus', 'Cmd', 'Arguments', 'Args', 'Iwd', 'UserLog', 'DAGManJobID', 'QDate',
+          'Owner']
+NAMES = dict((name.lower(), name) for name in FIELDS)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS clusters (id INTEGER PRIMARY KEY AUTOINCREMENT);
+CREATE TABLE IF NOT EXISTS jobs (
+    cluster INTEGER NOT NULL,
+    proc INTEGER NOT NULL,
+    submitted REAL NOT NULL,
+    start REAL NOT NULL,
+    finish REAL NOT NULL,
+    removed INTEGER NOT NULL DEFAULT 0,
+    cmd TEXT,
+    arguments TEXT,
+    iwd TEXT,
+    user_log TEXT,
+    dagman_job_id INTEGER,
+    owner TEXT,
+    PRIMARY KEY (cluster, proc)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_dag ON jobs (dagman_job_id);
+'''
+
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<member>member\s*\(\s*(?P<member_attr>\w+)\s*,\s*\{(?P<member_values>[^}]*)\}\s*\))
+    |(?P<number>\d+(?:\.\d+)?)
+    |"(?P<string>(?:[^"\\]|\\.)*)"
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>=\?=|=!=|==|!=|<=|>=|&&|\|\||[<>!()])
+)''', re.VERBOSE)
+_OPERATORS = {'==': '=', '!=': '!=', '=?=': 'IS', '=!=': 'IS NOT', '&&': 'AND', '||': 'OR', '!': 'NOT',
+              '<': '<', '>': '>', '<=': '<=', '>=': '>=', '(': '(', ')': ')'}
+
+
+class FakeCondorError(Exception):
+    pass
+
+
+def connect():
+    path = os.environ.get('FAKE_CONDOR_DB') or os.path.join(os.path.expanduser('~'), 'fake_condor.db')
+    db = sqlite3.connect(path, timeout=60, isolation_level=None)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.executescript(SCHEMA)
+    return db
+
+
+def durations():
+    return float(os.environ.get('FAKE_CONDOR_IDLE', 1)), float(os.environ.get('FAKE_CONDOR_RUN', 2))
+
+
+def column(name):
+    try:
+        return ATTRIBUTES[name.lower()]
+    except KeyError:
+        raise FakeCondorError('Unsupported attribute: %s' % (name,))
+
+
+def translate(constraint, params):
+    """Translate a ClassAd constraint into a SQL expression, adding its literals to the params dict."""
+    sql = []
+    position = 0
+    constraint = constraint.strip()
+    while position < len(constraint):
+        match = _TOKEN.match(constraint, position)
+        if not match or match.end() == position:
+            raise FakeCondorError('Unsupported constraint: %s' % (constraint,))
+        position = match.end()
+        if match.group('member'):
+            values = [v.strip() for v in match.group('member_values').split(',') if v.strip()]
+            if not all(re.match(r'^\d+$', v) for v in values):
+                raise FakeCondorError('Unsupported constraint: %s' % (constraint,))
+            sql.append('%s IN (%s)' % (column(match.group('member_attr')), ','.join(values) or 'NULL'))
+        elif match.group('number') is not None:
+            sql.append(match.group('number'))
+        elif match.group('string') is not None:
+            name = 'p%d' % (len(params),)
+            params[name] = match.group('string')
+            sql.append(':' + name)
+        elif match.group('name'):
+            name = match.group('name').lower()
+            sql.append({'true': '1', 'false': '0', 'undefined': 'NULL'}.get(name) or column(name))
+        else:
+            sql.append(_OPERATORS[match.group('op')])
+    return ' '.join(sql) or '1'
+
+
+def parse_query_args(args):
+    """Split condor_q/condor_history/condor_rm args into a SQL condition and its params, and the output options."""
+    ids = []
+    constraints = []
+    options = dict(formats=[], autoformat=None, json=False, attributes=None)
+    args = list(args)
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '-format':
+            options['formats'].append((args[i + 1], args[i + 2]))
+            i += 3
+            continue
+        if arg in ('-constraint', '-const'):
+            constraints.append(args[i + 1])
+            i += 2
+            continue
+        if arg in ('-attributes', '-attr'):
+            options['attributes'] = args[i + 1].split(',')
+            i += 2
+            continue
+        if arg in ('-af', '-autoformat'):
+            options['autoformat'] = args[i + 1:]
+            break
+        if arg == '-json':
+            options['json'] = True
+        elif re.match(r'^\d+(\.\d+)?$', arg):
+            ids.append(arg)
+        elif arg.startswith('-'):
+            pass  # -nobatch, -allusers and the like change nothing here.
+        i += 1
+
+    params = dict()
+    conditions = []
+    if ids:
+        selections = []
+        for job_id in ids:
+            cluster, _, proc = job_id.partition('.')
+            selections.append('(cluster = %d%s)' % (int(cluster), ' AND proc = %d' % int(proc) if proc else ''))
+        conditions.append('(%s)' % (' OR '.join(selections),))
+    for constraint in constraints:
+        conditions.append('(%s)' % (translate(constraint, params),))
+    return ' AND '.join(conditions) or '1', params, options
+
+
+def select(db, condition, params, history, now):
+    status = ATTRIBUTES['jobstatus']
+    wanted = 'IN (%d, %d)' % ((REMOVED, COMPLETED) if history else (IDLE, RUNNING))
+    sql = ('SELECT %s FROM jobs WHERE submitted <= :now AND (%s) %s AND (%s) ORDER BY cluster %s, proc %s'
+           % (', '.join(column(name) for name in FIELDS), status, wanted, condition,
+              'DESC' if history else 'ASC', 'DESC' if history else 'ASC'))
+    for row in db.execute(sql, dict(params, now=now)):
+        yield dict(zip(FIELDS, row))
+
+
+def format_ad(ad, options):
+    if options['formats']:
+        out = []
+        for fmt, attribute in options['formats']:
+            value = ad.get(NAMES.get(attribute.lower(), attribute))
+            if value is None:
+                if '%v' not in fmt:
+                    continue
+                value = 'undefined'
+            out.append(fmt.replace('%v', '%s') % (value,))
+        return ''.join(out)
+    if options['autoformat']:
+        return ' '.join(str(ad.get(NAMES.get(a.lower(), a), 'undefined')) for a in options['autoformat']) + '\n'
+    return '%8s %-8s %s %s %s\n' % ('%d.%d' % (ad['ClusterId'], ad['ProcId']), ad['Owner'] or '',
+                                    'IRXCH'[ad['JobStatus'] - 1], ad['Cmd'] or '', ad['Arguments'] or '')
+
+
+def query(args, history):
+    condition, params, options = parse_query_args(args)
+    db = connect()
+    ads = select(db, condition, params, history, time.time())
+    if options['json']:
+        ads = list(ads)
+        if options['attributes']:
+            keep = set(NAMES.get(a.lower(), a) for a in options['attributes'])
+            ads = [dict((k, v) for k, v in ad.items() if k in keep) for ad in ads]
+        ads = [dict((k, v) for k, v in ad.items() if v is not None) for ad in ads]
+        if ads:
+            json.dump(ads, sys.stdout, indent=2)
+            sys.stdout.write('\n')
+        return 0
+    if not options['formats'] and not options['autoformat']:
+        sys.stdout.write('-- Schedd: fake_condor\n %7s %-8s ST CMD\n' % ('ID', 'OWNER'))
+    write = sys.stdout.write
+    for ad in ads:
+        write(format_ad(ad, options))
+    return 0
+
+
+def parse_submit_file(path):
+    """The procs a submit description asks for.
+
+    Returns:
+        list: A (cmd, arguments, iwd, user_log, count) tuple for each queue statement.
+
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    attributes = dict()
+    queued = []
+    with open(path) as f:
+        lines = iter(f.read().splitlines())
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        statement = re.match(r'^queue\b\s*(\d*)\s*(.*)$', line, re.IGNORECASE)
+        if statement:
+            count = int(statement.group(1) or 1)
+            items = 1
+            source = re.match(r'^.*?\b(?:from|in|matching)\s*(.*)$', statement.group(2), re.IGNORECASE)
+            if source:
+                rest = source.group(1).strip()
+                if rest.startswith('('):
+                    rows = [rest[1:]] if rest[1:].strip() else []
+                    for row in lines:
+                        if row.strip() == ')':
+                            break
+                        rows.append(row)
+                else:
+                    with open(os.path.join(base, rest)) as item_file:
+                        rows = list(item_file)
+                items = len([row for row in rows if row.strip() and not row.strip().startswith('#')])
+            iwd = os.path.join(base, attributes.get('initialdir', ''))
+            executable = attributes.get('executable', '')
+            user_log = attributes.get('log')
+            queued.append((os.path.join(iwd, executable) if executable else None,
+                           attributes.get('arguments', '').strip('"').strip() or None,
+                           os.path.normpath(iwd),
+                           os.path.normpath(os.path.join(iwd, user_log)) if user_log else None,
+                           count * items))
+            continue
+        key, _, value = line.partition('=')
+        attributes[key.strip().lower()] = value.strip()
+    return queued
+
+
+def new_cluster(db):
+    return db.execute('INSERT INTO clusters DEFAULT VALUES').lastrowid
+
+
+def insert_procs(db, cluster, procs, submitted, start, finish, cmd, arguments, iwd, user_log, dagman_job_id=None):
+    owner = os.environ.get('USER', 'condor')
+    db.executemany('INSERT INTO jobs VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?, ?)',
+                   ((cluster, proc, submitted, start, finish, cmd, arguments, iwd, user_log, dagman_job_id, owner)
+                    for proc in procs))
+
+
+def submit(args):
+    if not args:
+        raise FakeCondorError('condor_submit: no submit description file given')
+    queued = parse_submit_file(args[-1])
+    idle, run = durations()
+    now = time.time()
+    db = connect()
+    db.execute('BEGIN IMMEDIATE')
+    clusters = []
+    previous_cmd = object()
+    for cmd, arguments, iwd, user_log, count in queued:
+        # condor_submit starts a new cluster when the executable changes.
+        if cmd != previous_cmd:
+            clusters.append([new_cluster(db), 0])
+            previous_cmd = cmd
+        cluster = clusters[-1]
+        insert_procs(db, cluster[0], range(cluster[1], cluster[1] + count), now, now + idle, now + idle + run, cmd,
+                     arguments, iwd, user_log)
+        cluster[1] += count
+    db.execute('COMMIT')
+    sys.stdout.write('Submitting job(s)%s\n' % ('.' * min(sum(c for _, c in clusters), 80),))
+    for cluster, count in clusters:
+        sys.stdout.write('%d job(s) submitted to cluster %d.\n' % (count, cluster))
+    return 0
+
+
+def parse_dag(path):
+    """The nodes of a DAG file and their parents.
+
+    Returns:
+        tuple: A (name, submit file, noop, done) tuple for each node, and a dict of name -> set of parent names.
+
+    """
+    nodes = []
+    parents = dict()
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            if not words:
+                continue
+            keyword = words[0].upper()
+            if keyword == 'JOB':
+                flags = set(word.upper() for word in words[3:])
+                nodes.append((words[1], words[2], 'NOOP' in flags, 'DONE' in flags))
+            elif keyword == 'PARENT':
+                split = [word.upper() for word in words].index('CHILD')
+                for child in words[split + 1:]:
+                    parents.setdefault(child, set()).update(words[1:split])
+    return nodes, parents
+
+
+def submit_dag(args):
+    if not args:
+        raise FakeCondorError('condor_submit_dag: no DAG file given')
+    dag_file = args[-1]
+    base = os.path.dirname(os.path.abspath(dag_file))
+    nodes, parents = parse_dag(dag_file)
+    idle, run = durations()
+    now = time.time()
+
+    # Each node is submitted once its parents have finished, and finishes idle + run seconds later.
+    finish = dict()
+    pending = dict((name, set(parents.get(name, ()))) for name, _, _, _ in nodes)
+    by_name = dict((node[0], node) for node in nodes)
+    children = dict()
+    for child, names in parents.items():
+        for name in names:
+            children.setdefault(name, []).append(child)
+    ready = [name for name, waiting in pending.items() if not waiting]
+    order = []
+    while ready:
+        name = ready.pop()
+        order.append(name)
+        _, _, noop, done = by_name[name]
+        submitted = max([finish[p] for p in parents.get(name, ())] or [now])
+        finish[name] = submitted if noop or done else submitted + idle + run
+        for child in children.get(name, ()):
+            pending[child].discard(name)
+            if not pending[child]:
+                ready.append(child)
+    if len(order) != len(nodes):
+        raise FakeCondorError('ERROR: a cycle was found in %s' % (dag_file,))
+
+    submit_files = dict()
+    db = connect()
+    db.execute('BEGIN IMMEDIATE')
+    dag_cluster = new_cluster(db)
+    dag_end = max(list(finish.values()) + [now])
+    dagman_log = os.path.abspath(dag_file + '.dagman.log')
+    insert_procs(db, dag_cluster, [0], now, now, dag_end, '/usr/bin/condor_dagman',
+                 '-f -l . -Lockfile %s.lock -Dag %s' % (dag_file, dag_file), base, dagman_log)
+    for name in order:
+        _, submit_file, noop, done = by_name[name]
+        if noop or done:
+            continue
+        path = os.path.join(base, submit_file)
+        if path not in submit_files:
+            submit_files[path] = parse_submit_file(path)
+        submitted = finish[name] - idle - run
+        cluster = new_cluster(db)
+        proc = 0
+        for cmd, arguments, iwd, user_log, count in submit_files[path]:
+            insert_procs(db, cluster, range(proc, proc + count), submitted, submitted + idle, finish[name], cmd,
+                         arguments, iwd, user_log, dag_cluster)
+            proc += count
+    db.execute('COMMIT')
+
+    with open(dagman_log, 'a'):
+        pass
+    sys.stdout.write('-' * 71 + '\n')
+    sys.stdout.write('File for submitting this DAG to HTCondor           : %s.condor.sub\n' % (dag_file,))
+    sys.stdout.write('Log of DAGMan debugging messages                 : %s.dagman.out\n' % (dag_file,))
+    sys.stdout.write('Submitting job(s).\n1 job(s) submitted to cluster %d.\n' % (dag_cluster,))
+    sys.stdout.write('-' * 71 + '\n')
+    return 0
+
+
+def remove(args):
+    condition, params, options = parse_query_args(args)
+    if condition == '1' and '-all' not in args:
+        raise FakeCondorError('condor_rm: no jobs given')
+    db = connect()
+    db.execute('BEGIN IMMEDIATE')
+    params['now'] = time.time()
+    queued = 'submitted <= :now AND (%s) IN (%d, %d)' % (ATTRIBUTES['jobstatus'], IDLE, RUNNING)
+    clusters = [row[0] for row in db.execute(
+        'SELECT DISTINCT cluster FROM jobs WHERE %s AND (%s)' % (queued, condition), params)]
+    if not clusters:
+        db.execute('ROLLBACK')
+        sys.stderr.write("Couldn't find/remove all jobs matching: %s\n" % (' '.join(args),))
+        return 1
+    db.execute('UPDATE jobs SET removed = 1 WHERE %s AND (%s)' % (queued, condition), params)
+    # Removing a DAGMan job removes its nodes, those it has not submitted yet included.
+    db.execute('UPDATE jobs SET removed = 1 WHERE NOT removed AND dagman_job_id IN (%s)'
+               % (','.join(str(c) for c in clusters),))
+    db.execute('COMMIT')
+    for cluster in clusters:
+        sys.stdout.write('All jobs in cluster %d have been marked for removal\n' % (cluster,))
+    return 0
+
+
+def wait(args):
+    timeout = None
+    positional = []
+    args = list(args)
+    i = 0
+    while i < len(args):
+        if args[i] == '-wait':
+            timeout = float(args[i + 1])
+            i += 2
+            continue
+        if args[i] == '-num':
+            i += 2
+            continue
+        if not args[i].startswith('-'):
+            positional.append(args[i])
+        i += 1
+    if not positional:
+        raise FakeCondorError('condor_wait: no log file given')
+    log_file = os.path.abspath(positional[0])
+    db = connect()
+    if len(positional) > 1:
+        cluster, _, proc = positional[1].partition('.')
+        condition = 'cluster = %d%s' % (int(cluster), ' AND proc = %d' % int(proc) if proc else '')
+        params = dict()
+    else:
+        condition = 'user_log = :log'
+        params = dict(log=log_file)
+    end = db.execute('SELECT MAX(CASE WHEN removed THEN 0 ELSE finish END), COUNT(*) FROM jobs WHERE %s'
+                     % (condition,), params).fetchone()
+    if not end[1]:
+        sys.stderr.write('Nothing to wait for.\n')
+        return 1
+    remaining = end[0] - time.time()
+    if timeout is not None and remaining > timeout:
+        time.sleep(timeout)
+        sys.stdout.write('Time expired.\n')
+        return 1
+    if remaining > 0:
+        time.sleep(remaining)
+    sys.stdout.write('All jobs done.\n')
+    return 0
+
+
+COMMANDS = {
+    'condor_submit': submit,
+    'condor_submit_dag': submit_dag,
+    'condor_q': lambda args: query(args, history=False),
+    'condor_history': lambda args: query(args, history=True),
+    'condor_rm': remove,
+    'condor_wait': wait,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        return COMMANDS[argv[0]](argv[1:])
+    except (FakeCondorError, IOError, ValueError, IndexError) as e:
+        sys.stderr.write('%s\n' % (e,))
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+'''
+Stand-ins for the paramiko SFTP client, transport and session channels that RemoteClient uses, so that its remote
+code paths can be tested without an SSH server.
+
+LocalSFTP and LocalTransport play a scheduler whose home directory is a local directory: files are copied to and
+from it, and commands run in it as local processes. ScriptedTransport answers each command with output a test
+gives it instead. tests/ssh_harness.py serves the same things over a real SSH connection, for end-to-end tests.
+
+    >>> client = RemoteClient('host', 'user', 'pass')
+    >>> client._transport = LocalTransport(home)
+    >>> client._sftp = LocalSFTP(home)
+'''
+import io
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from unittest import mock
+
+
+class LocalSFTP(object):
+    """An SFTP client against a local directory standing in for the scheduler's home.
+
+    Attributes:
+        puts (list): The local path of each file put.
+        gets (list): The remote path of each file got.
+        opens (list): The remote path and mode of each file opened.
+
+    """
+
+    def __init__(self, home):
+        self.home = home
+        self.sock = mock.Mock(closed=False)
+        self.puts = []
+        self.gets = []
+        self.opens = []
+
+    def _local(self, path):
+        return os.path.join(self.home, path)
+
+    def _copy(self, src, dst, callback):
+        shutil.copyfile(src, dst)
+        if callback:
+            size = os.path.getsize(dst)
+            callback(size, size)
+
+    def put(self, local_path, remote_path, callback=None):
+        self.puts.append(local_path)
+        self._copy(local_path, self._local(remote_path), callback)
+
+    def get(self, remote_path, local_path, callback=None):
+        self.gets.append(remote_path)
+        self._copy(self._local(remote_path), local_path, callback)
+
+    def open(self, path, mode='r'):
+        self.opens.append((path, mode))
+        return io.open(self._local(path), mode)
+
+    def stat(self, path):
+        return os.stat(self._local(path))
+
+    def mkdir(self, path):
+        os.mkdir(self._local(path))
+
+    def chmod(self, path, mode):
+        os.chmod(self._local(path), mode)
+
+    def posix_rename(self, old_path, new_path):
+        os.rename(self._local(old_path), self._local(new_path))
+
+    def close(self):
+        pass
+
+
+class LocalTransport(object):
+    """A transport whose sessions run their commands with a local shell in the scheduler's home directory.
+
+    Args:
+        home (str): The home directory.
+        env (dict, optional): Environment variables to set for the commands, besides HOME. Defaults to None.
+
+    Attributes:
+        commands (list): Every command run.
+
+    """
+
+    def __init__(self, home, env=None):
+        self.home = home
+        self.env = env or dict()
+        self.commands = []
+
+    def is_active(self):
+        return True
+
+    def open_session(self):
+        return LocalChannel(self)
+
+    def close(self):
+        pass
+
+
+class LocalChannel(object):
+    """A session channel that runs its command as a local process, with a real channel's stdin, stdout and stderr.
+
+    The output is read either with recv and recv_stderr or through makefile, as RemoteHelper does, but not both.
+
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.process = None
+        self._output = dict(stdout=b'', stderr=b'')
+        self._lock = threading.Lock()
+        self._readers = dict()
+        # Always readable, so that select returns at once and the client goes back to polling.
+        self._devnull = os.open(os.devnull, os.O_RDONLY)
+
+    def exec_command(self, command):
+        transport = self.transport
+        transport.commands.append(command)
+        env = dict(os.environ, HOME=transport.home)
+        env.update(transport.env)
+        # A session of its own, so that kill and close reach whatever the command starts.
+        self.process = subprocess.Popen(command, shell=True, cwd=transport.home, env=env, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+        self._read('stderr')
+
+    def _read(self, name):
+        if name in self._readers:
+            return
+        stream = getattr(self.process, name)
+
+        def read():
+            for block in iter(lambda: os.read(stream.fileno(), 32768), b''):
+                with self._lock:
+                    self._output[name] += block
+
+        self._readers[name] = threading.Thread(target=read)
+        self._readers[name].daemon = True
+        self._readers[name].start()
+
+    def _recv(self, name, size):
+        with self._lock:
+            data, self._output[name] = self._output[name][:size], self._output[name][size:]
+        return data
+
+    def recv_ready(self):
+        self._read('stdout')
+        return bool(self._output['stdout'])
+
+    def recv_stderr_ready(self):
+        return bool(self._output['stderr'])
+
+    def recv(self, size):
+        return self._recv('stdout', size)
+
+    def recv_stderr(self, size):
+        return self._recv('stderr', size)
+
+    def exit_status_ready(self):
+        return self.process.poll() is not None and not any(reader.is_alive() for reader in self._readers.values())
+
+    def recv_exit_status(self):
+        return self.process.wait()
+
+    def sendall(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def shutdown_write(self):
+        self.process.stdin.close()
+
+    def makefile(self, mode, bufsize=-1):
+        return self.process.stdin if 'w' in mode else self.process.stdout
+
+    def setblocking(self, blocking):
+        pass
+
+    def fileno(self):
+        return self._devnull
+
+    def kill(self):
+        """Kill the command and everything it started, as a dropped connection would."""
+        if self.process.poll() is None:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        self.process.wait()
+        for reader in self._readers.values():
+            reader.join()
+
+    def close(self):
+        if self.process is not None:
+            if not self.process.stdin.closed:
+                self.process.stdin.close()
+            self.kill()
+            self.process.stdout.close()
+            self.process.stderr.close()
+        if self._devnull is not None:
+            os.close(self._devnull)
+            self._devnull = None
+
+
+class ScriptedTransport(object):
+    """A transport whose sessions answer each command with the stdout and stderr respond returns for it.
+
+    Args:
+        respond (callable, optional): Given a command, returns its stdout and stderr (str or bytes). Defaults to
+            echoing the command.
+        delay (float, optional): Seconds each command takes. Defaults to 0.
+
+    Attributes:
+        commands (list): Every command run.
+        peak (int): The most sessions that were open at once.
+
+    """
+
+    def __init__(self, respond=None, delay=0):
+        self.respond = respond or (lambda command: (command + '\n', ''))
+        self.delay = delay
+        self.commands = []
+        self.lock = threading.Lock()
+        self.open = 0
+        self.peak = 0
+
+    def is_active(self):
+        return True
+
+    def open_session(self):
+        return ScriptedChannel(self)
+
+    def close(self):
+        pass
+
+
+class ScriptedChannel(object):
+    """A session channel whose output comes from its transport's respond function. A command starting with 'fail'
+    exits with status 1.
+
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.command = None
+        self.stdout = b''
+        self.stderr = b''
+
+    def exec_command(self, command):
+        self.command = command
+        transport = self.transport
+        with transport.lock:
+            transport.commands.append(command)
+            transport.open += 1
+            transport.peak = max(transport.peak, transport.open)
+        time.sleep(transport.delay)
+        stdout, stderr = transport.respond(command)
+        self.stdout = stdout.encode() if isinstance(stdout, str) else stdout
+        self.stderr = stderr.encode() if isinstance(stderr, str) else stderr
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv(self, size):
+        data, self.stdout = self.stdout[:size], self.stdout[size:]
+        return data
+
+    def recv_stderr(self, size):
+        data, self.stderr = self.stderr[:size], self.stderr[size:]
+        return data
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return 1 if self.command.startswith('fail') else 0
+
+    def setblocking(self, blocking):
+        pass
+
+    def fileno(self):
+        raise ValueError('no pollable file descriptor')
+
+    def close(self):
+        with self.transport.lock:
+            self.transport.open -= 1
@@ -0,0 +1,331 @@
+'''
+An in-process SSH/SFTP server that stands in for a remote HTCondor scheduler.
+
+SSHScheduler listens on a local port and serves logins, commands and SFTP from a temporary directory that plays the
+scheduler's home directory, so the remote code paths (RemoteClient, set_scheduler, _copy_input_files_to_remote)
+can be tested and benchmarked on a machine with no network and no HTCondor. Commands run with a local shell in the
+home directory, with the fake condor_* commands of tests/fake_condor first on the PATH. It counts the connections, sessions and
+commands it serves, so tests can check that connections are reused.
+
+    >>> with SSHScheduler() as scheduler:
+    ...     job.set_scheduler(scheduler.host, scheduler.username, password=scheduler.password, port=scheduler.port)
+    ...     job.submit()
+    ...     scheduler.stats['connections']
+    1
+'''
+import logging
+import os
+import shutil
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+
+import paramiko
+
+from . import fake_condor
+
+# Clients that hang up are logged as errors by the server's transports, which is noise here.
+_log = logging.getLogger('tests.ssh_harness.transport')
+_log.setLevel(logging.CRITICAL)
+
+# Generating a host key takes a moment, so every server shares one.
+_host_key = None
+_host_key_lock = threading.Lock()
+
+
+def host_key():
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(2048)
+        return _host_key
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(self.filename, attr)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class _SFTPInterface(paramiko.SFTPServerInterface):
+    """SFTP on the local filesystem, with relative paths taken from the scheduler's home directory."""
+
+    def __init__(self, server, home, *args, **kwargs):
+        super(_SFTPInterface, self).__init__(server, *args, **kwargs)
+        self.home = home
+
+    def _local(self, path):
+        return os.path.join(self.home, path)
+
+    def _call(self, func, *args):
+        try:
+            func(*args)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def canonicalize(self, path):
+        return os.path.normpath(self._local(path))
+
+    def list_folder(self, path):
+        path = self._local(path)
+        try:
+            names = os.listdir(path)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        attributes = []
+        for name in names:
+            attribute = paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+            attribute.filename = name
+            attributes.append(attribute)
+        return attributes
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        path = self._local(path)
+        mode = getattr(attr, 'st_mode', None)
+        try:
+            fd = os.open(path, flags, 0o666 if mode is None else stat.S_IMODE(mode))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & os.O_CREAT and attr is not None:
+            attr._flags &= ~attr.FLAG_PERMISSIONS
+            paramiko.SFTPServer.set_file_attr(path, attr)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = _SFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        return self._call(os.remove, self._local(path))
+
+    def rename(self, old_path, new_path):
+        if os.path.exists(self._local(new_path)):
+            return paramiko.SFTP_FAILURE
+        return self._call(os.rename, self._local(old_path), self._local(new_path))
+
+    def posix_rename(self, old_path, new_path):
+        return self._call(os.rename, self._local(old_path), self._local(new_path))
+
+    def mkdir(self, path, attr):
+        return self._call(os.mkdir, self._local(path))
+
+    def rmdir(self, path):
+        return self._call(os.rmdir, self._local(path))
+
+    def chattr(self, path, attr):
+        return self._call(paramiko.SFTPServer.set_file_attr, self._local(path), attr)
+
+    def symlink(self, target_path, path):
+        return self._call(os.symlink, target_path, self._local(path))
+
+    def readlink(self, path):
+        try:
+            return os.readlink(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+class _ServerInterface(paramiko.ServerInterface):
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (self.scheduler.username, self.scheduler.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            self.scheduler._count('sessions')
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        self.scheduler._count('commands')
+        thread = threading.Thread(target=self.scheduler._run, args=(channel, command.decode('utf-8')))
+        thread.daemon = True
+        thread.start()
+        return True
+
+
+class SSHScheduler(object):
+    """An SSH server on localhost, serving a temporary home directory with fake condor_* commands on the PATH.
+
+    Args:
+        username (str, optional): The user that can log in. Defaults to 'condor'.
+        password (str, optional): Their password. Defaults to 'condor'.
+        bin_dir (str, optional): A directory of condor_* executables to use instead of the ones
+            tests.fake_condor.install writes to the home directory. Defaults to None.
+        latency (float, optional): Seconds to wait before running each command, to stand in for a round trip to a
+            distant scheduler. Defaults to 0.
+        idle (float, optional): Seconds each proc the fake commands are given stays Idle. Defaults to 0.
+        run (float, optional): Seconds it then stays Running before it is Completed. Defaults to 0, so that jobs
+            finish as soon as they are submitted.
+
+    Attributes:
+        home (str): The home directory.
+        stats (dict): The number of 'connections', 'sessions' (SFTP included) and 'commands' served.
+
+    """
+
+    host = '127.0.0.1'
+
+    def __init__(self, username='condor', password='condor', bin_dir=None, latency=0, idle=0, run=0):
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.idle = idle
+        self.run = run
+        self.home = tempfile.mkdtemp(prefix='condorpy-scheduler-')
+        self.bin_dir = bin_dir or fake_condor.install(os.path.join(self.home, '.bin'))
+        self.stats = dict(connections=0, sessions=0, commands=0)
+        self._stats_lock = threading.Lock()
+        self._transports = []
+        self._socket = None
+        self.port = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def path(self, *parts):
+        """The local path of a file in the home directory."""
+        return os.path.join(self.home, *parts)
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, 0))
+        self._socket.listen(100)
+        self.port = self._socket.getsockname()[1]
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        for transport in self._transports:
+            transport.close()
+        shutil.rmtree(self.home, True)
+
+    def drop_connections(self):
+        """Close every open connection, as a flaky link would."""
+        for transport in self._transports:
+            transport.close()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            for name in self.stats:
+                self.stats[name] = 0
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _accept(self):
+        while True:
+            try:
+                sock, address = self._socket.accept()
+            except (OSError, AttributeError):
+                return
+            self._count('connections')
+            transport = paramiko.Transport(sock)
+            transport.set_log_channel(_log.name)
+            transport.add_server_key(host_key())
+            transport.use_compression(True)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, _SFTPInterface, self.home)
+            self._transports.append(transport)
+            try:
+                transport.start_server(server=_ServerInterface(self))
+            except (paramiko.SSHException, EOFError, OSError):
+                transport.close()
+
+    def _environment(self):
+        env = dict(os.environ, HOME=self.home, USER=self.username, FAKE_CONDOR_DB=self.path('fake_condor.db'),
+                   FAKE_CONDOR_IDLE=str(self.idle), FAKE_CONDOR_RUN=str(self.run))
+        env['PATH'] = os.pathsep.join([self.bin_dir, os.path.dirname(sys.executable), env.get('PATH', '')])
+        return env
+
+    def _run(self, channel, command):
+        if self.latency:
+            threading.Event().wait(self.latency)
+        process = subprocess.Popen(command, shell=True, cwd=self.home, env=self._environment(),
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        def send_stdin():
+            try:
+                for data in iter(lambda: channel.recv(32768), b''):
+                    process.stdin.write(data)
+                    process.stdin.flush()
+            except (OSError, socket.error, paramiko.SSHException):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        def copy(stream, send):
+            try:
+                for data in iter(lambda: os.read(stream.fileno(), 32768), b''):
+                    send(data)
+            except (OSError, socket.error, paramiko.SSHException):
+                pass
+
+        stdin = threading.Thread(target=send_stdin)
+        stdin.daemon = True
+        stdin.start()
+        outputs = [threading.Thread(target=copy, args=(process.stdout, channel.sendall)),
+                   threading.Thread(target=copy, args=(process.stderr, channel.sendall_stderr))]
+        for thread in outputs:
+            thread.start()
+        for thread in outputs:
+            thread.join()
+        exit_status = process.wait()
+        process.stdout.close()
+        process.stderr.close()
+        try:
+            channel.send_exit_status(exit_status)
+            channel.close()
+        except (OSError, socket.error, paramiko.SSHException):
+            pass
@@ -0,0 +1,130 @@
+'''
+Tests for the asyncio front-end to jobs and workflows.
+'''
+import asyncio
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+from condorpy import Job, Workflow, Node, AsyncJob, AsyncWorkflow
+from condorpy import aio
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class TestAsyncExecute(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_local_commands_run_in_the_working_directory(self):
+        job = Job('pwd', working_directory=self.dir)
+        out, err = run(aio.execute(job, ['pwd']))
+        self.assertEqual(os.path.realpath(self.dir), os.path.realpath(out.strip()))
+        self.assertEqual('', err)
+
+    def test_shell_commands_are_run_through_the_shell(self):
+        job = Job('shell', working_directory=self.dir)
+        out, err = run(aio.execute(job, ['echo 1 && echo 2'], shell=True))
+        self.assertEqual('1\n2\n', out)
+
+    def test_submit_and_status_against_local_commands(self):
+        bin_dir = os.path.join(self.dir, 'bin')
+        os.mkdir(bin_dir)
+        scripts = {'condor_submit': 'echo "1 job(s) submitted to cluster 77."',
+                   'condor_q': 'echo -n \'"2"\'',
+                   'condor_history': 'true'}
+        for name, body in scripts.items():
+            path = os.path.join(bin_dir, name)
+            with open(path, 'w') as script:
+                script.write('#!/bin/sh\n%s\n' % body)
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+        job = AsyncJob('async_job', executable='exe', working_directory=self.dir)
+        path = bin_dir + os.pathsep + os.environ.get('PATH', '')
+        with mock.patch.dict(os.environ, {'PATH': path}):
+            self.assertEqual(77, run(job.submit()))
+            self.assertEqual('Running', run(job.status()))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, 'async_job.job')))
+
+
+class TestAsyncJob(unittest.TestCase):
+
+    def test_wraps_a_job_and_passes_attributes_through(self):
+        job = Job('wrapped', executable='exe')
+        async_job = AsyncJob(job)
+        self.assertIs(job, async_job.job)
+        self.assertEqual('exe', async_job.executable)
+        async_job.arguments = 'a b'
+        self.assertEqual('a b', job.arguments)
+
+    def test_builds_a_job_from_a_name(self):
+        async_job = AsyncJob('built', executable='exe')
+        self.assertEqual('built', async_job.job.name)
+
+    def test_unsubmitted_job_is_unexpanded(self):
+        self.assertEqual('Unexpanded', run(AsyncJob('not_yet').status()))
+
+    def test_status_uses_the_cache(self):
+        job = Job('cached')
+        job._cluster_id = 5
+        job.status_cache_ttl = 60
+        with mock.patch.object(aio, 'execute', side_effect=mock.AsyncMock(return_value=('4', ''))) as ex:
+            self.assertEqual('Completed', run(AsyncJob(job).status()))
+            self.assertEqual('Completed', run(AsyncJob(job).status()))
+        self.assertEqual(1, ex.call_count)
+
+    def test_many_jobs_are_polled_concurrently(self):
+        jobs = [Job('j%d' % i) for i in range(20)]
+        for i, job in enumerate(jobs):
+            job._cluster_id = i + 1
+        in_flight = []
+        peak = []
+
+        async def respond(obj, args, **kwargs):
+            in_flight.append(obj)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(obj)
+            return '2', ''
+
+        async def poll():
+            return await asyncio.gather(*[AsyncJob(job).status() for job in jobs])
+
+        with mock.patch.object(aio, 'execute', side_effect=respond):
+            statuses = run(poll())
+        self.assertEqual(['Running'] * 20, statuses)
+        self.assertEqual(20, max(peak))
+
+
+class TestAsyncWorkflow(unittest.TestCase):
+
+    def test_statuses_resolve_node_ids_and_count_nodes(self):
+        workflow = Workflow('async_dag', config='', max_jobs=None)
+        workflow._cluster_id = 42
+        workflow.add_node(Node(Job('a', executable='a.sh')))
+        node_b = Node(Job('b', executable='b.sh'))
+        node_b.job._cluster_id = 11
+        workflow.add_node(node_b)
+
+        async def respond(obj, args, **kwargs):
+            if 'Cmd' in args[0]:
+                return '10;;;/tmp/a.sh;;;undefined;;;undefined+++', ''
+            return '10;;;2+++11;;;4+++', ''
+
+        with mock.patch.object(aio, 'execute', side_effect=respond):
+            statuses = run(AsyncWorkflow(workflow).statuses())
+        self.assertEqual(1, statuses['Running'])
+        self.assertEqual(1, statuses['Completed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+'''
+Tests for the pluggable execution backends.
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from condorpy import Job, Workflow, Node
+from condorpy import backends
+from condorpy.backends import BindingsBackend, CLIBackend, get_backend, set_default_backend
+from condorpy.htcondor_object_base import HTCondorObjectBase
+
+
+class FakeSchedd(object):
+    """A stand-in for htcondor.Schedd that records calls and answers from fixed class ads."""
+
+    def __init__(self, queue=(), history=()):
+        self.queue = list(queue)
+        self.past = list(history)
+        self.calls = []
+
+    def query(self, constraint, projection):
+        self.calls.append(('query', constraint, projection))
+        return list(self.queue)
+
+    def history(self, constraint, projection, match):
+        self.calls.append(('history', constraint, projection, match))
+        return list(self.past)
+
+    def submit(self, description):
+        self.calls.append(('submit', description))
+        result = mock.Mock()
+        result.cluster.return_value = 77
+        return result
+
+    def act(self, action, constraint):
+        self.calls.append(('act', action, constraint))
+        return {'TotalSuccess': 1}
+
+
+class TestGetBackend(unittest.TestCase):
+
+    def tearDown(self):
+        set_default_backend('cli')
+
+    def test_default_is_cli(self):
+        self.assertIsInstance(get_backend(), CLIBackend)
+        self.assertIsInstance(Job('job').backend, CLIBackend)
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, get_backend, 'nope')
+        self.assertRaises(ValueError, set_default_backend, 'nope')
+
+    def test_auto_without_bindings(self):
+        with mock.patch.object(backends, 'htcondor', None):
+            self.assertIsInstance(get_backend('auto'), CLIBackend)
+            self.assertRaises(ImportError, BindingsBackend)
+
+    def test_instance_and_name(self):
+        job = Job('job')
+        backend = CLIBackend()
+        job.backend = backend
+        self.assertIs(backend, job.backend)
+        job.backend = 'cli'
+        self.assertIs(get_backend('cli'), job.backend)
+        self.assertNotIn('backend', job.attributes)
+
+
+class TestBindingsBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.htcondor = mock.Mock()
+        patcher = mock.patch.object(backends, 'htcondor', self.htcondor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_job_status_stops_history_scan_early(self):
+        schedd = FakeSchedd(queue=[{'ProcId': 1, 'JobStatus': 2}], history=[{'ProcId': 0, 'JobStatus': 4}])
+        job = Job('job', num_jobs=2)
+        job._cluster_id = 10
+        job.backend = BindingsBackend(schedd)
+
+        with mock.patch.object(HTCondorObjectBase, '_execute') as ex:
+            statuses = job.statuses
+        ex.assert_not_called()
+        self.assertEqual(1, statuses['Running'])
+        self.assertEqual(1, statuses['Completed'])
+        self.assertEqual(('history', 'ClusterId == 10', ['ProcId', 'JobStatus'], 1), schedd.calls[1])
+
+    def test_job_status_skips_history_when_all_queued(self):
+        schedd = FakeSchedd(queue=[{'ProcId': 0, 'JobStatus': 1}])
+        job = Job('job')
+        job._cluster_id = 10
+        job.backend = BindingsBackend(schedd)
+        self.assertEqual('Idle', job.status)
+        self.assertEqual(['query'], [call[0] for call in schedd.calls])
+
+    def test_submit(self):
+        schedd = FakeSchedd()
+        job = Job('job', working_directory=self.dir, executable='/bin/true')
+        job.backend = BindingsBackend(schedd)
+        self.htcondor.Submit.return_value = dict()
+        self.assertEqual(77, job.submit())
+        self.assertEqual(77, job.cluster_id)
+        self.htcondor.Submit.assert_called_once()
+        self.assertIn('executable = /bin/true', self.htcondor.Submit.call_args[0][0])
+        self.assertEqual(os.path.realpath(self.dir), os.path.realpath(schedd.calls[0][1]['initialdir']))
+
+    def test_options_and_wait_use_the_cli(self):
+        schedd = FakeSchedd()
+        job = Job('job', working_directory=self.dir, executable='/bin/true')
+        job._cluster_id = 10
+        job.backend = BindingsBackend(schedd)
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('', None)) as ex:
+            job.remove(options=['-forcex'])
+            job.wait()
+        self.assertEqual(2, ex.call_count)
+        self.assertEqual([], schedd.calls)
+
+    def test_remove(self):
+        schedd = FakeSchedd()
+        job = Job('job')
+        job._cluster_id = 10
+        job.backend = BindingsBackend(schedd)
+        job.remove(sub_job_num=3)
+        self.assertEqual('ClusterId == 10 && ProcId == 3', schedd.calls[0][2])
+
+    def test_statuses_for(self):
+        schedd = FakeSchedd(queue=[{'ClusterId': 10, 'ProcId': 0, 'JobStatus': 2},
+                                   {'ClusterId': 11, 'ProcId': 0, 'JobStatus': 5}])
+        backend = BindingsBackend(schedd)
+        jobs = [Job('a'), Job('b')]
+        for cluster_id, job in zip((10, 11), jobs):
+            job._cluster_id = cluster_id
+            job.backend = backend
+
+        statuses = Job.statuses_for(jobs)
+        self.assertEqual(1, statuses[jobs[0]]['Running'])
+        self.assertEqual(1, statuses[jobs[1]]['Held'])
+        self.assertEqual('member(ClusterId, {10, 11})', schedd.calls[0][1])
+
+    def test_workflow_node_statuses(self):
+        schedd = FakeSchedd(queue=[{'ClusterId': 21, 'JobStatus': 2}], history=[{'ClusterId': 22, 'JobStatus': 4}])
+        workflow = Workflow('dag', config='', max_jobs=None)
+        workflow._cluster_id = 20
+        workflow.backend = BindingsBackend(schedd)
+        self.assertEqual({21: 'Running', 22: 'Completed'}, workflow.node_statuses_by_cluster_id())
+
+    def test_workflow_update_node_ids(self):
+        job = Job('node', executable='run.sh', arguments='1 2')
+        workflow = Workflow('dag', config='', max_jobs=None)
+        workflow.add_node(Node(job))
+        workflow._cluster_id = 20
+        schedd = FakeSchedd(queue=[{'ClusterId': 21, 'Cmd': 'run.sh', 'Args': '1 2'}])
+        workflow.backend = BindingsBackend(schedd)
+        workflow.update_node_ids()
+        self.assertEqual(21, job.cluster_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+'''
+Tests for submitting to a remote scheduler with one bundled command.
+'''
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+from condorpy import Job, Workflow, Node
+from condorpy.exceptions import HTCondorError
+from condorpy.remote_utils import RemoteClient, SubmitBundle, client_pool
+
+from .fake_remote import LocalTransport
+
+
+def read_bundle(data):
+    tar = tarfile.open(fileobj=io.BytesIO(data))
+    return dict((m.name, tar.extractfile(m).read().decode() if m.isfile() else None) for m in tar.getmembers())
+
+
+class TestSubmitBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        with open(os.path.join(self.dir, 'in.txt'), 'w') as f:
+            f.write('input')
+        client_pool.clear()
+        self.addCleanup(client_pool.clear)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_bundle_contents(self):
+        bundle = SubmitBundle(mock.Mock())
+        bundle.makedirs('job/a/b')
+        with bundle.remote_file('job/a/sub.job') as f:
+            f.write('executable = x\n')
+        bundle.put([os.path.join(self.dir, 'in.txt')], 'job')
+        self.assertEqual({'job': None, 'job/a': None, 'job/a/b': None, 'job/a/sub.job': 'executable = x\n',
+                          'job/in.txt': 'input'}, read_bundle(bundle.getvalue()))
+
+    def test_job_submit_is_one_command(self):
+        job = Job('bundled', working_directory=self.dir, executable='run.sh', remote_input_files=['in.txt'])
+        job.set_scheduler('host', 'user', password='pass')
+        client = job._remote
+        with mock.patch.object(client, 'execute', return_value=('1 job(s) submitted to cluster 12.', '')) as ex, \
+                mock.patch.object(client, 'remote_file') as remote_file, mock.patch.object(client, 'put') as put:
+            self.assertEqual(12, job.submit(bundle=True))
+
+        remote_file.assert_not_called()
+        put.assert_not_called()
+        self.assertIs(client, job._remote)
+        ex.assert_called_once_with('tar -xf - && cd %s && condor_submit ./bundled.job' % (job._remote_id,),
+                                   stdin=mock.ANY)
+        files = read_bundle(ex.call_args[1]['stdin'])
+        self.assertIn('executable = run.sh', files["%s/bundled.job" % (job._remote_id,)])
+        self.assertEqual('input', files['%s/in.txt' % (job._remote_id,)])
+
+    def test_workflow_submit_is_one_command(self):
+        workflow = Workflow('flow', config='', max_jobs=None, working_directory=self.dir)
+        workflow.set_scheduler('host', 'user', password='pass')
+        node_job = Job('node', executable='run.sh')
+        workflow.add_node(Node(node_job))
+        client = workflow._remote
+        with mock.patch.object(client, 'execute', return_value=('1 job(s) submitted to cluster 30.', '')) as ex:
+            self.assertEqual(30, workflow.submit(bundle=True))
+
+        ex.assert_called_once()
+        self.assertIs(client, node_job._remote)
+        files = read_bundle(ex.call_args[1]['stdin'])
+        self.assertIn('JOB node ./node.job', files['%s/flow.dag' % (workflow._remote_id,)])
+        self.assertIn('%s/node.job' % (workflow._remote_id,), files)
+
+    def test_failed_submit(self):
+        job = Job('bundled', working_directory=self.dir, executable='run.sh')
+        job.set_scheduler('host', 'user', password='pass')
+        with mock.patch.object(job._remote, 'execute', side_effect=RuntimeError('tar: not found')):
+            self.assertRaises(HTCondorError, job.submit, bundle=True)
+
+    def test_stdin_is_sent_over_the_session(self):
+        client = RemoteClient('host', 'user', 'pass')
+        client._transport = LocalTransport(self.dir)
+        self.addCleanup(client.close)
+        self.assertEqual(('echo\n', ''), client.execute('cat', stdin=b'echo\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
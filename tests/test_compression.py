@@ -0,0 +1,85 @@
+'''
+Tests for compressed transfers.
+'''
+import gc
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from condorpy.remote_utils import RemoteClient
+
+from .fake_remote import LocalTransport
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.home, True)
+        self.addCleanup(shutil.rmtree, self.local, True)
+        self.client = RemoteClient('host', 'user', 'pass', compression='gzip')
+        self.client._transport = LocalTransport(self.home)
+        self.addCleanup(self.client.close)
+
+    def write(self, root, path, content):
+        path = os.path.join(root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def read(self, root, *parts):
+        with open(os.path.join(root, *parts)) as f:
+            return f.read()
+
+    def test_put(self):
+        self.write(self.local, 'inputs/data.csv', 'a,b\n' * 1000)
+        self.write(self.local, 'run.sh', 'echo')
+        self.client.put([os.path.join(self.local, 'inputs'), os.path.join(self.local, 'run.sh')], 'job dir')
+        self.assertEqual(["mkdir -p 'job dir' && tar -xzf - -C 'job dir'"], self.client._transport.commands)
+        self.assertEqual('a,b\n' * 1000, self.read(self.home, 'job dir', 'inputs', 'data.csv'))
+        self.assertEqual('echo', self.read(self.home, 'job dir', 'run.sh'))
+
+    def test_get(self):
+        self.write(self.home, 'job/out/results.csv', 'x,y\n')
+        self.write(self.home, 'job/out/logs/run.log', 'event\n')
+        self.client.get('job/out', self.local)
+        self.assertEqual('event\n', self.read(self.local, 'out', 'logs', 'run.log'))
+
+        self.client.get('job/out/.', os.path.join(self.local, 'flat'))
+        self.assertEqual('x,y\n', self.read(self.local, 'flat', 'results.csv'))
+
+    def test_failed_get(self):
+        self.assertRaises(RuntimeError, self.client.get, 'missing', self.local)
+
+    def test_per_call_choice(self):
+        with mock.patch.object(RemoteClient, 'scp') as scp:
+            self.client.put(['in.txt'], 'job', compression=False)
+        scp.put.assert_called_once()
+
+        self.client.compression = None
+        with mock.patch.object(self.client, '_put_gzip') as put_gzip:
+            self.client.put(['in.txt'], 'job', compression='gzip')
+        put_gzip.assert_called_once_with(['in.txt'], 'job')
+
+        self.assertRaises(ValueError, self.client.put, ['in.txt'], 'job', compression='ssh')
+        # The half-made client is closed without errors when it is collected.
+        unraisable = []
+        with mock.patch('sys.unraisablehook', unraisable.append):
+            self.assertRaises(ValueError, RemoteClient, 'host', 'user', compression='zip')
+            gc.collect()
+        self.assertEqual([], unraisable)
+
+    def test_ssh_compression(self):
+        client = RemoteClient('host', 'user', 'pass', compression='ssh')
+        self.addCleanup(client.close)
+        with mock.patch('paramiko.Transport') as transport:
+            client.transport
+        transport.return_value.use_compression.assert_called_once_with(True)
+
+
+if __name__ == '__main__':
+    unittest.main()
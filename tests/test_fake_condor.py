@@ -0,0 +1,114 @@
+'''
+Tests for the fake HTCondor command suite in tests/fake_condor, driven through condorpy.
+'''
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from condorpy import Job, Workflow, Node
+from condorpy.exceptions import HTCondorError
+
+from . import fake_condor
+
+
+class TestFakeCondor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        bin_dir = fake_condor.install(os.path.join(self.tmp, 'bin'))
+        patcher = mock.patch.dict(os.environ, PATH=bin_dir + os.pathsep + os.environ['PATH'],
+                                  FAKE_CONDOR_DB=os.path.join(self.tmp, 'condor.db'),
+                                  FAKE_CONDOR_IDLE='0', FAKE_CONDOR_RUN='0')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def durations(self, idle, run):
+        os.environ.update(FAKE_CONDOR_IDLE=str(idle), FAKE_CONDOR_RUN=str(run))
+
+    def job(self, name, **kwargs):
+        kwargs.setdefault('executable', 'run.sh')
+        return Job(name, working_directory=self.tmp, **kwargs)
+
+    def condor(self, command):
+        return subprocess.check_output(command, shell=True, cwd=self.tmp).decode()
+
+    def test_jobs_move_through_states(self):
+        for idle, run, status in [(1000, 0, 'Idle'), (0, 1000, 'Running'), (0, 0, 'Completed')]:
+            self.durations(idle, run)
+            job = self.job(status.lower(), num_jobs=2)
+            job.submit()
+            self.assertEqual(status, job.status)
+            self.assertEqual(2, job.statuses[status])
+
+    def test_submit_many_and_batched_statuses(self):
+        jobs = [self.job('job%d' % i, executable='exe%d' % (i % 2)) for i in range(6)]
+        self.assertEqual([1, 2, 3, 4, 5, 6], Job.submit_many(jobs))
+        statuses = Job.statuses_for(jobs)
+        self.assertTrue(all(statuses[job]['Completed'] == 1 for job in jobs))
+
+    def test_constraints_and_formats(self):
+        self.durations(0, 1000)
+        self.job('args', arguments='a b', num_jobs=3).submit()
+        out = self.condor("condor_q -constraint 'ClusterId == 1 && ProcId >= 1' "
+                          "-format '%d;;;' ProcId -format '%v;;;' Args -format '%v+++' Arguments")
+        self.assertEqual('1;;;undefined;;;a b+++2;;;undefined;;;a b+++', out)
+        self.assertEqual('', self.condor('condor_history 1 -af ProcId'))
+        self.assertIn('"JobStatus": 2', self.condor('condor_q 1.2 -json -attributes ClusterId,JobStatus'))
+
+        job = self.job('bad')
+        job._cluster_id = 1
+        with mock.patch.object(Job, '_status_query', return_value=('1', ['condor_q -constraint "Foo == 1"'])):
+            self.assertRaises(HTCondorError, lambda: job.status)
+
+    def test_dag_nodes_wait_for_their_parents(self):
+        self.durations(0, 1000)
+        workflow = Workflow('dag', None, None, working_directory=self.tmp)
+        parent = Node(self.job('parent', executable='first', arguments='1'))
+        child = Node(self.job('child', executable='second'))
+        parent.add_child(child)
+        workflow.add_node(parent)
+        workflow.add_node(child)
+        workflow.submit()
+
+        self.assertEqual('Running', workflow.status)
+        workflow.update_node_ids()
+        self.assertEqual(2, parent.job.cluster_id)
+        self.assertEqual(child.job.NULL_CLUSTER_ID, child.job.cluster_id)
+        self.assertEqual({2: 'Running'}, workflow.node_statuses_by_cluster_id())
+
+        workflow.remove()
+        self.assertEqual('Removed', workflow.status)
+        self.assertEqual('Removed', parent.job.status)
+        self.assertIn('3', self.condor('condor_history -constraint DAGManJobID==1 -af JobStatus'))
+
+    def test_wait(self):
+        self.durations(0, 1000)
+        job = self.job('waiting')
+        job.submit()
+        out, err = job.wait(options=['-wait', '0'])
+        self.assertEqual('Time expired.\n', out)
+
+        self.durations(0, 0.1)
+        job = self.job('done')
+        job.submit()
+        self.assertEqual(('All jobs done.\n', ''), job.wait())
+        self.assertEqual('Completed', job.status)
+
+
+    def test_wait_on_a_job_sharing_a_cluster(self):
+        self.durations(0, 1000)
+        a, b = self.job('a', num_jobs=2), self.job('b', num_jobs=2)
+        self.assertEqual([1, 1], Job.submit_many([a, b]))
+        b.remove()
+        # b's procs are done even though a's, in the same cluster, are still running.
+        self.assertEqual(('All jobs done.\n' * 2, ''), b.wait(options=['-wait', '1']))
+        # The first proc that times out ends the wait.
+        self.assertEqual(('Time expired.\n', ''), a.wait(options=['-wait', '0']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+'''
+Tests for queueing a job over itemdata.
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from condorpy import Job
+from condorpy.htcondor_object_base import HTCondorObjectBase
+
+
+class TestItemdata(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.job = Job('sweep', working_directory=self.dir, executable='run.sh', arguments='$(x) $(y)')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_queue_statement(self):
+        self.job.queue_from('x, y', [(1, 'a'), (2, 'b')])
+        self.assertEqual(['x', 'y'], self.job.item_variables)
+        self.assertTrue(str(self.job).endswith('queue 1 x,y from (\n1,a\n2,b\n)\n'))
+        self.assertEqual(2, self.job._num_procs())
+
+        self.job.clear_itemdata()
+        self.assertTrue(str(self.job).endswith('\n\nqueue 1\n'))
+
+    def test_generator_is_streamed_in_chunks(self):
+        self.job.queue_from(['x'], (i for i in range(2500)))
+        self.assertIsNone(self.job._num_items)
+
+        chunks = list(self.job._description_chunks())
+        self.assertEqual(['queue 1 x from (\n', ')\n'], [chunks[1], chunks[-1]])
+        self.assertEqual(3, len(chunks) - 3)
+        self.assertEqual(2500, self.job._num_items)
+        self.assertEqual(2500, self.job._num_procs())
+
+    def test_used_up_generator_is_not_written_again(self):
+        self.job.queue_from(['x'], (i for i in range(3)))
+        self.assertTrue(str(self.job).endswith('from (\n0\n1\n2\n)\n'))
+        self.assertRaises(ValueError, str, self.job)
+        self.assertEqual(3, self.job._num_procs())
+
+        self.job.queue_from(['x'], (i for i in range(2)))
+        self.assertTrue(str(self.job).endswith('from (\n0\n1\n)\n'))
+        self.assertEqual(2, self.job._num_procs())
+
+    def test_item_variables_are_left_for_condor_submit(self):
+        self.job.queue_from('x,y', [(1, 2)])
+        self.job.set('output', '$(job_name)_$(x).out')
+        self.assertEqual('sweep_$(x).out', self.job.get('output'))
+        self.assertEqual('$(x) $(y)', self.job.arguments)
+
+    def test_bad_items(self):
+        self.assertRaises(ValueError, self.job.queue_from, '', [1])
+        self.job.queue_from('x,y', [(1,)])
+        self.assertRaises(ValueError, str, self.job)
+        self.job.queue_from('x', ['a\nb'])
+        self.assertRaises(ValueError, str, self.job)
+
+    def test_submit_makes_a_directory_per_item(self):
+        self.job.set('initialdir', 'run_$(x)')
+        self.job.queue_from('x,y', ['1 first', '2, second'])
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2 job(s) submitted to cluster 5.',
+                                                                             None)):
+            self.job.submit()
+
+        self.assertTrue(os.path.isdir(os.path.join(self.dir, 'run_1')))
+        self.assertTrue(os.path.isdir(os.path.join(self.dir, 'run_2')))
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'run_$(x)')))
+        self.assertTrue(os.path.isfile(os.path.join(self.dir, 'sweep.job')))
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('24', None)):
+            statuses = self.job.statuses
+        self.assertEqual(1, statuses['Running'])
+        self.assertEqual(1, statuses['Completed'])
+
+    def test_item_file(self):
+        with open(os.path.join(self.dir, 'items.txt'), 'w') as f:
+            f.write('1 a\n# comment\n2 b\n3 c\n')
+        self.job.num_jobs = 2
+        self.job.queue_from('x,y', 'items.txt')
+        self.assertTrue(str(self.job).endswith('queue 2 x,y from items.txt\n'))
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('6 job(s) submitted to cluster 5.',
+                                                                             None)):
+            self.job.submit()
+        self.assertEqual(6, self.job._num_procs())
+
+    def test_submit_many_with_itemdata(self):
+        other = Job('single', working_directory=self.dir, executable='run.sh')
+        self.job.queue_from('x,y', [(1, 2), (3, 4), (5, 6)])
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('4 job(s) submitted to cluster 8.',
+                                                                             None)):
+            Job.submit_many([self.job, other])
+
+        self.assertEqual(3, other._first_proc)
+        self.assertEqual(3, self.job._num_procs())
+        with open(os.path.join(self.dir, 'sweep.bulk.job')) as f:
+            self.assertIn('queue 1 x,y from (\n1,2\n3,4\n5,6\n)\n', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -46,9 +46,16 @@ class TestJob(unittest.TestCase):
                     '_num_jobs': 1,
                     '_cluster_id': 0,
                     '_job_file': '',
+                    '_log_tracker': None,
+                    '_first_proc': None,
+                    '_itemdata': None,
+                    '_num_items': None,
                     '_remote': None,
                     '_remote_id': None,
                     '_remote_input_files': None,
+                    '_status_cache_ttl': None,
+                    '_status_cache': {},
+                    '_backend': None,
                     '_cwd': '.'}
         self.actual = self.job.__dict__
         self.msg = 'testing initialization with default values'
@@ -2,6 +2,7 @@ import os, shutil
 
 from unittest import TestCase
 from condorpy import Job, Workflow, Node, Templates
+from condorpy.exceptions import CircularDependency
 
 __author__ = 'sdc50'
 
@@ -121,13 +122,40 @@ class TestNode(TestCase):
         pass
 
     def test_get_all_family_nodes(self):
-        pass
+        self.assertEqual({self.node_a, self.node_d}, self.node_b.get_all_family_nodes())
 
     def test_get_all_ancestors(self):
-        pass
+        self.assertEqual({self.node_a, self.node_b, self.node_c}, self.node_d._get_all_ancestors())
+        self.assertEqual(set(), self.node_a._get_all_ancestors())
+
+        # The cached result is dropped when a link changes.
+        node_e = Node(Job('e', Templates.base))
+        self.node_a.add_parent(node_e)
+        self.assertIn(node_e, self.node_d._get_all_ancestors())
+        self.node_a.remove_parent(node_e)
+        self.assertNotIn(node_e, self.node_d._get_all_ancestors())
+
+        self.node_a.add_parent(self.node_d)
+        self.assertRaises(CircularDependency, self.node_d._get_all_ancestors)
 
     def test_get_all_descendants(self):
-        pass
+        self.assertEqual({self.node_b, self.node_c, self.node_d}, self.node_a._get_all_descendants())
+
+        # Deeper than the recursion limit, and a lattice of diamonds with 2**200 paths from top to bottom.
+        chain = [Node(Job('n%d' % i, Templates.base)) for i in range(5000)]
+        for parent, child in zip(chain, chain[1:]):
+            parent.add_child(child)
+        self.assertEqual(set(chain[1:]), chain[0]._get_all_descendants())
+
+        top = Node(Job('top', Templates.base))
+        layer = [top]
+        for i in range(200):
+            below = [Node(Job('l%d_%d' % (i, j), Templates.base)) for j in range(2)]
+            for node in below:
+                for parent in layer:
+                    node.add_parent(parent)
+            layer = below
+        self.assertEqual(400, len(top._get_all_descendants()))
 
     def test_link_parent_nodes(self):
         pass
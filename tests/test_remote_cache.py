@@ -0,0 +1,174 @@
+'''
+Tests for the content-addressed remote input cache.
+'''
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from condorpy import Job
+from condorpy.remote_cache import RemoteInputCache
+from condorpy.remote_utils import RemoteClient, client_pool
+
+from .fake_remote import LocalSFTP, LocalTransport
+
+
+class TestRemoteInputCache(unittest.TestCase):
+
+    def setUp(self):
+        self.local = tempfile.mkdtemp()
+        self.home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.local, True)
+        self.addCleanup(shutil.rmtree, self.home, True)
+        self.client = self.fake_client('scheduler', self.home)
+        self.index_path = os.path.join(self.local, 'index', 'cas_index.json')
+        self.cache = RemoteInputCache(self.client, index_path=self.index_path)
+
+    def fake_client(self, host, home):
+        client = RemoteClient(host, 'user', 'pass')
+        client._transport = LocalTransport(home)
+        client._sftp = LocalSFTP(home)
+        self.addCleanup(client.close)
+        return client
+
+    def local_file(self, name, content):
+        path = os.path.join(self.local, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def remote(self, *parts):
+        return os.path.join(self.home, *parts)
+
+    def read(self, *parts):
+        with open(self.remote(*parts)) as f:
+            return f.read()
+
+    def test_each_file_is_uploaded_once(self):
+        model = self.local_file('model.bin', 'weights')
+        script = self.local_file('run.sh', '#!/bin/sh\n')
+        os.chmod(script, 0o755)
+
+        self.cache.put([model, script], 'job1')
+        self.cache.put([model, script], 'job2')
+
+        self.assertEqual(2, len(self.client.sftp.puts))
+        digest = RemoteInputCache.file_digest(model)
+        cached = os.stat(self.remote('.condorpy', 'cas', digest))
+        self.assertEqual(cached.st_ino, os.stat(self.remote('job2', 'model.bin')).st_ino)
+        self.assertTrue(os.access(self.remote('job1', 'run.sh'), os.X_OK))
+        self.assertEqual('weights', self.read('job1', 'model.bin'))
+
+        with open(self.index_path) as f:
+            self.assertIn(digest, json.load(f)['user@scheduler:22'])
+
+    def test_identical_files_share_an_object(self):
+        first = self.local_file('a/data.txt', 'same')
+        second = self.local_file('b/data.txt', 'same')
+        self.cache.put([first], 'job1')
+        self.cache.put([second], 'job2')
+        self.assertEqual(1, len(self.client.sftp.puts))
+
+    def test_directories(self):
+        self.local_file('inputs/one.txt', '1')
+        self.local_file('inputs/nested/two.txt', '2')
+        self.cache.put(os.path.join(self.local, 'inputs') + os.sep, 'job')
+        self.assertEqual('1', self.read('job', 'inputs', 'one.txt'))
+        self.assertEqual('2', self.read('job', 'inputs', 'nested', 'two.txt'))
+
+    def test_objects_missing_from_the_scheduler_are_uploaded_again(self):
+        data = self.local_file('data.txt', 'data')
+        self.cache.put([data], 'job1')
+        shutil.rmtree(self.remote('.condorpy'))
+        self.cache.put([data], 'job2')
+        self.assertEqual(2, len(self.client.sftp.puts))
+        self.assertEqual('data', self.read('job2', 'data.txt'))
+
+    def test_least_recently_used_objects_are_evicted(self):
+        self.cache.max_bytes = 25
+        paths = [self.local_file('%d.txt' % i, str(i) * 10) for i in range(3)]
+        with mock.patch('time.time', side_effect=range(100, 200)):
+            for i, path in enumerate(paths):
+                self.cache.put([path], 'job%d' % i)
+
+        digests = [RemoteInputCache.file_digest(path) for path in paths]
+        self.assertFalse(os.path.exists(self.remote('.condorpy', 'cas', digests[0])))
+        self.assertTrue(os.path.exists(self.remote('.condorpy', 'cas', digests[2])))
+        # The job that linked the evicted object keeps its copy.
+        self.assertEqual('0' * 10, self.read('job0', '0.txt'))
+        with open(self.index_path) as f:
+            self.assertEqual(set(digests[1:]), set(json.load(f)['user@scheduler:22']))
+
+    def test_inputs_copied_where_they_cannot_be_hard_linked_survive_eviction(self):
+        bin_dir = os.path.join(self.local, 'bin')
+        os.makedirs(bin_dir)
+        with open(os.path.join(bin_dir, 'ln'), 'w') as f:
+            f.write('#!/bin/sh\nexit 1\n')
+        os.chmod(os.path.join(bin_dir, 'ln'), 0o755)
+        self.cache.max_bytes = 15
+        paths = [self.local_file('%d.txt' % i, str(i) * 10) for i in range(2)]
+        with mock.patch.dict(os.environ, {'PATH': bin_dir + os.pathsep + os.environ['PATH']}):
+            for i, path in enumerate(paths):
+                self.cache.put([path], 'job%d' % i)
+
+        self.assertFalse(os.path.exists(self.remote('.condorpy', 'cas', RemoteInputCache.file_digest(paths[0]))))
+        self.assertFalse(os.path.islink(self.remote('job0', '0.txt')))
+        self.assertEqual('0' * 10, self.read('job0', '0.txt'))
+
+    def test_uploads_do_not_hold_the_index_lock(self):
+        other_home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_home, True)
+        other = self.fake_client('other', other_home)
+        started, proceed = threading.Event(), threading.Event()
+        put = self.client.sftp.put
+
+        def slow_put(local_path, remote_path):
+            started.set()
+            proceed.wait(5)
+            put(local_path, remote_path)
+
+        self.client.sftp.put = slow_put
+        slow = threading.Thread(target=self.cache.put, args=([self.local_file('slow.txt', 'slow')], 'job1'))
+        slow.start()
+        self.addCleanup(slow.join)
+        self.addCleanup(proceed.set)
+        self.assertTrue(started.wait(5))
+
+        done = threading.Thread(target=RemoteInputCache(other, index_path=self.index_path).put,
+                                args=([self.local_file('fast.txt', 'fast')], 'job2'))
+        done.start()
+        done.join(5)
+        self.assertFalse(done.is_alive())
+        with open(os.path.join(other_home, 'job2', 'fast.txt')) as f:
+            self.assertEqual('fast', f.read())
+        proceed.set()
+        slow.join(5)
+        with open(self.index_path) as f:
+            self.assertEqual({'user@scheduler:22', 'user@other:22'}, set(json.load(f)))
+
+    def test_changed_files_are_hashed_again(self):
+        path = self.local_file('data.txt', 'one')
+        digest = RemoteInputCache.file_digest(path)
+        self.assertEqual(digest, RemoteInputCache.file_digest(path))
+        with open(path, 'w') as f:
+            f.write('two!')
+        self.assertNotEqual(digest, RemoteInputCache.file_digest(path))
+
+    def test_jobs_copy_inputs_through_the_cache(self):
+        self.local_file('in.txt', 'input')
+        job = Job('cached', working_directory=self.local, remote_input_files=['in.txt'])
+        job.set_scheduler('host', 'user', password='pass')
+        self.addCleanup(client_pool.clear)
+        with mock.patch.object(job._remote, 'input_cache') as cache, mock.patch.object(job._remote, 'put') as put:
+            job._copy_input_files_to_remote()
+        put.assert_not_called()
+        cache.put.assert_called_once_with([os.path.join(self.local, 'in.txt')], job._remote_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+'''
+Tests for running remote commands concurrently over one transport.
+'''
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from condorpy import Job, Workflow, Node
+from condorpy.exceptions import HTCondorError
+from condorpy.aio import execute_remote
+from condorpy.remote_utils import RemoteClient, client_pool
+
+from .fake_remote import ScriptedTransport
+
+
+class TestConcurrentCommands(unittest.TestCase):
+
+    def client(self, max_sessions=10, **kwargs):
+        client = RemoteClient('host', 'user', 'pass', max_sessions=max_sessions)
+        kwargs.setdefault('delay', 0.02)
+        client._transport = ScriptedTransport(**kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_execute_many_keeps_order(self):
+        client = self.client()
+        results = client.execute_many(['echo %d' % i for i in range(20)])
+        self.assertEqual(['echo %d\n' % i for i in range(20)], [out for out, err in results])
+
+    def test_sessions_are_limited(self):
+        client = self.client(max_sessions=4)
+        client.execute_many(['cmd %d' % i for i in range(12)])
+        self.assertEqual(3, client._transport.peak)
+
+        threads = [threading.Thread(target=client.execute, args=('direct %d' % i,)) for i in range(8)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+        self.assertEqual(3, client._transport.peak)
+
+    def test_every_session_is_counted(self):
+        client = self.client(max_sessions=4)
+
+        async def run():
+            return await asyncio.gather(*[execute_remote(client, 'async %d' % i) for i in range(8)])
+
+        self.assertEqual([('async %d\n' % i, '') for i in range(8)], asyncio.run(run()))
+        self.assertEqual(3, client._transport.peak)
+
+        free = []
+        with mock.patch.object(RemoteClient, 'scp') as scp:
+            scp.put.side_effect = scp.get.side_effect = lambda *args, **kwargs: free.append(client._sessions._value)
+            client.put(['in.txt'], 'job', parallel=0)
+            client.get('job', '.', parallel=0)
+        self.assertEqual([2, 2], free)
+        self.assertEqual(3, client._sessions._value)
+
+    def test_failures_are_raised_after_all_commands_finish(self):
+        client = self.client()
+        self.assertRaises(RuntimeError, client.execute_many, ['ok', 'fail', 'ok too'])
+        self.assertEqual(0, client._transport.open)
+
+    def test_submit_command(self):
+        future = self.client().submit_command('hello')
+        self.assertEqual(('hello\n', ''), future.result())
+
+    def test_batched_status_queries_run_concurrently(self):
+        client_pool.clear()
+        self.addCleanup(client_pool.clear)
+        jobs = []
+        for cluster_id in range(1, 6):
+            job = Job('job_%d' % cluster_id)
+            job.set_scheduler('host', 'user', password='pass')
+            job._cluster_id = cluster_id
+            jobs.append(job)
+        client = jobs[0].scheduler
+
+        def respond(command):
+            # Report proc 0 of the first cluster in the constraint as running.
+            first_cluster = command.split('{')[1].split(',')[0].split('}')[0]
+            return '%s;;;0;;;2+++' % (first_cluster,), ''
+
+        client._transport = ScriptedTransport(respond, delay=0.02)
+        with mock.patch.object(Job, '_STATUS_BATCH_SIZE', 2), \
+                mock.patch.object(client, 'submit_command', wraps=client.submit_command) as submit_command:
+            procs = Job._query_proc_statuses(jobs)
+
+        self.assertEqual(3, submit_command.call_count)
+        self.assertEqual({1: {0: 2}, 3: {0: 2}, 5: {0: 2}}, procs)
+
+
+class TestStreamingOutput(unittest.TestCase):
+
+    def client(self, respond):
+        client = RemoteClient('host', 'user', 'pass')
+        client._transport = ScriptedTransport(respond)
+        self.addCleanup(client.close)
+        return client
+
+    def test_both_streams_are_read_as_they_arrive(self):
+        client = self.client(lambda command: ('out 1\nout 2\n', 'err \u00e9\n'))
+        chunks = list(client.iter_output('cmd', read_size=3))
+        self.assertEqual(['stdout', 'stderr'], [name for name, text in chunks[:2]])
+        self.assertEqual('out 1\nout 2\n', ''.join(text for name, text in chunks if name == 'stdout'))
+        self.assertEqual('err \u00e9\n', ''.join(text for name, text in chunks if name == 'stderr'))
+
+    def test_lines(self):
+        client = self.client(lambda command: ('a\nb\nc', ''))
+        self.assertEqual([('stdout', 'a\n'), ('stdout', 'b\n'), ('stdout', 'c')], list(client.iter_lines('cmd')))
+
+    def test_failed_command_raises_after_its_output(self):
+        client = self.client(lambda command: ('partial\n', 'bad\n'))
+        output = client.iter_output('fail')
+        self.assertEqual(('stdout', 'partial\n'), next(output))
+        self.assertRaises(RuntimeError, list, output)
+
+    def test_execute_output_is_unchanged(self):
+        client = self.client(lambda command: ('a\nb\n', 'c\n'))
+        self.assertEqual(('a\n\nb\n', 'c\n'), client.execute('cmd'))
+
+
+class TestStreamingRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.workflow = Workflow('streamed', config='', max_jobs=None)
+        self.workflow._cluster_id = 42
+
+    def test_records_split_across_chunks(self):
+        chunks = ['10;;;2++', '+11;', ';;1+++12;;;', '4+++']
+        self.assertEqual([['10', '2'], ['11', '1'], ['12', '4']],
+                         list(self.workflow._node_status_records(chunks)))
+
+    def test_node_statuses_from_a_stream(self):
+        chunks = iter(['"10;;;2+++"', '"11;;;1+', '++"'])
+        with mock.patch.object(Workflow, '_execute_stream', return_value=chunks) as stream, \
+                mock.patch.object(Workflow, '_execute') as ex:
+            statuses = self.workflow.node_statuses_by_cluster_id(stream=True)
+        ex.assert_not_called()
+        stream.assert_called_once()
+        self.assertEqual({10: 'Running', 11: 'Idle'}, statuses)
+
+    def test_node_ids_from_a_stream(self):
+        job = Job('node', executable='run.sh', arguments='1')
+        self.workflow.add_node(Node(job))
+        chunks = iter(['7;;;/home/run.sh;;;1;;;undef', 'ined+++'])
+        with mock.patch.object(Workflow, '_execute_stream', return_value=chunks):
+            self.workflow.update_node_ids(stream=True)
+        self.assertEqual(7, job.cluster_id)
+
+    def test_node_ids_are_linked_as_records_arrive(self):
+        first = Job('first', executable='run.sh', arguments='1')
+        second = Job('second', executable='run.sh', arguments='2')
+        for job in (first, second):
+            self.workflow.add_node(Node(job))
+
+        def records():
+            yield 'bad', '/home/run.sh', '1'
+            yield '7', '/home/run.sh', '1'
+            self.assertEqual(7, first.cluster_id)
+            yield '8', '/home/run.sh', '1'
+            yield '9', '/home/run.sh', '2'
+
+        self.workflow._link_node_ids(records())
+        self.assertEqual((7, 9), (first.cluster_id, second.cluster_id))
+
+    def test_local_stream(self):
+        chunks = self.workflow._execute_stream(['printf "10;;;2+++11;;;4+++"'], shell=True)
+        self.assertEqual({10: 'Running', 11: 'Completed'},
+                         self.workflow._collect_node_statuses('42', self.workflow._node_status_records(chunks)))
+
+    def test_local_stream_errors(self):
+        chunks = self.workflow._execute_stream(['echo out; echo oops >&2'], shell=True)
+        self.assertRaises(HTCondorError, list, chunks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+'''
+Tests for the persistent remote helper.
+'''
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from condorpy import Job, _helper_script
+from condorpy.remote_helper import HelperExited, RemoteHelper
+from condorpy.remote_utils import RemoteClient
+
+from .fake_remote import LocalSFTP, LocalTransport
+
+FAKE_CONDOR_Q = '''#!/bin/sh
+echo '[{"ClusterId": 1, "ProcId": 0, "JobStatus": 2}]'
+'''
+
+FAKE_CONDOR_HISTORY = '''#!/bin/sh
+echo '[{"ClusterId": 1, "ProcId": 0, "JobStatus": 4}, {"ClusterId": 2, "ProcId": 0, "JobStatus": 4}]'
+'''
+
+FAKE_CONDOR_SUBMIT = '''#!/bin/sh
+test -f "$1" && echo '1 job(s) submitted to cluster 9.'
+'''
+
+
+def fake_transport(home):
+    """A LocalTransport with fake condor_q, condor_history and condor_submit commands on the PATH."""
+    bin_dir = os.path.join(home, 'bin')
+    os.mkdir(bin_dir)
+    for name, script in (('condor_q', FAKE_CONDOR_Q), ('condor_history', FAKE_CONDOR_HISTORY),
+                         ('condor_submit', FAKE_CONDOR_SUBMIT)):
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as f:
+            f.write(script)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return LocalTransport(home, env=dict(PATH=bin_dir + os.pathsep + os.environ.get('PATH', '')))
+
+
+class TestHelperScript(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def run_helper(self, *requests):
+        lines = ''.join(json.dumps(request) + '\n' for request in requests) + 'not json\n'
+        process = subprocess.Popen([sys.executable, _helper_script.__file__], cwd=self.dir, universal_newlines=True,
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        out, _ = process.communicate(lines)
+        return [json.loads(line) for line in out.splitlines()]
+
+    def test_protocol(self):
+        # Requests are run concurrently, so those that depend on each other are sent to separate helpers.
+        responses = self.run_helper({'id': 1, 'op': 'makedirs', 'path': 'a/b'})
+        self.assertEqual({1: True, None: False}, dict((r['id'], r['ok']) for r in responses))
+
+        responses = self.run_helper({'id': 2, 'op': 'execute', 'command': 'pwd; echo err >&2; exit 3', 'cwd': 'a/b'})
+        result = [r for r in responses if r['id'] == 2][0]['result']
+        self.assertEqual(os.path.realpath(os.path.join(self.dir, 'a', 'b')),
+                         os.path.realpath(result['stdout'].strip()))
+        self.assertEqual(('err\n', 3), (result['stderr'], result['exit_status']))
+
+        responses = self.run_helper({'id': 3, 'op': 'batch', 'requests': [{'op': 'rmtree', 'path': 'a'},
+                                                                          {'op': 'unknown'}]})
+        result = [r for r in responses if r['id'] == 3][0]['result']
+        self.assertEqual([True, False], [response['ok'] for response in result])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'a')))
+
+    def test_requests_are_answered_as_they_finish(self):
+        responses = self.run_helper({'id': 1, 'op': 'execute', 'command': 'sleep 1; echo slow'},
+                                    {'id': 2, 'op': 'batch', 'requests': [
+                                        {'op': 'execute', 'command': 'sleep 0.5; echo first'},
+                                        {'op': 'execute', 'command': 'echo second'}]})
+        self.assertEqual([2, 1], [response['id'] for response in responses if response['id']])
+        batch = [r for r in responses if r['id'] == 2][0]
+        self.assertEqual(['first\n', 'second\n'], [r['result']['stdout'] for r in batch['result']])
+
+
+class TestRemoteHelper(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.client = RemoteClient('host', 'user', 'pass', use_helper=True)
+        self.client._transport = fake_transport(self.home)
+        self.client._sftp = LocalSFTP(self.home)
+        self.addCleanup(self.client.close)
+
+    def tearDown(self):
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def uploads(self):
+        return len([path for path, mode in self.client._sftp.opens if 'w' in mode])
+
+    def test_commands_run_through_one_helper(self):
+        self.assertEqual(('one\n', ''), self.client.execute('echo one'))
+        self.client.makedirs('job/sub')
+        self.assertEqual([('sub\n', ''), ('two\n', '')], self.client.execute_many(['ls job', 'echo two']))
+        self.client.rmtree('job')
+
+        self.assertFalse(os.path.exists(os.path.join(self.home, 'job')))
+        self.assertEqual(['python3 %s' % (self.client.helper.remote_path,)], self.client._transport.commands)
+        self.assertTrue(os.path.isfile(os.path.join(self.home, self.client.helper.remote_path)))
+
+    def test_requests_from_several_threads_share_the_helper(self):
+        self.client.execute('true')
+        slow = threading.Thread(target=self.client.execute, args=('sleep 1',))
+        slow.start()
+        time.sleep(0.1)
+        start = time.time()
+        self.assertEqual(('fast\n', ''), self.client.execute('echo fast'))
+        self.assertLess(time.time() - start, 0.8)
+        self.assertTrue(slow.is_alive())
+        slow.join()
+        self.assertEqual(1, len(self.client._transport.commands))
+
+    def test_waiting_requests_fail_when_the_helper_exits(self):
+        self.client.execute('true')
+        errors = []
+        thread = threading.Thread(target=lambda: errors.append(
+            self.assertRaises(HelperExited, self.client.execute, 'sleep 5')))
+        thread.start()
+        time.sleep(0.2)
+        self.client.helper._session.kill()
+        thread.join(3)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(('back\n', ''), self.client.execute('echo back'))
+
+    def test_failures(self):
+        self.assertRaises(RuntimeError, self.client.execute, 'exit 1')
+        self.assertRaises(RuntimeError, self.client.execute_many, ['true', 'exit 2'])
+        self.assertEqual(('still up\n', ''), self.client.execute('echo still up'))
+
+    def test_helper_is_restarted_without_uploading_again(self):
+        helper = self.client.helper
+        helper._session.kill()
+        self.assertEqual(('back\n', ''), self.client.execute('echo back'))
+        self.assertEqual(2, len(self.client._transport.commands))
+        self.assertEqual(1, self.uploads())
+
+    def test_query(self):
+        ads = self.client.query('ClusterId == 1', ['ClusterId', 'ProcId', 'JobStatus'])
+        self.assertEqual([2, 4, 4], [ad['JobStatus'] for ad in ads])
+        self.assertEqual(1, len(self.client.query('ClusterId == 1', history=False)))
+
+    def test_job_statuses_use_job_ads(self):
+        jobs = [Job('a'), Job('b')]
+        for cluster_id, job in enumerate(jobs, 1):
+            job._remote = self.client
+            job._cluster_id = cluster_id
+        with mock.patch.object(Job, '_execute_many') as execute_many:
+            self.assertEqual({1: {0: 2}, 2: {0: 4}}, Job._query_proc_statuses(jobs))
+        execute_many.assert_not_called()
+
+    def test_bundled_submit(self):
+        job = Job('bundled', executable='run.sh')
+        job._remote = self.client
+        job._remote_id = 'remote_job'
+        self.assertEqual(9, job.submit(bundle=True))
+        self.assertTrue(os.path.isfile(os.path.join(self.home, 'remote_job', 'bundled.job')))
+        # Only the helper itself went over SFTP.
+        self.assertEqual(1, self.uploads())
+
+    def test_falls_back_when_the_helper_cannot_start(self):
+        with mock.patch.object(RemoteHelper, 'start', side_effect=RuntimeError('no python3')):
+            self.assertIsNone(self.client.helper)
+        self.assertFalse(self.client.use_helper)
+        self.assertTrue(self.client.matches('host', 'user', 'pass', None, None, 22, use_helper=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,14 @@
 '''
 Tests for private key caching, remote client reuse, and node id resolution.
 '''
+import gc
 import logging
 import os
 import shutil
 import tempfile
 import sys
 import threading
+import time
 import unittest
 from unittest import mock
 
@@ -15,7 +17,8 @@ import paramiko
 from condorpy import Job, Workflow
 from condorpy.htcondor_object_base import HTCondorObjectBase
 from condorpy.node import Node
-from condorpy.remote_utils import RemoteClient, load_private_key
+from condorpy.exceptions import RemoteError
+from condorpy.remote_utils import RemoteClient, RemoteClientPool, client_pool, load_private_key
 import condorpy.remote_utils as remote_utils
 
 
@@ -23,6 +26,7 @@ def load_tests(loader, tests, pattern):
     suite = unittest.TestSuite()
     suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestPrivateKeyCache))
     suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestRemoteClientReuse))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestRemoteClientPool))
     suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestNodeIdResolution))
     return suite
 
@@ -122,6 +126,177 @@ class TestRemoteClientReuse(unittest.TestCase):
         self.assertEqual(remote_id, self.job._remote_id)
 
 
+class TestRemoteClientPool(unittest.TestCase):
+
+    def setUp(self):
+        client_pool.clear()
+        self.pool = RemoteClientPool()
+        patcher = mock.patch.object(RemoteClient, 'close', autospec=True)
+        self.close = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        client_pool.clear()
+
+    def test_jobs_on_one_scheduler_share_a_client(self):
+        jobs = [Job('job_%d' % i) for i in range(3)]
+        for job in jobs:
+            job.set_scheduler('host', 'user', password='pass')
+        self.assertIs(jobs[0].scheduler, jobs[1].scheduler)
+        self.assertIs(jobs[0].scheduler, jobs[2].scheduler)
+        self.assertEqual(1, len(client_pool))
+
+        other = Job('other')
+        other.set_scheduler('host', 'user', password='different')
+        self.assertIsNot(jobs[0].scheduler, other.scheduler)
+
+    def test_close_remote_returns_the_client_to_the_pool(self):
+        a, b = Job('a'), Job('b')
+        a.set_scheduler('host', 'user', password='pass')
+        b.set_scheduler('host', 'user', password='pass')
+        client = a.scheduler
+
+        with mock.patch.object(RemoteClient, 'execute', side_effect=RuntimeError):
+            a.close_remote()
+        self.assertIs(client, b.scheduler)
+
+        with mock.patch.object(RemoteClient, 'execute', side_effect=RuntimeError):
+            b.close_remote()
+        self.assertNotIn(mock.call(client), self.close.call_args_list)
+        self.assertEqual(1, len(client_pool))
+
+    def test_changing_scheduler_releases_the_old_client(self):
+        job = Job('moving')
+        job.set_scheduler('host', 'user', password='pass')
+        old = job.scheduler
+        job.set_scheduler('other-host', 'user', password='pass')
+        client_pool.idle_timeout, idle_timeout = 0, client_pool.idle_timeout
+        try:
+            client_pool.evict_idle()
+        finally:
+            client_pool.idle_timeout = idle_timeout
+        self.assertEqual(1, len(client_pool))
+        self.close.assert_any_call(old)
+
+    def test_idle_clients_are_evicted(self):
+        self.pool.idle_timeout = 10
+        client = self.pool.acquire('host', 'user', 'pass')
+        self.pool.release(client)
+        self.pool.evict_idle()
+        self.assertEqual(1, len(self.pool))
+
+        with mock.patch('condorpy.remote_utils.time.monotonic', return_value=time.monotonic() + 11):
+            self.pool.evict_idle()
+        self.assertEqual(0, len(self.pool))
+        self.close.assert_any_call(client)
+
+    def test_max_connections(self):
+        self.pool.max_connections = 2
+        a = self.pool.acquire('a', 'user', 'pass')
+        b = self.pool.acquire('b', 'user', 'pass')
+        self.assertRaises(RemoteError, self.pool.acquire, 'c', 'user', 'pass')
+
+        self.pool.release(a)
+        c = self.pool.acquire('c', 'user', 'pass')
+        self.assertEqual(2, len(self.pool))
+        self.assertIs(b, self.pool.acquire('b', 'user', 'pass'))
+        self.assertIsNot(a, c)
+        self.close.assert_any_call(a)
+
+    def test_client_options_are_passed_through(self):
+        job = Job('options')
+        job.set_scheduler('host', 'user', password='pass', max_sessions=4, compression='gzip', keepalive=0)
+        client = job.scheduler
+        self.assertEqual((4, 'gzip', 0), (client.max_sessions, client.compression, client.keepalive))
+
+        job.set_scheduler('host', 'user', password='pass', max_sessions=4, compression='gzip', keepalive=0)
+        self.assertIs(client, job.scheduler)
+        other = Job('defaults')
+        other.set_scheduler('host', 'user', password='pass')
+        self.assertIsNot(client, other.scheduler)
+        job.set_scheduler('host', 'user', password='pass')
+        self.assertIs(other.scheduler, job.scheduler)
+        job.set_scheduler('host', 'user', password='pass', use_helper=True)
+        self.assertTrue(job.scheduler.use_helper)
+        self.assertIsNot(other.scheduler, job.scheduler)
+
+    def test_extra_releases_are_logged(self):
+        client = self.pool.acquire('host', 'user', 'pass')
+        self.assertTrue(self.pool.retain(client))
+        self.assertFalse(self.pool.retain(RemoteClient('other', 'user', 'pass')))
+        self.pool.release(client)
+        self.pool.release(client)
+        with mock.patch('condorpy.remote_utils.log') as log:
+            self.pool.release(client)
+        log.error.assert_called_once()
+
+    def test_objects_sharing_a_client_retain_it(self):
+        job = Job('original')
+        job.set_scheduler('host', 'user', password='pass')
+        client = job.scheduler
+        copy = job.__copy__()
+        workflow = Workflow('wf', config='', max_jobs=None)
+        workflow.set_scheduler('host', 'user', password='pass')
+        node = workflow.add_job(Job('node'))
+        with mock.patch.object(Workflow, '_make_dir'), mock.patch.object(Workflow, '_open'), \
+                mock.patch.object(Job, '_write_job_file'):
+            workflow._write_job_file()
+        self.assertIs(client, copy.scheduler)
+        self.assertIs(client, node.job.scheduler)
+
+        with mock.patch.object(RemoteClient, 'execute', side_effect=RuntimeError), \
+                mock.patch('condorpy.remote_utils.log') as log:
+            for obj in [job, copy]:
+                obj.close_remote()
+            self.assertEqual(2, client_pool._entries[next(iter(client_pool._entries))][1])
+            # Closing the workflow gives back its node jobs' references as well as its own.
+            workflow.close_remote()
+            self.assertEqual(0, client_pool._entries[next(iter(client_pool._entries))][1])
+            self.assertIsNone(node.job.scheduler)
+            node.job.close_remote()
+        log.error.assert_not_called()
+
+    def test_workflow_submit_and_close_release_every_reference(self):
+        workflow = Workflow('wf', config='', max_jobs=None)
+        workflow.set_scheduler('host', 'user', password='pass')
+        for name in ('a', 'b'):
+            workflow.add_job(Job(name, executable='run.sh'))
+        with mock.patch.object(HTCondorObjectBase, '_execute',
+                               return_value=('1 job(s) submitted to cluster 5.', None)), \
+                mock.patch.object(HTCondorObjectBase, '_make_dir'), mock.patch.object(HTCondorObjectBase, '_open'), \
+                mock.patch.object(Job, '_copy_input_files_to_remote'):
+            workflow.submit()
+        entry = client_pool._entries[next(iter(client_pool._entries))]
+        self.assertEqual(3, entry[1])
+        with mock.patch.object(RemoteClient, 'execute', side_effect=RuntimeError):
+            workflow.close_remote()
+        self.assertEqual(0, entry[1])
+
+    def test_garbage_collected_objects_release_their_client(self):
+        job = Job('collected')
+        job.set_scheduler('host', 'user', password='pass')
+        workflow = Workflow('wf', config='', max_jobs=None)
+        workflow.set_scheduler('host', 'user', password='pass')
+        workflow.add_job(Job('node'))
+        with mock.patch.object(Workflow, '_make_dir'), mock.patch.object(Workflow, '_open'), \
+                mock.patch.object(Job, '_write_job_file'):
+            workflow._write_job_file()
+        entry = client_pool._entries[next(iter(client_pool._entries))]
+        self.assertEqual(3, entry[1])
+
+        del job
+        gc.collect()
+        self.assertEqual(2, entry[1])
+        del workflow
+        gc.collect()
+        self.assertEqual(0, entry[1])
+
+    def test_releasing_an_unpooled_client_closes_it(self):
+        client = RemoteClient('host', 'user', 'pass')
+        self.pool.release(client)
+        self.close.assert_any_call(client)
+
+
 class TestNodeIdResolution(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,116 @@
+'''
+Tests for reconnecting to a remote scheduler and retrying commands.
+'''
+import socket
+import unittest
+from unittest import mock
+
+import paramiko
+
+from condorpy import Job
+from condorpy.remote_utils import RemoteClient, client_pool
+from condorpy.retry import RetryPolicy
+
+from .fake_remote import ScriptedTransport
+
+
+class FlakyTransport(ScriptedTransport):
+    """A transport that fails to open its first few sessions, as if the link had dropped."""
+
+    def __init__(self, failures, stdout=b'2'):
+        super(FlakyTransport, self).__init__(respond=lambda command: (stdout, ''))
+        self.failures = failures
+        self.sessions = 0
+
+    def open_session(self):
+        self.sessions += 1
+        if self.sessions <= self.failures:
+            raise paramiko.SSHException('Unable to open channel.')
+        return super(FlakyTransport, self).open_session()
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_delays_grow_up_to_the_limit(self):
+        policy = RetryPolicy(max_attempts=6, initial_delay=1, max_delay=4, jitter=0.5)
+        with mock.patch('random.random', return_value=0):
+            self.assertEqual([1, 2, 4, 4, 4], list(policy.delays()))
+        with mock.patch('random.random', return_value=1):
+            self.assertEqual([0.5, 1, 2, 2, 2], list(policy.delays()))
+
+    def test_transient_errors_are_retried(self):
+        func = mock.Mock(side_effect=[socket.error('reset'), socket.error('reset'), 'done'])
+        on_retry = mock.Mock()
+        sleep = mock.Mock()
+        result = RetryPolicy(jitter=0).call(func, lambda e: isinstance(e, socket.error), on_retry, sleep)
+        self.assertEqual('done', result)
+        self.assertEqual([mock.call(0.5), mock.call(1)], sleep.call_args_list)
+        self.assertEqual(2, on_retry.call_count)
+
+    def test_attempts_run_out(self):
+        func = mock.Mock(side_effect=socket.error('reset'))
+        policy = RetryPolicy(max_attempts=3)
+        self.assertRaises(socket.error, policy.call, func, lambda e: True, sleep=mock.Mock())
+        self.assertEqual(3, func.call_count)
+
+    def test_other_errors_are_raised_at_once(self):
+        func = mock.Mock(side_effect=ValueError)
+        self.assertRaises(ValueError, RetryPolicy().call, func, lambda e: isinstance(e, socket.error))
+        self.assertEqual(1, func.call_count)
+
+
+class TestResilientClient(unittest.TestCase):
+
+    def client(self, transport=None, **kwargs):
+        client = RemoteClient('host', 'user', 'pass', retry_policy=RetryPolicy(initial_delay=0), **kwargs)
+        client._transport = transport
+        self.addCleanup(client.close)
+        return client
+
+    def test_connecting_is_retried_and_keeps_alive(self):
+        transports = [mock.Mock(**{'connect.side_effect': socket.error('refused')}), mock.Mock()]
+        client = self.client(keepalive=15)
+        with mock.patch('paramiko.Transport', side_effect=transports):
+            self.assertIs(transports[1], client.transport)
+        transports[0].close.assert_called_once()
+        transports[1].set_keepalive.assert_called_once_with(15)
+
+    def test_dropped_transports_are_replaced(self):
+        dropped = mock.Mock(**{'is_active.return_value': False})
+        client = self.client(dropped)
+        with mock.patch('paramiko.Transport') as transport:
+            self.assertIs(transport.return_value, client.transport)
+        dropped.close.assert_called_once()
+
+    def test_authentication_failures_are_not_retried(self):
+        client = self.client()
+        with mock.patch('paramiko.Transport') as transport:
+            transport.return_value.connect.side_effect = paramiko.AuthenticationException
+            self.assertRaises(paramiko.AuthenticationException, lambda: client.transport)
+        self.assertEqual(1, transport.call_count)
+
+    def test_only_idempotent_commands_are_retried(self):
+        client = self.client(FlakyTransport(failures=1))
+        self.assertRaises(paramiko.SSHException, client.execute, 'condor_submit job')
+
+        client = self.client(FlakyTransport(failures=2))
+        self.assertEqual(('2', ''), client.execute('condor_q', retry=True))
+
+    def test_jobs_retry_queries_but_not_submits(self):
+        job = Job('flaky', executable='exe')
+        job.set_scheduler('host', 'user', password='pass')
+        self.addCleanup(client_pool.clear)
+        job._cluster_id = 10
+        job._remote.retry_policy = RetryPolicy(initial_delay=0)
+
+        job._remote._transport = FlakyTransport(failures=1)
+        out, err = job._execute(['condor_submit', job.job_file])
+        self.assertIsNone(out)
+        self.assertIn('Unable to open channel', err)
+
+        job._remote._transport = FlakyTransport(failures=2)
+        self.assertEqual('Running', job.status)
+
+
+if __name__ == '__main__':
+    unittest.main()
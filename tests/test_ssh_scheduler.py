@@ -0,0 +1,105 @@
+'''
+End-to-end tests of the remote code paths against the local SSH scheduler in tests/ssh_harness.py.
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+from condorpy import Job
+from condorpy.remote_utils import RemoteClient, client_pool
+from condorpy.retry import RetryPolicy
+
+from .ssh_harness import SSHScheduler
+
+
+class TestSSHScheduler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.scheduler = SSHScheduler()
+        cls.scheduler.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.scheduler.stop()
+
+    def setUp(self):
+        self.local = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.local, True)
+        self.addCleanup(client_pool.clear)
+        self.scheduler.reset_stats()
+        with open(os.path.join(self.local, 'in.txt'), 'w') as f:
+            f.write('input')
+
+    def client(self, **kwargs):
+        client = RemoteClient(self.scheduler.host, self.scheduler.username, self.scheduler.password,
+                              port=self.scheduler.port, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def job(self, name, **kwargs):
+        kwargs.setdefault('remote_input_files', ['in.txt'])
+        job = Job(name, executable='run.sh', working_directory=self.local, **kwargs)
+        s = self.scheduler
+        job.set_scheduler(s.host, s.username, password=s.password, port=s.port)
+        return job
+
+    def read(self, *parts):
+        with open(self.scheduler.path(*parts)) as f:
+            return f.read()
+
+    def test_jobs_share_one_connection(self):
+        jobs = [self.job('job%d' % i, num_jobs=2) for i in range(3)]
+        for job in jobs:
+            job.submit()
+        self.assertEqual(3, len(set(job.cluster_id for job in jobs)))
+        self.assertEqual('Completed', jobs[0].status)
+        self.assertEqual('input', self.read(jobs[1]._remote_id, 'in.txt'))
+        self.assertEqual(1, self.scheduler.stats['connections'])
+
+    def test_bundled_submit(self):
+        job = self.job('bundled')
+        job.submit(bundle=True)
+        self.assertEqual('Completed', job.status)
+        self.assertEqual('input', self.read(job._remote_id, 'in.txt'))
+
+    def test_item_file(self):
+        with open(os.path.join(self.local, 'items.txt'), 'w') as f:
+            f.write('1\n2\n')
+        for bundle in (False, True):
+            job = self.job('items%d' % bundle, remote_input_files=['in.txt', 'items.txt'], initialdir='run_$(x)')
+            job.queue_from('x', 'items.txt')
+            job.submit(bundle=bundle)
+            self.assertEqual(2, job._num_procs())
+            self.assertTrue(os.path.isdir(self.scheduler.path(job._remote_id, 'run_1')))
+            self.assertEqual('1\n2\n', self.read(job._remote_id, 'items.txt'))
+
+    def test_helper(self):
+        client = self.client(use_helper=True)
+        self.assertEqual(('hello\n', ''), client.execute('echo hello'))
+        client.makedirs('helper/dir')
+        self.assertTrue(os.path.isdir(self.scheduler.path('helper', 'dir')))
+        self.assertIsNotNone(client.helper)
+
+    def test_transfers(self):
+        for kwargs in [dict(), dict(parallel=2), dict(compression='gzip')]:
+            name = '-'.join(str(v) for v in kwargs.values()) or 'scp'
+            client = self.client()
+            client.makedirs(name)
+            client.put([os.path.join(self.local, 'in.txt')], name, **kwargs)
+            self.assertEqual('input', self.read(name, 'in.txt'))
+            client.get(name, self.local, **kwargs)
+            with open(os.path.join(self.local, name, 'in.txt')) as f:
+                self.assertEqual('input', f.read())
+
+    def test_reconnect(self):
+        client = self.client(retry_policy=RetryPolicy(initial_delay=0))
+        client.execute('true')
+        self.scheduler.drop_connections()
+        self.assertEqual(('ok\n', ''), client.execute('echo ok', retry=True))
+        self.assertEqual(2, self.scheduler.stats['connections'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+'''
+Tests for batched status queries across independent jobs.
+'''
+import unittest
+from unittest import mock
+
+from condorpy import Job
+from condorpy.htcondor_object_base import HTCondorObjectBase
+
+
+class TestStatusesFor(unittest.TestCase):
+
+    def submitted_job(self, name, cluster_id, num_jobs=1):
+        job = Job(name)
+        job.num_jobs = num_jobs
+        job._cluster_id = cluster_id
+        return job
+
+    def test_local_jobs_share_one_query(self):
+        jobs = [self.submitted_job('j%d' % i, 10 + i) for i in range(3)]
+        out = '10;;;0;;;2+++11;;;0;;;1+++12;;;0;;;4+++'
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=(out, None)) as ex:
+            statuses = Job.statuses_for(jobs)
+
+        self.assertEqual(1, ex.call_count)
+        self.assertIn('member(ClusterId, {10,11,12})', ex.call_args[0][0][0])
+        self.assertEqual(1, statuses[jobs[0]]['Running'])
+        self.assertEqual(1, statuses[jobs[1]]['Idle'])
+        self.assertEqual(1, statuses[jobs[2]]['Completed'])
+
+    def test_jobs_on_different_schedulers_are_queried_separately(self):
+        local = self.submitted_job('local', 10)
+        remote = self.submitted_job('remote', 20)
+        remote.set_scheduler('host', 'user', password='pass')
+
+        def respond(args, **kwargs):
+            return '10;;;0;;;2+++20;;;0;;;1+++', None
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', side_effect=respond) as ex:
+            statuses = Job.statuses_for([local, remote])
+
+        self.assertEqual(2, ex.call_count)
+        self.assertEqual(1, statuses[local]['Running'])
+        self.assertEqual(1, statuses[remote]['Idle'])
+
+    def test_disagreeing_procs_count_as_the_per_job_query_does(self):
+        job = self.submitted_job('mp', 500, num_jobs=2)
+        out = '500;;;0;;;2+++500;;;1;;;1+++'
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=(out, None)):
+            statuses = Job.statuses_for([job])
+
+        self.assertEqual(1, statuses[job]['Running'])
+        self.assertEqual(1, statuses[job]['Idle'])
+        with mock.patch.object(Job, 'statuses', new_callable=mock.PropertyMock, return_value=statuses[job]):
+            self.assertEqual('Various', job.status)
+
+    def test_queue_status_wins_over_history_for_the_same_proc(self):
+        job = self.submitted_job('moving', 30)
+        out = '30;;;0;;;2+++30;;;0;;;4+++'
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=(out, None)):
+            statuses = Job.statuses_for([job])
+
+        self.assertEqual(1, statuses[job]['Running'])
+        self.assertEqual(0, statuses[job]['Completed'])
+
+    def test_unsubmitted_job_is_not_queried(self):
+        job = Job('not_yet')
+        with mock.patch.object(HTCondorObjectBase, '_execute') as ex:
+            statuses = Job.statuses_for([job])
+        ex.assert_not_called()
+        self.assertEqual('Unexpanded', statuses[job])
+
+    def test_job_missing_from_the_batch_falls_back_to_its_own_query(self):
+        present = self.submitted_job('present', 10)
+        absent = self.submitted_job('absent', 11)
+
+        def respond(args, **kwargs):
+            if 'member(' in args[0]:
+                return '10;;;0;;;2+++', None
+            return '4', None
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', side_effect=respond) as ex:
+            statuses = Job.statuses_for([present, absent])
+
+        self.assertEqual(2, ex.call_count)
+        self.assertEqual(1, statuses[absent]['Completed'])
+
+    def test_large_batches_are_split(self):
+        jobs = [self.submitted_job('j%d' % i, i + 1) for i in range(5)]
+        out = ''.join('%d;;;0;;;1+++' % (i + 1) for i in range(5))
+
+        with mock.patch.object(Job, '_STATUS_BATCH_SIZE', 2):
+            with mock.patch.object(HTCondorObjectBase, '_execute', return_value=(out, None)) as ex:
+                statuses = Job.statuses_for(jobs)
+
+        self.assertEqual(3, ex.call_count)
+        self.assertTrue(all(s['Idle'] == 1 for s in statuses.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
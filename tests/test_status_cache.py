@@ -0,0 +1,94 @@
+'''
+Tests for the opt-in status cache on jobs and workflows.
+'''
+import unittest
+from unittest import mock
+
+from condorpy import Job, Workflow
+from condorpy.htcondor_object_base import HTCondorObjectBase
+
+
+class TestStatusCache(unittest.TestCase):
+
+    def setUp(self):
+        self.job = Job('cached', executable='exe')
+        self.job._cluster_id = 10
+
+    def test_statuses_are_queried_every_time_by_default(self):
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2', None)) as ex:
+            self.job.status
+            self.job.statuses
+        self.assertEqual(2, ex.call_count)
+
+    def test_reads_within_the_ttl_share_one_query(self):
+        self.job.status_cache_ttl = 60
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2', None)) as ex:
+            self.assertEqual('Running', self.job.status)
+            self.job.statuses
+            self.job.status
+        self.assertEqual(1, ex.call_count)
+
+    def test_expired_entries_are_queried_again(self):
+        self.job.status_cache_ttl = 5
+        with mock.patch('condorpy.htcondor_object_base.time.monotonic', side_effect=[0, 1, 10, 10]):
+            with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2', None)) as ex:
+                self.job.statuses
+                self.job.statuses
+                self.job.statuses
+        self.assertEqual(2, ex.call_count)
+
+    def test_refresh_discards_the_cache(self):
+        self.job.status_cache_ttl = 60
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2', None)) as ex:
+            self.job.status
+            self.job.refresh()
+            self.job.status
+        self.assertEqual(2, ex.call_count)
+
+    def test_remove_and_wait_invalidate_the_cache(self):
+        self.job.status_cache_ttl = 60
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2', None)) as ex:
+            self.job.status
+            self.job.remove()
+            self.job.status
+            self.job.wait()
+            self.job.status
+        self.assertEqual(5, ex.call_count)
+
+    def test_submit_invalidates_the_cache(self):
+        self.job.status_cache_ttl = 60
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2', None)):
+            self.job.status
+        self.assertTrue(self.job._status_cache)
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('1 job(s) submitted to cluster 11.', None)):
+            with mock.patch.object(Job, '_write_job_file'):
+                self.job.submit()
+        self.assertFalse(self.job._status_cache)
+
+    def test_copies_do_not_share_a_cache(self):
+        self.job.status_cache_ttl = 60
+        copy = self.job.__copy__()
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2', None)):
+            self.job.status
+        self.assertFalse(copy._status_cache)
+
+    def test_batched_query_fills_and_uses_the_cache(self):
+        self.job.status_cache_ttl = 60
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('10;;;0;;;2+++', None)) as ex:
+            Job.statuses_for([self.job])
+            Job.statuses_for([self.job])
+            self.job.status
+        self.assertEqual(1, ex.call_count)
+
+    def test_workflow_status_is_cached(self):
+        workflow = Workflow('cached_dag', config='', max_jobs=None)
+        workflow._cluster_id = 20
+        workflow.status_cache_ttl = 60
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2', None)) as ex:
+            self.assertEqual('Running', workflow.status)
+            workflow.status
+        self.assertEqual(1, ex.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
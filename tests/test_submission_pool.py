@@ -0,0 +1,144 @@
+'''
+Tests for parallel submission.
+'''
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from condorpy import Job, SubmissionPool
+
+
+class FakeSubmit(object):
+    """Stands in for Job.submit, recording how many submits run at once against each host."""
+
+    def __init__(self, delay=0.05, delays=None):
+        self.delay = delay
+        self.delays = delays or dict()
+        self.lock = threading.Lock()
+        self.running = dict()
+        self.peak = dict()
+        self.starts = []
+
+    def __call__(self, job):
+        key = job._scheduler_key()
+        with self.lock:
+            self.running[key] = self.running.get(key, 0) + 1
+            self.peak[key] = max(self.peak.get(key, 0), self.running[key])
+            self.starts.append(time.monotonic())
+        time.sleep(self.delays.get(key, self.delay))
+        with self.lock:
+            self.running[key] -= 1
+        return int(job.name)
+
+
+class TestSubmissionPool(unittest.TestCase):
+
+    def jobs(self, n, host=None):
+        jobs = [Job(str(i)) for i in range(n)]
+        if host:
+            for job in jobs:
+                job.set_scheduler(host, 'user', password='pass')
+        return jobs
+
+    def test_futures_resolve_to_cluster_ids(self):
+        fake = FakeSubmit(delay=0)
+        with mock.patch.object(Job, 'submit', autospec=True, side_effect=fake):
+            with SubmissionPool(max_workers=4) as pool:
+                futures = pool.map(self.jobs(10))
+        self.assertEqual(list(range(10)), [f.result() for f in futures])
+
+    def test_per_host_limit(self):
+        fake = FakeSubmit()
+        with mock.patch.object(Job, 'submit', autospec=True, side_effect=fake):
+            with SubmissionPool(max_workers=8, max_per_host=2) as pool:
+                futures = pool.map(self.jobs(6, 'a') + self.jobs(6, 'b'))
+                [f.result() for f in futures]
+        self.assertEqual(2, fake.peak[('a', 22, 'user')])
+        self.assertEqual(2, fake.peak[('b', 22, 'user')])
+
+    def test_throttled_host_does_not_hold_up_others(self):
+        fake = FakeSubmit(delay=0, delays={('a', 22, 'user'): 0.2})
+        with mock.patch.object(Job, 'submit', autospec=True, side_effect=fake):
+            with SubmissionPool(max_workers=2, max_per_host=1) as pool:
+                slow = pool.map(self.jobs(3, 'a'))
+                start = time.monotonic()
+                fast = pool.map(self.jobs(3, 'b'))
+                [f.result() for f in fast]
+                elapsed = time.monotonic() - start
+                self.assertFalse(all(f.done() for f in slow))
+        self.assertLess(elapsed, 0.15)
+        self.assertEqual(1, fake.peak[('a', 22, 'user')])
+
+    def test_queued_submits_run_after_shutdown_without_wait(self):
+        fake = FakeSubmit(delay=0.02)
+        with mock.patch.object(Job, 'submit', autospec=True, side_effect=fake):
+            pool = SubmissionPool(max_workers=2, max_per_host=1, max_rate=50)
+            futures = pool.map(self.jobs(4, 'a'))
+            pool.shutdown(wait=False)
+            self.assertRaises(RuntimeError, pool.submit, Job('late'))
+            self.assertEqual(list(range(4)), [f.result(timeout=5) for f in futures])
+
+    def test_rate_limit(self):
+        fake = FakeSubmit(delay=0)
+        with mock.patch.object(Job, 'submit', autospec=True, side_effect=fake):
+            with SubmissionPool(max_workers=4, max_rate=20) as pool:
+                [f.result() for f in pool.map(self.jobs(5))]
+        self.assertGreaterEqual(fake.starts[-1] - fake.starts[0], 4 / 20.0 - 0.01)
+
+    def test_errors_are_raised_by_the_future(self):
+        with SubmissionPool() as pool:
+            future = pool.submit(Job('no_executable'))
+        self.assertRaises(Exception, future.result)
+
+
+class TestThreadedExecution(unittest.TestCase):
+
+    def setUp(self):
+        self.dirs = [tempfile.mkdtemp() for _ in range(2)]
+
+    def tearDown(self):
+        for d in self.dirs:
+            shutil.rmtree(d, ignore_errors=True)
+
+    def test_commands_run_in_each_jobs_working_directory(self):
+        jobs = [Job('j%d' % i, working_directory=d) for i, d in enumerate(self.dirs)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda job: (job, job._execute(['pwd'])[0].strip()), jobs * 20))
+        for job, out in results:
+            self.assertEqual(os.path.realpath(job._cwd), os.path.realpath(out))
+
+    def test_process_working_directory_is_unchanged(self):
+        cwd = os.getcwd()
+        job = Job('files', working_directory=self.dirs[0])
+        job._make_dir('sub')
+        with job._open('sub/file.txt') as f:
+            f.write('x')
+        job._execute(['ls'])
+        self.assertEqual(cwd, os.getcwd())
+        self.assertTrue(os.path.isfile(os.path.join(self.dirs[0], 'sub', 'file.txt')))
+
+    def test_relative_working_directory_and_condorpy_home(self):
+        job = Job('home', working_directory='sub')
+        with mock.patch.dict(os.environ, {'CONDORPY_HOME': self.dirs[1]}):
+            self.assertEqual(os.path.join(self.dirs[1], 'sub'), job._local_cwd())
+        with mock.patch.dict(os.environ):
+            os.environ.pop('CONDORPY_HOME', None)
+            self.assertEqual(os.path.join(os.getcwd(), 'sub'), job._local_cwd())
+
+    def test_remote_transfers_use_local_paths(self):
+        job = Job('remote', working_directory=self.dirs[0], remote_input_files=['in.txt'])
+        job.set_scheduler('host', 'user', password='pass')
+        with mock.patch.object(job._remote, 'put') as put, mock.patch.object(job._remote, 'get') as get:
+            job._copy_input_files_to_remote()
+            job._copy_output_from_remote()
+        put.assert_called_once_with([os.path.join(self.dirs[0], 'in.txt')], job._remote_id)
+        get.assert_called_once_with(os.path.join(job._remote_id, '.'), self.dirs[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
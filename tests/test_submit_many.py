@@ -0,0 +1,156 @@
+'''
+Tests for submitting many jobs with one condor_submit.
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from condorpy import Job
+from condorpy.exceptions import NoExecutable
+from condorpy.htcondor_object_base import HTCondorObjectBase
+
+
+class TestSubmitMany(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def job(self, name, **kwargs):
+        kwargs.setdefault('executable', 'run.sh')
+        return Job(name, working_directory=self.dir, **kwargs)
+
+    def test_one_submit_for_all_jobs(self):
+        jobs = [self.job('a', arguments='1'), self.job('b', executable='other.sh', num_jobs=3)]
+        out = ('Submitting job(s)....\n'
+               '1 job(s) submitted to cluster 40.\n'
+               '3 job(s) submitted to cluster 41.\n')
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=(out, None)) as ex:
+            self.assertEqual([40, 41], Job.submit_many(jobs))
+
+        ex.assert_called_once_with(['condor_submit', 'a.bulk.job'])
+        self.assertEqual([40, 41], [job.cluster_id for job in jobs])
+        self.assertEqual(['40', '41'], [job._job_ids()[0] for job in jobs])
+
+    def test_later_jobs_do_not_inherit_attributes(self):
+        jobs = [self.job('a', arguments='1', output='a.out'), self.job('b')]
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('1 job(s) submitted to cluster 1.\n'
+                                                                             '1 job(s) submitted to cluster 2.', None)):
+            Job.submit_many(jobs)
+
+        with open(os.path.join(self.dir, 'a.bulk.job')) as f:
+            description = f.read()
+        first, second = description.split('queue 1')[:2]
+        self.assertIn('arguments = 1', first)
+        self.assertIn('job_name = b', second)
+        self.assertIn('arguments =\n', second)
+        self.assertIn('output =\n', second)
+        self.assertNotIn('executable =\n', second)
+
+    def test_jobs_sharing_a_cluster(self):
+        jobs = [self.job('a', num_jobs=2), self.job('b', num_jobs=3)]
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('5 job(s) submitted to cluster 7.',
+                                                                             None)):
+            Job.submit_many(jobs)
+
+        b = jobs[1]
+        self.assertEqual(7, b.cluster_id)
+        self.assertEqual(2, b._first_proc)
+        self.assertEqual(['-constraint', 'ClusterId == 7 && ProcId >= 2 && ProcId < 5'], b._job_ids())
+        self.assertEqual(['7.3'], b._job_ids(1))
+        self.assertEqual(['condor_rm', '7.4'], b._remove_args(sub_job_num=2))
+        self.assertEqual([['7.4']], [args[-1:] for args in b._wait_commands(sub_job_num=2)])
+        # Each of the job's own procs is waited on in turn, not the whole cluster.
+        self.assertEqual(['7.2', '7.3', '7.4'], [args[-1] for args in b._wait_commands()])
+
+        # The first job's procs start at 0, but it does not have the cluster to itself either.
+        a = jobs[0]
+        self.assertEqual(0, a._first_proc)
+        self.assertEqual(['condor_rm', '-constraint', 'ClusterId == 7 && ProcId >= 0 && ProcId < 2'], a._remove_args())
+        # Quoted for the shell only when a command line is put together.
+        self.assertEqual("condor_rm -constraint 'ClusterId == 7 && ProcId >= 0 && ProcId < 2'",
+                         a._remote_command(a._remove_args(), run_in_job_dir=False))
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('221', None)) as ex:
+            self.assertEqual(2, b.statuses['Running'])
+        self.assertIn("-constraint 'ClusterId == 7 && ProcId >= 2 && ProcId < 5'", ex.call_args[0][0][0])
+
+        out = '7;;;0;;;4+++7;;;1;;;4+++7;;;2;;;2+++7;;;3;;;2+++7;;;4;;;1+++'
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=(out, None)):
+            statuses = Job.statuses_for(jobs)
+        self.assertEqual('Completed', jobs[0]._summarize_statuses(statuses[jobs[0]]))
+        self.assertEqual(2, statuses[b]['Running'])
+        self.assertEqual(1, statuses[b]['Idle'])
+
+    def test_submit_resets_the_first_proc(self):
+        job = self.job('a')
+        job._first_proc = 4
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('1 job(s) submitted to cluster 3.',
+                                                                             None)):
+            job.submit()
+        self.assertIsNone(job._first_proc)
+        self.assertEqual(['condor_rm', '3'], job._remove_args())
+
+    def test_jobs_with_clusters_of_their_own(self):
+        jobs = [self.job('a', num_jobs=2), self.job('b', num_jobs=2), self.job('c', executable='other.sh')]
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('4 job(s) submitted to cluster 7.\n'
+                                                                             '1 job(s) submitted to cluster 8.',
+                                                                             None)):
+            Job.submit_many(jobs)
+        self.assertEqual([0, 2, None], [job._first_proc for job in jobs])
+        self.assertEqual(['8'], jobs[2]._job_ids())
+
+    def test_clients_are_retained_for_each_job(self):
+        client = mock.MagicMock(host='host', port=22, username='user')
+        jobs = [self.job('a'), self.job('b')]
+        jobs[0]._remote = client
+        jobs[0]._remote_id = 'remote'
+        other = mock.MagicMock(host='host', port=22, username='user')
+        with mock.patch('condorpy.htcondor_object_base.client_pool') as pool, \
+                mock.patch.object(Job, '_copy_input_files_to_remote'), \
+                mock.patch.object(HTCondorObjectBase, '_make_dir'), \
+                mock.patch.object(HTCondorObjectBase, '_open'), \
+                mock.patch.object(HTCondorObjectBase, '_execute', return_value=('1 job(s) submitted to cluster 1.\n'
+                                                                                '1 job(s) submitted to cluster 2.',
+                                                                                None)):
+            jobs[1]._hold_remote(other, counted=True)
+            Job.submit_many(jobs)
+        pool.retain.assert_called_once_with(client)
+        pool.release.assert_called_once_with(other)
+        self.assertIs(client, jobs[1]._remote)
+
+    def test_no_executable(self):
+        self.assertRaises(NoExecutable, Job.submit_many, [self.job('a'), Job('b', working_directory=self.dir)])
+
+
+class TestReadSubmittedClusters(unittest.TestCase):
+
+    def read(self, out, err=None):
+        return HTCondorObjectBase._read_submitted_clusters(out, err)
+
+    def test_summary_lines(self):
+        self.assertEqual([(5, 2), (6, 1)], self.read('2 job(s) submitted to cluster 5.\n'
+                                                     '1 job(s) submitted to cluster 6.\n'))
+
+    def test_verbose(self):
+        out = '** Proc 5.0:\nArgs = "1"\n\n** Proc 5.1:\nArgs = "2"\n\n** Proc 6.0:\nArgs = "3"\n'
+        self.assertEqual([(5, 2), (6, 1)], self.read(out))
+
+    def test_terse(self):
+        self.assertEqual([(5, 3), (6, 1)], self.read('5.0 - 5.2\n6.0 - 6.0\n'))
+
+    def test_cluster_without_count(self):
+        self.assertEqual([(9, None)], self.read('Submitting to cluster 9'))
+        self.assertEqual([], self.read('nothing'))
+
+    def test_warnings_are_not_errors(self):
+        self.assertEqual([(5, 1)], self.read('1 job(s) submitted to cluster 5.', 'WARNING: something'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+'''
+Tests for incrementally syncing remote output.
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from condorpy import Job
+from condorpy.remote_utils import RemoteClient, client_pool
+
+from .fake_remote import LocalSFTP, LocalTransport
+
+
+class TestIncrementalSync(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.home, True)
+        self.addCleanup(shutil.rmtree, self.local, True)
+        self.client = RemoteClient('host', 'user', 'pass')
+        self.client._transport = LocalTransport(self.home)
+        self.client._sftp = LocalSFTP(self.home)
+        self.addCleanup(self.client.close)
+        self.manifest = os.path.join(self.local, 'manifest.json')
+        self.write('job/out/run.out', 'line 1\n')
+        self.write('job/out/run.log', 'event\n')
+        self.write('job/out/results/data.csv', 'a,b\n')
+
+    def write(self, path, content, mode='w'):
+        path = os.path.join(self.home, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, mode) as f:
+            f.write(content)
+
+    def read(self, *parts):
+        with open(os.path.join(self.local, *parts)) as f:
+            return f.read()
+
+    def sync(self, **kwargs):
+        return self.client.sync('job/out', self.local, self.manifest, **kwargs)
+
+    def test_list_files(self):
+        self.write('job/out/name with spaces.txt', '12345')
+        files = self.client.list_files('job/out')
+        self.assertEqual(['name with spaces.txt', 'results/data.csv', 'run.log', 'run.out'], sorted(files))
+        self.assertEqual(5, files['name with spaces.txt'][0])
+
+    def test_only_changes_are_fetched(self):
+        self.assertEqual(['results/data.csv', 'run.log', 'run.out'], self.sync())
+        self.assertEqual('a,b\n', self.read('results', 'data.csv'))
+        self.assertEqual([], self.sync())
+
+        self.write('job/out/results/data.csv', 'a,b,c\n')
+        self.assertEqual(['results/data.csv'], self.sync())
+        self.assertEqual('a,b,c\n', self.read('results', 'data.csv'))
+
+        os.remove(os.path.join(self.local, 'run.log'))
+        self.assertEqual(['run.log'], self.sync())
+
+    def test_growing_files_are_appended_to(self):
+        self.sync()
+        self.write('job/out/run.out', 'line 2\n', mode='a')
+        self.assertEqual(['run.out'], self.sync())
+        self.assertEqual('line 1\nline 2\n', self.read('run.out'))
+        self.assertEqual([('job/out/run.out', 'rb')], self.client.sftp.opens)
+        self.assertEqual(3, len(self.client.sftp.gets))
+
+    def test_include_and_exclude(self):
+        self.assertEqual(['run.log', 'run.out'], self.sync(include=['*.out', '*.log']))
+        self.assertEqual(['results/data.csv'], self.sync(exclude=['run.*']))
+        self.assertFalse(os.path.exists(os.path.join(self.local, 'results', 'run.out')))
+
+    def test_job_sync(self):
+        job = Job('sync', working_directory=self.local, initialdir='out')
+        job.set_scheduler('host', 'user', password='pass')
+        self.addCleanup(client_pool.clear)
+        with mock.patch.object(job._remote, 'sync', return_value=[]) as sync, \
+                mock.patch.object(job._remote, 'get') as get:
+            job.sync_remote_output(include=['*.log'])
+            get.assert_not_called()
+            job.sync_remote_output()
+            get.assert_called_once()
+
+        local_dir = os.path.join(self.local, 'out')
+        sync.assert_called_once_with(os.path.join(job._remote_id, 'out'), local_dir,
+                                     os.path.join(local_dir, '.%s.sync.json' % (job._remote_id,)),
+                                     include=['*.log'], exclude=None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+'''
+Tests for parallel SFTP transfers.
+'''
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import paramiko
+
+from condorpy.remote_utils import RemoteClient
+from condorpy.transfer import TransferEngine
+
+from .fake_remote import LocalSFTP, LocalTransport
+
+
+class CountingSFTP(LocalSFTP):
+    """A LocalSFTP that records how many channels transfer at once."""
+
+    def __init__(self, home, counter):
+        super(CountingSFTP, self).__init__(home)
+        self.counter = counter
+
+    def _copy(self, src, dst, callback):
+        with self.counter['lock']:
+            self.counter['open'] += 1
+            self.counter['peak'] = max(self.counter['peak'], self.counter['open'])
+        time.sleep(0.02)
+        shutil.copyfile(src, dst)
+        size = os.path.getsize(dst)
+        callback(size // 2, size)
+        callback(size, size)
+        with self.counter['lock']:
+            self.counter['open'] -= 1
+
+    def close(self):
+        self.counter['closed'] += 1
+
+
+class TestTransferEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.home, True)
+        self.addCleanup(shutil.rmtree, self.local, True)
+        self.counter = dict(lock=threading.Lock(), open=0, peak=0, closed=0)
+
+        self.client = RemoteClient('host', 'user', 'pass', max_sessions=4)
+        self.client._transport = LocalTransport(self.home)
+        self.client._sftp = CountingSFTP(self.home, self.counter)
+        self.addCleanup(self.client.close)
+        patcher = mock.patch.object(paramiko.SFTPClient, 'from_transport',
+                                    side_effect=lambda transport: CountingSFTP(self.home, self.counter))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, root, path, content):
+        path = os.path.join(root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_put(self):
+        for i in range(10):
+            self.write(self.local, 'inputs/sub/%d.txt' % i, 'x' * i)
+        self.write(self.local, 'model.bin', 'weights')
+        updates = []
+
+        engine = TransferEngine(self.client, parallelism=3, progress=lambda stats: updates.append(stats.bytes_done))
+        stats = engine.put([os.path.join(self.local, 'inputs'), os.path.join(self.local, 'model.bin')], 'job')
+
+        self.assertEqual((11, 52), (stats.files_done, stats.bytes_done))
+        self.assertEqual(52, updates[-1])
+        self.assertEqual(updates, sorted(updates))
+        self.assertEqual(3, self.counter['peak'])
+        self.assertEqual(3, self.counter['closed'])
+        with open(os.path.join(self.home, 'job', 'inputs', 'sub', '9.txt')) as f:
+            self.assertEqual('x' * 9, f.read())
+        self.assertTrue(os.path.isfile(os.path.join(self.home, 'job', 'model.bin')))
+
+    def test_channels_are_limited_by_the_sessions(self):
+        for i in range(10):
+            self.write(self.local, 'inputs/%d.txt' % i, 'x')
+        TransferEngine(self.client, parallelism=8).put(os.path.join(self.local, 'inputs'), 'job')
+        self.assertEqual(3, self.counter['peak'])
+
+    def test_get(self):
+        self.write(self.home, 'job/out/a.out', 'out')
+        self.write(self.home, 'job/out/logs/a.log', 'log')
+        stats = TransferEngine(self.client).get('job/out', self.local)
+        self.assertEqual(2, stats.files_done)
+        self.assertTrue(os.path.isfile(os.path.join(self.local, 'out', 'logs', 'a.log')))
+
+        TransferEngine(self.client).get('job/out/.', os.path.join(self.local, 'flat'))
+        self.assertTrue(os.path.isfile(os.path.join(self.local, 'flat', 'a.out')))
+
+    def test_client_switches_to_the_engine(self):
+        self.write(self.local, 'in.txt', 'input')
+        self.client.parallel_transfers = 2
+        with mock.patch.object(RemoteClient, 'scp') as scp:
+            self.client.put([os.path.join(self.local, 'in.txt')], 'job')
+            self.client.get('job/in.txt', self.local, parallel=0)
+        self.assertTrue(os.path.isfile(os.path.join(self.home, 'job', 'in.txt')))
+        scp.put.assert_not_called()
+        scp.get.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
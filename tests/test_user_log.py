@@ -0,0 +1,104 @@
+'''
+Tests for reading job statuses from the HTCondor user log.
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from condorpy import Job
+from condorpy.htcondor_object_base import HTCondorObjectBase
+from condorpy.user_log import UserLogTracker
+
+
+SUBMIT = ('000 (042.000.000) 2024-01-01 12:00:00 Job submitted from host: <10.0.0.1:9618>\n'
+          '...\n')
+EXECUTE = ('001 (042.000.000) 2024-01-01 12:00:05 Job executing on host: <10.0.0.2:9618>\n'
+           '...\n')
+TERMINATE = ('005 (042.000.000) 2024-01-01 12:01:00 Job terminated.\n'
+             '\t(1) Normal termination (return value 0)\n'
+             '...\n')
+
+
+class TestUserLogTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'job.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def append(self, text):
+        with open(self.path, 'a') as log_file:
+            log_file.write(text)
+
+    def test_missing_log_has_no_events(self):
+        tracker = UserLogTracker(self.path)
+        self.assertEqual(0, tracker.update())
+        self.assertEqual(1, tracker.statuses(42)['Unexpanded'])
+
+    def test_latest_event_sets_the_status(self):
+        self.append(SUBMIT + EXECUTE)
+        tracker = UserLogTracker(self.path)
+        self.assertEqual(2, tracker.update())
+        self.assertEqual({0: 'Running'}, tracker.proc_statuses(42))
+
+    def test_only_new_events_are_parsed(self):
+        self.append(SUBMIT)
+        tracker = UserLogTracker(self.path)
+        tracker.update()
+        offset = tracker.offset
+
+        self.append(TERMINATE)
+        self.assertEqual(1, tracker.update())
+        self.assertEqual(os.path.getsize(self.path), tracker.offset)
+        self.assertGreater(tracker.offset, offset)
+        self.assertEqual(1, tracker.statuses(42)['Completed'])
+
+    def test_partially_written_event_waits_for_the_next_update(self):
+        self.append(SUBMIT + EXECUTE[:20])
+        tracker = UserLogTracker(self.path)
+        self.assertEqual(1, tracker.update())
+        self.assertEqual(len(SUBMIT), tracker.offset)
+
+        self.append(EXECUTE[20:])
+        self.assertEqual(1, tracker.update())
+        self.assertEqual({0: 'Running'}, tracker.proc_statuses(42))
+
+    def test_procs_and_clusters_are_counted_separately(self):
+        self.append(SUBMIT + SUBMIT.replace('042.000', '042.001') + SUBMIT.replace('042.000', '043.000') +
+                    EXECUTE.replace('042.000', '042.001'))
+        tracker = UserLogTracker(self.path)
+        tracker.update()
+        statuses = tracker.statuses(42, num_jobs=3)
+        self.assertEqual(1, statuses['Idle'])
+        self.assertEqual(1, statuses['Running'])
+        self.assertEqual(1, statuses['Unexpanded'])
+
+    def test_job_reads_statuses_from_the_log_without_querying(self):
+        job = Job('logged', working_directory=self.dir, log='job.log')
+        job._cluster_id = 42
+        job.track_user_log()
+        self.append(SUBMIT + EXECUTE)
+
+        with mock.patch.object(HTCondorObjectBase, '_execute') as ex:
+            self.assertEqual('Running', job.status)
+            self.append(TERMINATE)
+            self.assertEqual('Completed', job.status)
+        ex.assert_not_called()
+
+    def test_job_can_go_back_to_querying(self):
+        job = Job('logged', working_directory=self.dir, log='job.log')
+        job._cluster_id = 42
+        job.track_user_log()
+        job.track_user_log(False)
+
+        with mock.patch.object(HTCondorObjectBase, '_execute', return_value=('2', None)) as ex:
+            self.assertEqual('Running', job.status)
+        ex.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
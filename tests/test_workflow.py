@@ -1,5 +1,6 @@
-from unittest import TestCase
+from unittest import TestCase, mock
 from condorpy import Job, Workflow, Node, Templates
+from condorpy.exceptions import CircularDependency
 
 __author__ = 'sdc50'
 
@@ -30,7 +31,129 @@ class TestDAG(TestCase):
         pass
 
     def test_complete_set(self):
-        pass
+        workflow = Workflow('complete', None, None)
+        nodes = [Node(Job('n%d' % i)) for i in range(5000)]
+        for parent, child in zip(nodes, nodes[1:]):
+            parent.add_child(child)
+        workflow.add_node(nodes[2500])
+        workflow.complete_node_set()
+        self.assertEqual(set(nodes), workflow._node_set)
+
+        # Unchanged graphs are not walked again; new links and nodes are picked up.
+        extra = Node(Job('extra'))
+        workflow._node_set.discard(nodes[0])
+        workflow.complete_node_set()
+        self.assertNotIn(nodes[0], workflow._node_set)
+        nodes[-1].add_child(extra)
+        workflow.complete_node_set()
+        self.assertEqual(set(nodes + [extra]), workflow._node_set)
+
+        workflow.add_node(Node(Job('lone')))
+        workflow.complete_node_set()
+        self.assertEqual(5002, workflow.num_jobs)
+
+    def test_topological_order(self):
+        workflow = Workflow('ordered', None, None)
+        nodes = dict((name, Node(Job(name))) for name in 'abcde')
+        for parent, child in ['ab', 'ac', 'bd', 'cd', 'de']:
+            nodes[parent].add_child(nodes[child])
+        workflow.add_node(nodes['c'])
+
+        order = workflow.topological_order()
+        self.assertEqual(set(nodes.values()), set(order))
+        for node in order:
+            self.assertTrue(all(order.index(parent) < order.index(node) for parent in node.parent_nodes))
+        self.assertLess(str(workflow).index('PARENT a CHILD'), str(workflow).index('PARENT d CHILD'))
+
+        chain = [Node(Job('n%d' % i)) for i in range(5000)]
+        for parent, child in zip(chain, chain[1:]):
+            parent.add_child(child)
+        workflow.add_node(chain[-1])
+        members = set(chain)
+        self.assertEqual(chain, [node for node in workflow.topological_order() if node in members])
+
+    def test_validate(self):
+        workflow = Workflow('cyclic', None, None)
+        nodes = dict((name, Node(Job(name))) for name in 'abcdefg')
+        # Two cycles, a self-loop, and nodes downstream of a cycle that are not in one themselves.
+        for parent, child in ['ab', 'bc', 'ca', 'cd', 'de', 'ed', 'ef', 'gg']:
+            nodes[parent].add_child(nodes[child])
+        for node in nodes.values():
+            workflow.add_node(node)
+
+        with self.assertRaises(CircularDependency) as context:
+            workflow.validate()
+        message = str(context.exception)
+        for cycle in ['a, b, c', 'd, e', 'g']:
+            self.assertIn(cycle, message)
+        self.assertNotIn('f', message.split(':')[-1])
+        self.assertRaises(CircularDependency, workflow.submit)
+
+        nodes['c'].remove_child(nodes['a'])
+        nodes['e'].remove_child(nodes['d'])
+        nodes['g'].remove_child(nodes['g'])
+        workflow.validate()
+
+    def relations(self, workflow):
+        return [(set(line.split(' CHILD ')[0].split()[1:]), set(line.split(' CHILD ')[1].split()))
+                for line in str(workflow).splitlines() if line.startswith('PARENT')]
+
+    def test_compact_relations(self):
+        workflow = Workflow('fan', None, None)
+        top = [Node(Job('t%d' % i)) for i in range(50)]
+        middle = Node(Job('m'))
+        bottom = [Node(Job('b%d' % i)) for i in range(50)]
+        for node in top:
+            node.add_child(middle)
+        for node in bottom:
+            middle.add_child(node)
+        lone = Node(Job('lone'))
+        lone.add_child(bottom[0])
+        workflow.add_node(middle)
+
+        top_names = set(node.job.name for node in top)
+        bottom_names = set(node.job.name for node in bottom)
+        self.assertCountEqual([(top_names, {'m'}), ({'m'}, bottom_names), ({'lone'}, {'b0'})], self.relations(workflow))
+
+        # A complete bipartite layer is linked through a NOOP node when join_layers is set.
+        for node in bottom:
+            node.add_parent(top[0])
+            node.add_parent(top[1])
+        self.assertEqual(4, len(self.relations(workflow)))
+        workflow.join_layers = True
+        self.assertCountEqual([({'t0', 't1'}, {'fan_join0'}), ({'fan_join0'}, {'m'} | bottom_names),
+                               (top_names - {'t0', 't1'}, {'m'}), ({'m'}, bottom_names), ({'lone'}, {'b0'})],
+                              self.relations(workflow))
+        self.assertIn('\nJOB fan_join0 ./fan_join0.job NOOP\n\n', str(workflow))
+
+        # A node that already has the join node's name keeps it, and its own links.
+        top[5].job.name = 'fan_join0'
+        self.assertIn('JOB fan_join1 ./fan_join1.job NOOP\n', str(workflow))
+        self.assertEqual(1, str(workflow).count('JOB fan_join0 '))
+        self.assertIn(({'fan_join1'}, {'m'} | bottom_names), self.relations(workflow))
+        self.assertIn((top_names - {'t0', 't1', 't5'} | {'fan_join0'}, {'m'}), self.relations(workflow))
 
     def test_write_dag_file(self):
-        pass
+        workflow = Workflow('streamed', 'dagman.config', {'big': 10})
+        previous = None
+        for i in range(2500):
+            node = Node(Job('n%d' % i), variables={'i': i}, category='big')
+            if previous:
+                node.add_parent(previous)
+            workflow.add_node(node)
+            previous = node
+
+        dag_file = mock.MagicMock()
+        with mock.patch.object(Workflow, '_make_dir'), \
+                mock.patch.object(Workflow, '_open', return_value=dag_file), \
+                mock.patch.object(Job, '_write_job_file'):
+            workflow._write_job_file()
+
+        chunks = [call[0][0] for call in dag_file.write.call_args_list]
+        # Three chunks for each of the eight node sections, as well as CONFIG, MAXJOBS and the blank lines between.
+        self.assertEqual(3 * 8 + 2 + 9, len(chunks))
+        self.assertTrue(all(len(chunk.splitlines()) <= 1000 for chunk in chunks))
+        self.assertEqual(str(workflow), ''.join(chunks))
+        self.assertTrue(str(workflow).startswith('CONFIG dagman.config\n\nJOB n0 ./n0.job\nJOB n1 ./n1.job\n'))
+        self.assertTrue(str(workflow).endswith('\nMAXJOBS big 10\n'))
+        dag_file.close.assert_called_once_with()